@@ -0,0 +1,14 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def load_app(database):
+    os.environ['DATABASE_PATH'] = str(database)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    import focus
+    focus.DATABASE = str(database)
+    focus.app.config['ADMIN_ALLOW_LOCALHOST'] = True
+    return focus
@@ -0,0 +1,103 @@
+import json
+import sys
+from pathlib import Path
+
+import click
+
+from bench import load_app
+from bench.datagen import SCALES, generate, scale_counts
+from bench.routes import SKIPPED_ENDPOINTS, Samples, build_scenarios, uncovered_endpoints
+from bench.runner import HttpTransport, TestClientTransport, compare, run
+
+@click.group()
+def cli():
+    """FOCUS benchmark suite."""
+
+@cli.command('generate')
+@click.argument('database', type=click.Path(dir_okay=False))
+@click.option('--scale', type=click.Choice(sorted(SCALES)), default='small', show_default=True)
+@click.option('--projects', type=int, help='Override the number of projects for the scale.')
+@click.option('--tasks', type=int, help='Override the number of tasks for the scale; other items scale with it.')
+@click.option('--seed', type=int, default=1, show_default=True)
+@click.option('--today', type=click.DateTime(['%Y-%m-%d']), help='Date the data is generated around (default: today).')
+@click.option('--force', is_flag=True, help='Replace DATABASE if it exists.')
+def generate_command(database, scale, projects, tasks, seed, today, force):
+    """Fill DATABASE with deterministic synthetic data."""
+    path = Path(database)
+    if path.exists():
+        if not force:
+            raise click.ClickException(f'{database} exists, pass --force to replace it')
+        for suffix in ('', '-wal', '-shm'):
+            Path(database + suffix).unlink(missing_ok=True)
+    
+    counts = scale_counts(scale, projects, tasks)
+    click.echo(', '.join(f'{count} {kind}' for kind, count in counts.items()))
+    
+    def progress(kind, done, total):
+        click.echo(f'\r{kind}: {done}/{total}', nl=done == total, err=True)
+    
+    generate(database, counts, seed, today.date() if today else None, progress)
+
+@cli.command('run')
+@click.argument('database', type=click.Path(exists=True, dir_okay=False))
+@click.option('--url', help='Benchmark a running server over HTTP instead of the in-process test client.')
+@click.option('--requests', 'request_count', type=int, default=200, show_default=True, help='Requests per route.')
+@click.option('--concurrency', type=int, default=1, show_default=True)
+@click.option('--warmup', type=int, default=10, show_default=True, help='Untimed requests per read route.')
+@click.option('--only', multiple=True, help='Run only the named scenarios.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write JSON results to this file.')
+def run_command(database, url, request_count, concurrency, warmup, only, output):
+    """Drive every route against DATABASE and report latency percentiles.
+    
+    Writes and deletes modify DATABASE, so run against a freshly generated
+    copy when comparing results.
+    """
+    focus = load_app(database)
+    focus.init_db()
+    transport = HttpTransport(url) if url else TestClientTransport(focus)
+    scenarios = build_scenarios(Samples(database))
+    
+    for endpoint in uncovered_endpoints(focus.app, scenarios):
+        click.echo(f'warning: no benchmark scenario for endpoint {endpoint!r}', err=True)
+    for endpoint, reason in SKIPPED_ENDPOINTS.items():
+        click.echo(f'skipping {endpoint}: {reason}', err=True)
+    
+    click.echo(f'{"route":<28} {"n":>5} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>9} {"queries":>8} {"errors":>6}')
+    
+    def progress(name, result):
+        queries = '-' if result['queries_per_request'] is None else result['queries_per_request']
+        click.echo(f'{name:<28} {result["requests"]:>5} {result["p50_ms"]:>9} {result["p95_ms"]:>9} '
+                   f'{result["p99_ms"]:>9} {result["throughput_rps"]:>9} {queries:>8} {result["errors"]:>6}')
+    
+    results = run(transport, scenarios, request_count, concurrency, warmup, {
+        'database': str(database),
+        'mode': 'http' if url else 'test-client',
+        'url': url,
+    }, only=set(only), progress=progress)
+    
+    if output:
+        Path(output).write_text(json.dumps(results, indent=2) + '\n')
+        click.echo(f'Results written to {output}')
+
+@cli.command('compare')
+@click.argument('baseline', type=click.File())
+@click.argument('current', type=click.File())
+@click.option('--metric', default='p95_ms', show_default=True,
+              type=click.Choice(['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'queries_per_request']))
+@click.option('--threshold', type=float, default=10.0, show_default=True, help='Percent slowdown counted as a regression.')
+def compare_command(baseline, current, metric, threshold):
+    """Compare two result files and exit non-zero on regressions."""
+    rows = compare(json.load(baseline), json.load(current), metric, threshold / 100)
+    click.echo(f'{"route":<28} {"before":>10} {"after":>10} {"change":>8}')
+    regressions = 0
+    for name, before, after, change, regressed in rows:
+        change_text = '' if change is None else f'{change * 100:+.1f}%'
+        click.echo(f'{name:<28} {before if before is not None else "-":>10} {after:>10} {change_text:>8}'
+                   f'{"  REGRESSION" if regressed else ""}')
+        regressions += regressed
+    if regressions:
+        click.echo(f'{regressions} route(s) regressed by more than {threshold}% on {metric}', err=True)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,169 @@
+import random
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from bench import load_app
+
+SCALES = {
+    'small': {'projects': 10, 'tasks': 1000},
+    'medium': {'projects': 100, 'tasks': 100000},
+    'large': {'projects': 500, 'tasks': 1000000},
+}
+
+WORDS = '''
+    plan review draft update fix write call email schedule research design test
+    deploy refactor migrate clean organize prepare outline sketch publish read
+    budget report invoice meeting client server database index query cache page
+    garden kitchen groceries laundry dentist doctor insurance taxes passport car
+    bike train flight hotel birthday gift dinner lunch coffee book article paper
+    video podcast course lecture notes summary chapter essay letter resume goal
+    habit workout run yoga sleep journal idea sketch prototype feature bug issue
+    release version branch merge backup restore sync export import search filter
+    weekly monthly quarterly yearly morning evening urgent quick long short new
+    old small large simple careful rough final first second next last shared
+    project team family friend neighbour landlord bank office home school store
+    question answer decision option trade-off risk estimate deadline milestone
+'''.split()
+
+PRIORITIES = ('low', 'medium', 'high', 'urgent')
+PRIORITY_WEIGHTS = (30, 40, 20, 10)
+ENERGY_LEVELS = ('low', 'medium', 'high')
+ESTIMATES = (None, 5, 15, 30, 60, 120, 240)
+COLORS = ('#1e40af', '#dc2626', '#059669', '#7c2d12', '#581c87', '#0f766e')
+
+CHUNK_SIZE = 10000
+
+def scale_counts(scale, projects=None, tasks=None):
+    counts = dict(SCALES[scale])
+    if projects is not None:
+        counts['projects'] = projects
+    if tasks is not None:
+        counts['tasks'] = tasks
+    counts['ideas'] = counts['tasks'] // 4
+    counts['links'] = counts['tasks'] // 10
+    counts['notes'] = counts['tasks'] // 4
+    return counts
+
+class Generator:
+    def __init__(self, seed, projects, today=None):
+        self.random = random.Random(seed)
+        # Dates are relative to `today` so due dates stay near the present;
+        # pass the same day to reproduce a dataset exactly.
+        self.now = datetime.combine(today or date.today(), datetime.min.time()) + timedelta(hours=12)
+        self.project_ids = list(range(2, projects + 2))
+        # A few projects hold most of the items, as they do in real use.
+        self.project_weights = [1 / rank for rank in range(1, projects + 1)]
+    
+    def words(self, low, high):
+        return ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(low, high)))
+    
+    def sentence(self, low, high):
+        return self.words(low, high).capitalize()
+    
+    def timestamp(self, days_back=365):
+        moment = self.now - timedelta(seconds=self.random.randint(0, days_back * 86400))
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+    
+    def project_id(self):
+        if self.random.random() < 0.05:
+            return None
+        return self.random.choices(self.project_ids, self.project_weights)[0]
+    
+    def tags(self):
+        return ', '.join(self.words(0, 3).split())
+    
+    def note_content(self):
+        # Log-normal word counts: most notes are a paragraph or two, a few are long.
+        count = min(5000, max(5, int(self.random.lognormvariate(4.8, 0.9))))
+        paragraphs = []
+        while count > 0:
+            size = min(count, self.random.randint(20, 90))
+            paragraphs.append(self.sentence(size, size) + '.')
+            count -= size
+        return '\n\n'.join(paragraphs)
+    
+    def projects(self, count):
+        for _ in range(count):
+            yield (self.sentence(1, 3), self.sentence(0, 12), self.random.choice(COLORS), self.timestamp(), 1)
+    
+    def tasks(self, count):
+        for _ in range(count):
+            created_at = self.timestamp()
+            completed = self.random.random() < 0.6
+            completed_at = None
+            if completed:
+                completed_at = min(self.now, datetime.fromisoformat(created_at) + timedelta(hours=self.random.randint(1, 24 * 30)))
+                completed_at = completed_at.strftime('%Y-%m-%d %H:%M:%S')
+            due_date = None
+            if self.random.random() < 0.4:
+                due_date = (self.now + timedelta(days=self.random.randint(-10, 60))).strftime('%Y-%m-%d 00:00:00')
+            yield (
+                self.sentence(3, 8),
+                self.sentence(0, 30) if self.random.random() < 0.5 else '',
+                self.random.choices(PRIORITIES, PRIORITY_WEIGHTS)[0],
+                self.random.choice(ENERGY_LEVELS),
+                self.random.choice(ESTIMATES),
+                int(completed),
+                created_at,
+                completed_at,
+                due_date,
+                self.project_id(),
+            )
+    
+    def ideas(self, count):
+        for _ in range(count):
+            yield (self.sentence(2, 8), self.sentence(0, 60), self.tags(), self.timestamp(), self.project_id())
+    
+    def links(self, count):
+        for _ in range(count):
+            url = f'https://example.com/{self.random.choice(WORDS)}/{self.random.randint(1, 10 ** 6)}'
+            yield (url, self.sentence(2, 8), self.sentence(0, 20), self.tags(), self.timestamp(), self.project_id())
+    
+    def notes(self, count):
+        for _ in range(count):
+            created_at = self.timestamp()
+            yield (self.sentence(1, 6), self.note_content(), self.tags(), created_at, created_at, self.project_id())
+
+INSERTS = (
+    ('projects', 'INSERT INTO projects (name, description, color, created_at, is_active) VALUES (?, ?, ?, ?, ?)'),
+    ('tasks', '''INSERT INTO tasks (title, description, priority, energy_level, estimated_time, is_completed,
+                                    created_at, completed_at, due_date, project_id)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''),
+    ('ideas', 'INSERT INTO ideas (title, description, tags, created_at, project_id) VALUES (?, ?, ?, ?, ?)'),
+    ('links', 'INSERT INTO backburner_links (url, title, description, tags, created_at, project_id) VALUES (?, ?, ?, ?, ?, ?)'),
+    ('notes', 'INSERT INTO notes (title, content, tags, created_at, updated_at, project_id) VALUES (?, ?, ?, ?, ?, ?)'),
+)
+
+def chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def generate(database, counts, seed=1, today=None, progress=None):
+    # The schema comes from the app itself so triggers, indexes and
+    # migrations match what a real deployment runs with.
+    focus = load_app(database)
+    focus.init_db()
+    
+    generator = Generator(seed, counts['projects'], today)
+    db = sqlite3.connect(database)
+    db.execute('PRAGMA synchronous = OFF')
+    for kind, sql in INSERTS:
+        inserted = 0
+        for chunk in chunks(getattr(generator, kind)(counts[kind]), CHUNK_SIZE):
+            db.executemany(sql, chunk)
+            db.commit()
+            inserted += len(chunk)
+            if progress:
+                progress(kind, inserted, counts[kind])
+    for entity_type in focus.TAGGED_TABLES:
+        focus.index_tags(db, entity_type)
+    db.commit()
+    db.execute('ANALYZE')
+    db.commit()
+    db.close()
@@ -0,0 +1,159 @@
+import json
+import sqlite3
+from collections import namedtuple
+
+from bench.datagen import WORDS
+
+# path(i) and request(i) build the i-th request; request returns keyword
+# arguments for the test client (json=, data=, content_type=, headers=).
+Scenario = namedtuple('Scenario', 'name endpoint method path request limit')
+
+# Endpoints that are deliberately not timed: event streams never finish.
+SKIPPED_ENDPOINTS = {
+    'change_events': 'long-lived event stream',
+    'static': 'served by the web server in production',
+    'asset': 'static file, cached as immutable by browsers',
+    'create_backup': 'copies the whole database',
+    'verify_backup': 'reads a whole snapshot',
+}
+
+def scenario(name, endpoint, method, path, request=None, limit=None):
+    return Scenario(name, endpoint, method, path, request or (lambda i: {}), limit)
+
+class Samples:
+    def __init__(self, database):
+        db = sqlite3.connect(database)
+        self.projects = [row[0] for row in db.execute('''
+            SELECT p.id FROM projects p
+            LEFT JOIN project_counters c ON c.project_id = p.id
+            WHERE p.is_active = 1
+            ORDER BY COALESCE(c.open_task_count, 0) DESC
+        ''')]
+        self.largest_project = self.projects[0]
+        self.typical_project = self.projects[len(self.projects) // 2]
+        self.ids = {}
+        for kind, table in (('task', 'tasks'), ('idea', 'ideas'), ('link', 'backburner_links'), ('note', 'notes')):
+            self.ids[kind] = [row[0] for row in db.execute(f'SELECT id FROM {table} ORDER BY id')]
+        self.open_tasks = [row[0] for row in db.execute('SELECT id FROM tasks WHERE is_completed = 0 ORDER BY id')]
+        self.archived = [(row[0], row[1]) for row in db.execute('SELECT entity_type, item_id FROM archived_items ORDER BY id')]
+        db.close()
+    
+    def pick(self, kind, i):
+        ids = self.ids[kind]
+        return ids[(i * 7919) % len(ids)]
+    
+    def victim(self, kind, i):
+        # Deletes take distinct rows from the end so no request hits a missing id.
+        ids = self.ids[kind]
+        return ids[len(ids) - 1 - i]
+
+def task_body(i):
+    return {
+        'title': f'Benchmark task {i}',
+        'description': 'Created by the benchmark',
+        'priority': ('low', 'medium', 'high', 'urgent')[i % 4],
+        'energy_level': ('low', 'medium', 'high')[i % 3],
+        'estimated_time': 30,
+        'due_date': '2025-01-15',
+    }
+
+def import_body():
+    lines = [json.dumps({'type': 'project', 'id': 1, 'name': 'Imported'})]
+    lines += [json.dumps({'type': 'task', 'title': f'Imported {n}', 'project_id': 1}) for n in range(50)]
+    lines += [json.dumps({'type': 'note', 'content': 'Imported note', 'project_id': 1}) for n in range(50)]
+    return '\n'.join(lines) + '\n'
+
+def build_scenarios(samples):
+    s = samples
+    project = s.largest_project
+    reads = [
+        scenario('dashboard', 'index', 'GET', lambda i: '/'),
+        scenario('dashboard_gzip', 'index', 'GET', lambda i: '/', lambda i: {'headers': {'Accept-Encoding': 'gzip'}}),
+        scenario('project_detail_largest', 'project_detail', 'GET', lambda i: f'/project/{project}'),
+        scenario('project_detail_typical', 'project_detail', 'GET', lambda i: f'/project/{s.typical_project}'),
+        scenario('project_section_tasks', 'project_section', 'GET', lambda i: f'/api/projects/{project}/tasks?limit=25'),
+        scenario('project_section_notes_html', 'project_section', 'GET', lambda i: f'/api/projects/{project}/notes?format=html'),
+        scenario('quick_capture', 'quick_capture', 'GET', lambda i: '/quick-capture'),
+        scenario('projects_list', 'get_projects', 'GET', lambda i: '/api/projects'),
+        scenario('smart_suggestions', 'smart_suggestions', 'GET', lambda i: '/api/smart-suggestions'),
+        scenario('ideas_by_tag', 'list_items', 'GET', lambda i: f'/api/ideas?tags={WORDS[i % len(WORDS)]}'),
+        scenario('notes_by_tags_any', 'list_items', 'GET',
+                 lambda i: f'/api/notes?tags={WORDS[i % len(WORDS)]},{WORDS[(i * 7) % len(WORDS)]}&match=any'),
+        scenario('list_tasks_filtered', 'list_items', 'GET',
+                 lambda i: f'/api/tasks?priority=high,medium&energy=low&fields=title,priority,due_date&limit=500'),
+        scenario('list_notes_fields', 'list_items', 'GET', lambda i: '/api/notes?fields=title,updated_at&limit=1000'),
+        scenario('list_notes_full', 'list_items', 'GET', lambda i: '/api/notes?limit=1000'),
+        scenario('tag_counts', 'get_tags', 'GET', lambda i: '/api/tags?type=note&limit=50'),
+        scenario('search', 'search_items', 'GET', lambda i: f'/api/search?q={WORDS[i % len(WORDS)]}'),
+        scenario('sync_pull', 'sync_pull', 'GET', lambda i: '/api/sync?since=0'),
+        scenario('stats_daily', 'get_stats', 'GET', lambda i: '/api/stats?from=2020-01-01'),
+        scenario('stats_weekly_project', 'get_stats', 'GET', lambda i: f'/api/stats?period=week&from=2020-01-01&project_id={project}'),
+        scenario('fragment', 'item_fragment', 'GET', lambda i: f'/api/fragments/task/{s.pick("task", i)}?view=project'),
+        scenario('write_queue_stats', 'write_queue_stats', 'GET', lambda i: '/api/write-queue/stats'),
+        scenario('metrics', 'metrics_endpoint', 'GET', lambda i: '/metrics'),
+        scenario('slow_queries', 'slow_query_log', 'GET', lambda i: '/api/slow-queries'),
+        scenario('backups_list', 'list_backups', 'GET', lambda i: '/api/admin/backups'),
+        scenario('maintenance_report', 'maintenance_report', 'GET', lambda i: '/api/admin/maintenance'),
+        scenario('archive_browse', 'browse_archive', 'GET', lambda i: f'/api/archive?type=task&project_id={project}&limit=25'),
+        scenario('export', 'export_data', 'GET', lambda i: '/api/export', limit=5),
+    ]
+    writes = [
+        scenario('quick_add_task', 'quick_add_task', 'POST', lambda i: '/api/tasks/quick-add',
+                 lambda i: {'json': {**task_body(i), 'project_id': project}}),
+        scenario('quick_add_idea', 'quick_add_idea', 'POST', lambda i: '/api/ideas/quick-add',
+                 lambda i: {'json': {'title': f'Idea {i}', 'description': 'Benchmark', 'project_id': project}}),
+        scenario('quick_add_link', 'quick_add_link', 'POST', lambda i: '/api/links/quick-add',
+                 lambda i: {'json': {'url': f'https://example.com/{i}', 'title': f'Link {i}', 'project_id': project}}),
+        scenario('quick_add_note', 'quick_add_note', 'POST', lambda i: '/api/notes/quick-add',
+                 lambda i: {'json': {'title': f'Note {i}', 'content': 'Benchmark note ' * 40, 'project_id': project}}),
+        scenario('complete_task', 'complete_task', 'POST',
+                 lambda i: f'/api/tasks/{s.open_tasks[i % len(s.open_tasks)]}/complete'),
+        scenario('uncomplete_task', 'uncomplete_task', 'POST',
+                 lambda i: f'/api/tasks/{s.open_tasks[i % len(s.open_tasks)]}/uncomplete'),
+        scenario('update_task', 'update_task', 'PUT', lambda i: f'/api/tasks/{s.pick("task", i)}/update',
+                 lambda i: {'json': task_body(i)}),
+        scenario('update_idea', 'update_idea', 'PUT', lambda i: f'/api/ideas/{s.pick("idea", i)}/update',
+                 lambda i: {'json': {'title': f'Idea {i}', 'description': 'Updated'}}),
+        scenario('update_link', 'update_link', 'PUT', lambda i: f'/api/links/{s.pick("link", i)}/update',
+                 lambda i: {'json': {'url': f'https://example.com/{i}', 'title': 'Updated'}}),
+        scenario('update_note', 'update_note', 'PUT', lambda i: f'/api/notes/{s.pick("note", i)}/update',
+                 lambda i: {'json': {'title': 'Updated', 'content': 'Updated note ' * 40}}),
+        scenario('create_project', 'create_project', 'POST', lambda i: '/api/projects',
+                 lambda i: {'json': {'name': f'Benchmark {i}', 'description': '', 'color': '#1e40af'}}),
+        scenario('update_project', 'update_project', 'PUT', lambda i: f'/api/projects/{s.typical_project}/update',
+                 lambda i: {'json': {'name': f'Renamed {i}', 'description': '', 'color': '#dc2626'}}),
+        scenario('restore_archived', 'restore_item', 'POST', lambda i: '/api/archive/%s/%d/restore' % s.archived[i],
+                 limit=len(s.archived)),
+        scenario('batch', 'batch', 'POST', lambda i: '/api/batch',
+                 lambda i: {'json': {'operations': [
+                     {'type': 'task', 'op': 'create', 'data': {**task_body(i), 'project_id': project}}
+                     for _ in range(20)
+                 ]}}),
+        scenario('sync_push', 'sync_push', 'POST', lambda i: '/api/sync',
+                 lambda i: {'json': {'operations': [
+                     {'op_id': f'bench-{i}-{n}', 'type': 'task', 'op': 'create', 'data': {**task_body(i), 'project_id': project}}
+                     for n in range(20)
+                 ]}}),
+        scenario('import', 'import_data', 'POST', lambda i: '/api/import',
+                 lambda i: {'data': import_body(), 'content_type': 'application/x-ndjson'}, limit=20),
+    ]
+    deletes = [
+        scenario('delete_task', 'delete_task', 'DELETE', lambda i: f'/api/tasks/{s.victim("task", i)}/delete',
+                 limit=len(s.ids['task']) // 2),
+        scenario('delete_idea', 'delete_idea', 'DELETE', lambda i: f'/api/ideas/{s.victim("idea", i)}/delete',
+                 limit=len(s.ids['idea']) // 2),
+        scenario('delete_link', 'delete_link', 'DELETE', lambda i: f'/api/links/{s.victim("link", i)}/delete',
+                 limit=len(s.ids['link']) // 2),
+        scenario('delete_note', 'delete_note', 'DELETE', lambda i: f'/api/notes/{s.victim("note", i)}/delete',
+                 limit=len(s.ids['note']) // 2),
+        scenario('delete_project', 'delete_project', 'DELETE',
+                 lambda i: f'/api/projects/{s.projects[len(s.projects) - 1 - i]}/delete', limit=len(s.projects) // 2),
+    ]
+    return reads + writes + deletes
+
+def uncovered_endpoints(app, scenarios):
+    covered = {item.endpoint for item in scenarios}
+    return sorted(
+        rule.endpoint for rule in app.url_map.iter_rules()
+        if rule.endpoint not in covered and rule.endpoint not in SKIPPED_ENDPOINTS
+    )
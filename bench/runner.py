@@ -0,0 +1,185 @@
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+from bench import ROOT
+
+# Counts statements per request by wrapping the app's connection factory;
+# every connection the app opens reports to the thread that is running it.
+# SQLite also traces trigger bodies and FTS5 internals: those arrive as
+# '-- ' comments or as a repeat of the statement that fired them, and are
+# not counted.
+class QueryCounter:
+    def __init__(self, focus):
+        self.local = threading.local()
+        connect_db = focus.connect_db
+        
+        def counting_connect_db(*args, **kwargs):
+            db = connect_db(*args, **kwargs)
+            db.set_trace_callback(self.count)
+            return db
+        
+        focus.connect_db = counting_connect_db
+        focus.close_thread_connections()
+    
+    def count(self, statement):
+        if statement.startswith('--') or statement == getattr(self.local, 'last', None):
+            return
+        self.local.last = statement
+        self.local.queries = getattr(self.local, 'queries', 0) + 1
+    
+    def reset(self):
+        self.local.queries = 0
+        self.local.last = None
+    
+    def read(self):
+        return getattr(self.local, 'queries', 0)
+
+class TestClientTransport:
+    def __init__(self, focus):
+        self.app = focus.app
+        self.counter = QueryCounter(focus)
+        self.local = threading.local()
+    
+    def send(self, method, path, request):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        self.counter.reset()
+        response = client.open(path, method=method, **request)
+        response.get_data()
+        response.close()
+        return response.status_code, self.counter.read()
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+    
+    def send(self, method, path, request):
+        headers = dict(request.get('headers', {}))
+        data = request.get('data')
+        if 'json' in request:
+            data = json.dumps(request['json'])
+            headers['Content-Type'] = 'application/json'
+        elif 'content_type' in request:
+            headers['Content-Type'] = request['content_type']
+        if isinstance(data, str):
+            data = data.encode()
+        http_request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(http_request) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'queries_per_request': None,
+    }
+    if queries and all(count is not None for count in queries):
+        summary['queries_per_request'] = round(statistics.fmean(queries), 2)
+    return summary
+
+def run_scenario(transport, scenario, requests, concurrency, warmup):
+    count = min(requests, scenario.limit) if scenario.limit is not None else requests
+    if count <= 0:
+        return None
+    # Only reads are warmed up; writes would use up the rows deletes target.
+    if scenario.method == 'GET':
+        for i in range(warmup):
+            transport.send(scenario.method, scenario.path(i), scenario.request(i))
+    
+    latencies = []
+    queries = []
+    errors = [0]
+    lock = threading.Lock()
+    indexes = iter(range(count))
+    
+    def worker():
+        while True:
+            with lock:
+                i = next(indexes, None)
+            if i is None:
+                return
+            path = scenario.path(i)
+            request = scenario.request(i)
+            started = time.perf_counter()
+            status, query_count = transport.send(scenario.method, path, request)
+            latency = time.perf_counter() - started
+            with lock:
+                latencies.append(latency)
+                queries.append(query_count)
+                if status >= 400:
+                    errors[0] += 1
+    
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, queries, errors[0], time.perf_counter() - started)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(transport, scenarios, requests, concurrency, warmup, metadata, only=None, progress=None):
+    results = {}
+    for scenario in scenarios:
+        if only and scenario.name not in only:
+            continue
+        summary = run_scenario(transport, scenario, requests, concurrency, warmup)
+        if summary is None:
+            continue
+        results[scenario.name] = {'endpoint': scenario.endpoint, 'method': scenario.method, **summary}
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'requests': requests,
+            'concurrency': concurrency,
+            **metadata,
+        },
+        'routes': results,
+    }
+
+def compare(baseline, current, metric='p95_ms', threshold=0.10):
+    rows = []
+    for name, result in current['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None or not before.get(metric):
+            rows.append((name, None, result.get(metric), None, False))
+            continue
+        change = (result[metric] - before[metric]) / before[metric]
+        rows.append((name, before[metric], result[metric], change, change > threshold))
+    return rows
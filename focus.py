@@ -1,25 +1,121 @@
-import os, json, sqlite3
+import os, re, gzip, hmac, json, time, zlib, heapq, queue, atexit, base64, shutil, signal, hashlib, sqlite3, threading, mimetypes
+import click
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from pathlib import Path
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, redirect, url_for, g
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from multiprocessing import RawValue
+from flask import Flask, Response, render_template, send_file, request, jsonify, redirect, url_for, g, get_template_attribute, has_request_context, make_response, stream_with_context, before_render_template, template_rendered
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
 
 DATABASE = os.environ.get('DATABASE_PATH', 'focus.db')
 
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+app.config['SQLITE_TEMP_STORE'] = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+app.config['SQLITE_STATEMENT_CACHE'] = int(os.environ.get('SQLITE_STATEMENT_CACHE', 256))
+
+app.config['WRITE_QUEUE'] = os.environ.get('WRITE_QUEUE', '0').lower() in ('1', 'true', 'yes')
+app.config['WRITE_QUEUE_BATCH_SIZE'] = int(os.environ.get('WRITE_QUEUE_BATCH_SIZE', 64))
+app.config['WRITE_QUEUE_WINDOW_MS'] = float(os.environ.get('WRITE_QUEUE_WINDOW_MS', 5))
+app.config['WRITE_QUEUE_ACK'] = os.environ.get('WRITE_QUEUE_ACK', 'durable')
+app.config['WRITE_QUEUE_TIMEOUT'] = float(os.environ.get('WRITE_QUEUE_TIMEOUT', 10))
+
+app.config['RANK_WEIGHT_PRIORITY'] = float(os.environ.get('RANK_WEIGHT_PRIORITY', 10))
+app.config['RANK_WEIGHT_DUE'] = float(os.environ.get('RANK_WEIGHT_DUE', 8))
+app.config['RANK_WEIGHT_QUICK'] = float(os.environ.get('RANK_WEIGHT_QUICK', 3))
+app.config['RANK_QUICK_MINUTES'] = float(os.environ.get('RANK_QUICK_MINUTES', 30))
+
+app.config['METRICS'] = os.environ.get('METRICS', '1').lower() in ('1', 'true', 'yes')
+app.config['SQLITE_BUSY_SLICE_MS'] = int(os.environ.get('SQLITE_BUSY_SLICE_MS', 50))
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 0))
+app.config['SLOW_QUERY_LOG_SIZE'] = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 100))
+
+app.config['EVENTS_LOG_SIZE'] = int(os.environ.get('EVENTS_LOG_SIZE', 1000))
+app.config['EVENTS_HEARTBEAT'] = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+app.config['EVENTS_SHARED'] = os.environ.get('EVENTS_SHARED', '0').lower() in ('1', 'true', 'yes')
+app.config['EVENTS_POLL_MS'] = float(os.environ.get('EVENTS_POLL_MS', 250))
+app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get('EVENTS_MAX_STREAMS', 0))
+
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 30))
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+if app.config['ARCHIVE_AFTER_DAYS'] < 0:
+    raise ValueError('ARCHIVE_AFTER_DAYS must be 0 or more')
+if app.config['ARCHIVE_BATCH_SIZE'] < 1:
+    raise ValueError('ARCHIVE_BATCH_SIZE must be at least 1')
+
+app.config['MAINTENANCE'] = os.environ.get('MAINTENANCE', '1').lower() in ('1', 'true', 'yes')
+app.config['MAINTENANCE_POLL'] = float(os.environ.get('MAINTENANCE_POLL', 30))
+app.config['MAINTENANCE_IDLE_SECONDS'] = float(os.environ.get('MAINTENANCE_IDLE_SECONDS', 5))
+app.config['MAINTENANCE_BUDGET_MS'] = float(os.environ.get('MAINTENANCE_BUDGET_MS', 2000))
+app.config['MAINTENANCE_CHECKPOINT_INTERVAL'] = float(os.environ.get('MAINTENANCE_CHECKPOINT_INTERVAL', 300))
+app.config['MAINTENANCE_OPTIMIZE_INTERVAL'] = float(os.environ.get('MAINTENANCE_OPTIMIZE_INTERVAL', 3600))
+app.config['MAINTENANCE_ANALYZE_INTERVAL'] = float(os.environ.get('MAINTENANCE_ANALYZE_INTERVAL', 86400))
+app.config['MAINTENANCE_VACUUM_INTERVAL'] = float(os.environ.get('MAINTENANCE_VACUUM_INTERVAL', 3600))
+app.config['MAINTENANCE_ANALYSIS_LIMIT'] = int(os.environ.get('MAINTENANCE_ANALYSIS_LIMIT', 1000))
+app.config['MAINTENANCE_VACUUM_STEP'] = int(os.environ.get('MAINTENANCE_VACUUM_STEP', 256))
+app.config['MAINTENANCE_SYNC_COMPACT_INTERVAL'] = float(os.environ.get('MAINTENANCE_SYNC_COMPACT_INTERVAL', 86400))
+app.config['MAINTENANCE_ARCHIVE_INTERVAL'] = float(os.environ.get('MAINTENANCE_ARCHIVE_INTERVAL', 3600))
+
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN', '')
+app.config['ADMIN_ALLOW_LOCALHOST'] = os.environ.get('ADMIN_ALLOW_LOCALHOST', '0').lower() in ('1', 'true', 'yes')
+app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR', '')
+app.config['BACKUP_INTERVAL'] = float(os.environ.get('BACKUP_INTERVAL', 0))
+app.config['BACKUP_RETAIN'] = int(os.environ.get('BACKUP_RETAIN', 7))
+app.config['BACKUP_COMPRESS'] = os.environ.get('BACKUP_COMPRESS', '1').lower() in ('1', 'true', 'yes')
+app.config['BACKUP_PAGES'] = int(os.environ.get('BACKUP_PAGES', 256))
+app.config['BACKUP_STEP_PAUSE_MS'] = float(os.environ.get('BACKUP_STEP_PAUSE_MS', 5))
+app.config['BACKUP_MAX_RESTARTS'] = int(os.environ.get('BACKUP_MAX_RESTARTS', 5))
+
+app.config['SERVE_HOST'] = os.environ.get('SERVE_HOST', '0.0.0.0')
+app.config['SERVE_PORT'] = int(os.environ.get('SERVE_PORT', 3287))
+app.config['SERVE_WORKERS'] = int(os.environ.get('SERVE_WORKERS', 0))
+app.config['SERVE_THREADS'] = int(os.environ.get('SERVE_THREADS', 8))
+app.config['SERVE_TIMEOUT'] = int(os.environ.get('SERVE_TIMEOUT', 30))
+app.config['SERVE_GRACEFUL_TIMEOUT'] = int(os.environ.get('SERVE_GRACEFUL_TIMEOUT', 30))
+app.config['SERVE_KEEP_ALIVE'] = int(os.environ.get('SERVE_KEEP_ALIVE', 5))
+app.config['SERVE_MAX_REQUESTS'] = int(os.environ.get('SERVE_MAX_REQUESTS', 0))
+app.config['REQUEST_TIMEOUT'] = float(os.environ.get('REQUEST_TIMEOUT', 0))
+
+app.config['COMPRESS'] = os.environ.get('COMPRESS', '1').lower() in ('1', 'true', 'yes')
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+app.config['SYNC_TOMBSTONE_DAYS'] = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+
+app.config['FRAGMENT_CACHE_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_BYTES', 8 * 1024 * 1024))
+
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 25))
+MAX_PAGE_SIZE = 200
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+
+# Stored timestamps are normalized to SQLite's 'YYYY-MM-DD HH:MM:SS', so a
+# single fromisoformat() parses them; repeated values come from the cache.
+@lru_cache(maxsize=4096)
 def format_date(date_string, format_string='%m/%d/%Y'):
     if not date_string:
         return None
     try:
-        if 'T' in date_string:
-            dt = datetime.fromisoformat(date_string.replace('Z', ''))
-        else:
-            try:
-                dt = datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S')
-            except:
-                dt = datetime.strptime(date_string, '%Y-%m-%d')
-        return dt.strftime(format_string)
-    except:
+        return datetime.fromisoformat(date_string).strftime(format_string)
+    except (TypeError, ValueError):
         return date_string
 
 def format_datetime(date_string, format_string='%m/%d %H:%M'):
@@ -28,23 +124,302 @@ def format_datetime(date_string, format_string='%m/%d %H:%M'):
 app.jinja_env.filters['strftime'] = format_date
 app.jinja_env.filters['format_datetime'] = format_datetime
 
-def get_db():
+# Request, SQL and render timings are collected in-process and exposed in
+# the Prometheus text format at /metrics.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+SQLITE_BUSY = 5
+SQLITE_BUSY_SNAPSHOT = 517
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{label_value(value)}"' for key, value in pairs) + '}'
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+    
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+    
+    def inc(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        key = (name, tuple(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[1][index] += 1
+                    break
+            histogram[2] += value
+            histogram[3] += 1
+    
+    def render(self, gauges=()):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (buckets, list(counts), total, count)
+                          for key, (buckets, counts, total, count) in self.histograms.items()}
+        
+        lines = []
+        described = set()
+        def header(name):
+            if name in described or name not in self.help:
+                return
+            described.add(name)
+            kind, text = self.help[name]
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+        
+        for (name, labels), value in sorted(counters.items()):
+            header(name)
+            lines.append(f'{name}{label_text(labels)} {value}')
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            header(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{label_text(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{label_text(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{label_text(labels)} {total}')
+            lines.append(f'{name}_count{label_text(labels)} {count}')
+        for name, value in gauges:
+            header(name)
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+metrics.describe('focus_requests_total', 'counter', 'HTTP requests by endpoint, method and status.')
+metrics.describe('focus_request_duration_seconds', 'histogram', 'Time to build a response, by endpoint.')
+metrics.describe('focus_request_queries', 'histogram', 'SQL statements executed per request, by endpoint.')
+metrics.describe('focus_db_statement_duration_seconds', 'histogram', 'Time spent executing SQL statements, by endpoint and statement kind.')
+metrics.describe('focus_db_busy_retries_total', 'counter', 'Statements retried because the database was locked by another connection.')
+metrics.describe('focus_db_lock_wait_seconds_total', 'counter', 'Time spent waiting for database locks.')
+metrics.describe('focus_db_busy_errors_total', 'counter', 'Statements that gave up waiting for a database lock.')
+metrics.describe('focus_slow_queries_total', 'counter', 'Statements slower than SLOW_QUERY_MS.')
+metrics.describe('focus_template_render_seconds', 'histogram', 'Template and fragment render time.')
+metrics.describe('focus_fragment_cache_requests_total', 'counter', 'Item fragment lookups in the render cache, by macro and result.')
+metrics.describe('focus_fragment_cache_evictions_total', 'counter', 'Fragments evicted to keep the render cache under FRAGMENT_CACHE_BYTES.')
+metrics.describe('focus_fragment_cache_bytes', 'gauge', 'Size of the rendered fragments held in the render cache.')
+metrics.describe('focus_fragment_cache_entries', 'gauge', 'Fragments held in the render cache.')
+metrics.describe('focus_backups_total', 'counter', 'Snapshots taken, by result.')
+metrics.describe('focus_backup_duration_seconds', 'histogram', 'Time to take, check and compress a snapshot.')
+metrics.describe('focus_maintenance_runs_total', 'counter', 'Maintenance job runs, by job and status.')
+metrics.describe('focus_maintenance_seconds', 'histogram', 'Maintenance job duration, by job.')
+metrics.describe('focus_request_timeouts_total', 'counter', 'Requests interrupted after REQUEST_TIMEOUT, by endpoint.')
+metrics.describe('focus_write_queue_pending', 'gauge', 'Inserts waiting in the write queue.')
+metrics.describe('focus_change_feed_last_id', 'gauge', 'Id of the last change published to /api/events.')
+metrics.describe('focus_event_streams', 'gauge', 'Open /api/events streams.')
+metrics.describe('focus_event_streams_rejected_total', 'counter', 'Event streams refused at EVENTS_MAX_STREAMS.')
+
+slow_queries = deque()
+slow_queries_lock = threading.Lock()
+
+def metrics_scope():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return threading.current_thread().name
+
+STATEMENT_KINDS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'COMMIT', 'ROLLBACK',
+                   'SAVEPOINT', 'RELEASE', 'PRAGMA')
+
+def statement_kind(sql):
+    words = sql.lstrip().split(None, 1)
+    kind = words[0].upper() if words else ''
+    return kind if kind in STATEMENT_KINDS else 'OTHER'
+
+def record_slow_query(db, sql, parameters, seconds, scope):
+    metrics.inc('focus_slow_queries_total', [('endpoint', scope)])
+    plan = []
+    if statement_kind(sql) in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'):
+        try:
+            plan = [row[3] for row in sqlite3.Connection.execute(db, 'EXPLAIN QUERY PLAN ' + sql, parameters)]
+        except sqlite3.Error:
+            pass
+    entry = {
+        'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'endpoint': scope,
+        'ms': round(seconds * 1000, 3),
+        'sql': ' '.join(sql.split()),
+        'plan': plan,
+    }
+    with slow_queries_lock:
+        slow_queries.append(entry)
+        while len(slow_queries) > app.config['SLOW_QUERY_LOG_SIZE']:
+            slow_queries.popleft()
+    app.logger.warning('Slow query (%.1f ms, %s): %s | plan: %s', entry['ms'], scope, entry['sql'], '; '.join(plan) or '-')
+
+def is_busy(error):
+    # sqlite_errorcode only exists on Python 3.11+; before that the message
+    # is all there is to go by.
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is None:
+        return str(error).startswith('database is locked')
+    return code & 0xff == SQLITE_BUSY
+
+# Statements that never wait for the write lock.
+UNSLICED_KINDS = ('SELECT', 'SAVEPOINT', 'RELEASE', 'ROLLBACK', 'PRAGMA')
+
+def traced(db, method, sql, parameters):
+    # The connection keeps the full SQLITE_BUSY_TIMEOUT, so commit(),
+    # executescript() and anything else that bypasses this wrapper still
+    # waits as long as configured. A statement that may take the write lock
+    # runs with busy_timeout cut to one SQLITE_BUSY_SLICE_MS slice instead,
+    # and each further slice is counted as a retry until the full timeout is
+    # used up. SQLITE_BUSY_SNAPSHOT is not retried: the transaction read a
+    # snapshot that is now stale, and only rolling it back can help.
+    scope = metrics_scope()
+    kind = statement_kind(sql)
+    sliced = db.sliced and kind not in UNSLICED_KINDS
+    budget = app.config['SQLITE_BUSY_TIMEOUT'] / 1000
+    if sliced:
+        sqlite3.Connection.execute(db, 'PRAGMA busy_timeout = %d' % app.config['SQLITE_BUSY_SLICE_MS'])
+    started = time.perf_counter()
+    try:
+        while True:
+            attempt = time.perf_counter()
+            try:
+                result = method(sql, parameters)
+                break
+            except sqlite3.OperationalError as e:
+                if not is_busy(e):
+                    raise
+                waited = time.perf_counter() - started
+                metrics.inc('focus_db_lock_wait_seconds_total', [('endpoint', scope)], time.perf_counter() - attempt)
+                if not sliced or waited >= budget or getattr(e, 'sqlite_errorcode', None) == SQLITE_BUSY_SNAPSHOT:
+                    metrics.inc('focus_db_busy_errors_total', [('endpoint', scope)])
+                    raise
+                metrics.inc('focus_db_busy_retries_total', [('endpoint', scope)])
+    finally:
+        if sliced:
+            sqlite3.Connection.execute(db, 'PRAGMA busy_timeout = %d' % app.config['SQLITE_BUSY_TIMEOUT'])
+    
+    elapsed = time.perf_counter() - started
+    metrics.observe('focus_db_statement_duration_seconds', elapsed, [('endpoint', scope), ('kind', kind)])
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+    slow_ms = app.config['SLOW_QUERY_MS']
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        record_slow_query(db, sql, parameters, elapsed, scope)
+    return result
+
+class TracingCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return traced(self.connection, super().execute, sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return traced(self.connection, super().executemany, sql, seq_of_parameters)
+
+class TracingConnection(sqlite3.Connection):
+    # Read-only connections never take the write lock; connect_db() turns
+    # slicing off for them.
+    sliced = True
+    
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# Connections live for the lifetime of their thread rather than a single
+# request. GET/HEAD requests get a separate read-only connection so dashboard
+# reads never queue behind a writer.
+_connections = threading.local()
+
+def connect_db(readonly=False):
+    cached_statements = app.config['SQLITE_STATEMENT_CACHE']
+    factory = TracingConnection if app.config['METRICS'] else sqlite3.Connection
+    if readonly:
+        uri = Path(DATABASE).resolve().as_uri() + '?mode=ro'
+        db = sqlite3.connect(uri, uri=True, cached_statements=cached_statements, factory=factory)
+    else:
+        db = sqlite3.connect(DATABASE, cached_statements=cached_statements, factory=factory)
+    db.row_factory = sqlite3.Row
+    
+    temp_store = app.config['SQLITE_TEMP_STORE'].upper()
+    if temp_store not in ('DEFAULT', 'FILE', 'MEMORY'):
+        temp_store = 'DEFAULT'
+    if readonly and app.config['METRICS']:
+        db.sliced = False
+    db.execute('PRAGMA busy_timeout = %d' % int(app.config['SQLITE_BUSY_TIMEOUT']))
+    db.execute('PRAGMA cache_size = %d' % int(app.config['SQLITE_CACHE_SIZE']))
+    db.execute('PRAGMA mmap_size = %d' % int(app.config['SQLITE_MMAP_SIZE']))
+    db.execute('PRAGMA temp_store = %s' % temp_store)
+    if not readonly:
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+    return db
+
+def thread_connection(readonly=False):
+    key = 'readonly' if readonly else 'readwrite'
+    db = getattr(_connections, key, None)
+    if db is None:
+        db = connect_db(readonly)
+        setattr(_connections, key, db)
+    return db
+
+def close_thread_connections():
+    for key in ('readonly', 'readwrite'):
+        db = getattr(_connections, key, None)
+        if db is not None:
+            db.close()
+            delattr(_connections, key)
+
+# With REQUEST_TIMEOUT set, statements still running that many seconds after
+# the request started are interrupted and the request answers 503. Streamed
+# exports and imports are allowed to run for as long as they need.
+UNTIMED_ENDPOINTS = ('export_data', 'import_data')
+
+def get_db(readonly=None):
     if 'db' not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        if readonly is None:
+            readonly = has_request_context() and request.method in ('GET', 'HEAD')
+        g.db = thread_connection(readonly)
+        timeout = app.config['REQUEST_TIMEOUT']
+        if timeout > 0 and has_request_context() and request.endpoint not in UNTIMED_ENDPOINTS:
+            deadline = g.get('request_started', time.perf_counter()) + timeout
+            g.db.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+            g.request_deadline = deadline
     return g.db
 
 def close_db(error):
     db = g.pop('db', None)
-    if db is not None:
-        db.close()
+    if db is not None and db.in_transaction:
+        db.rollback()
+    if db is not None and g.pop('request_deadline', None) is not None:
+        db.set_progress_handler(None, 0)
 
 @app.teardown_appcontext
 def close_db_on_teardown(error):
     close_db(error)
 
+@app.errorhandler(sqlite3.OperationalError)
+def request_timed_out(e):
+    if 'interrupt' not in str(e) or g.get('request_deadline') is None:
+        raise e
+    metrics.inc('focus_request_timeouts_total', [('endpoint', request.endpoint or 'unknown')])
+    return jsonify({'success': False, 'error': 'Request timed out'}), 503
+
 def init_db():
     db = sqlite3.connect(DATABASE)
+    db.execute('PRAGMA journal_mode = WAL')
     db.executescript('''
         CREATE TABLE IF NOT EXISTS projects (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -103,13 +478,30 @@ def init_db():
         );
         
         CREATE INDEX IF NOT EXISTS idx_tasks_project ON tasks(project_id);
-        CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(is_completed);
-        CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority);
         CREATE INDEX IF NOT EXISTS idx_ideas_project ON ideas(project_id);
         CREATE INDEX IF NOT EXISTS idx_links_project ON backburner_links(project_id);
         CREATE INDEX IF NOT EXISTS idx_notes_project ON notes(project_id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_project_completed ON tasks(project_id, is_completed, completed_at, id);
+        CREATE INDEX IF NOT EXISTS idx_ideas_project_created ON ideas(project_id, created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_links_project_created ON backburner_links(project_id, created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_notes_project_updated ON notes(project_id, updated_at, id);
+        CREATE INDEX IF NOT EXISTS idx_ideas_created ON ideas(created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_links_created ON backburner_links(created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_notes_updated ON notes(updated_at, id);
     ''')
     
+    init_archive(db)
+    init_counters(db)
+    init_stats(db)
+    init_search(db)
+    init_versions(db)
+    init_ranking(db)
+    init_maintenance(db)
+    init_tags(db)
+    init_change_events(db)
+    init_sync(db)
+    run_migrations(db)
+    
     cursor = db.execute('SELECT COUNT(*) FROM projects')
     if cursor.fetchone()[0] == 0:
         db.execute('''
@@ -120,490 +512,2850 @@ def init_db():
     db.commit()
     db.close()
 
-def dict_from_row(row):
-    return dict(row) if row else None
+# Values written to typed columns go through these expressions, so every
+# timestamp is stored as 'YYYY-MM-DD HH:MM:SS' (or NULL) and estimated_time
+# as a whole number of minutes (or NULL), whatever format the client sent.
+TIMESTAMP_SQL = 'datetime(?)'
+MINUTES_SQL = "NULLIF(CAST(NULLIF(?, '') AS INTEGER), 0)"
 
-def get_project_with_counts(project_id):
-    db = get_db()
+TYPED_COLUMNS = {
+    'projects': (('created_at', TIMESTAMP_SQL),),
+    'tasks': (('created_at', TIMESTAMP_SQL), ('completed_at', TIMESTAMP_SQL),
+              ('due_date', TIMESTAMP_SQL), ('estimated_time', MINUTES_SQL)),
+    'ideas': (('created_at', TIMESTAMP_SQL),),
+    'backburner_links': (('created_at', TIMESTAMP_SQL),),
+    'notes': (('created_at', TIMESTAMP_SQL), ('updated_at', TIMESTAMP_SQL)),
+}
+
+REQUIRED_TIMESTAMPS = ('created_at', 'updated_at')
+
+def migrate_normalize_columns(db):
+    for table, columns in TYPED_COLUMNS.items():
+        for column, expression in columns:
+            normalized = expression.replace('?', column)
+            if column in REQUIRED_TIMESTAMPS:
+                normalized = f'COALESCE({normalized}, CURRENT_TIMESTAMP)'
+            db.execute(f'UPDATE {table} SET {column} = {normalized} WHERE {column} IS NOT {normalized}')
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Switching auto_vacuum on an existing file only takes effect after a full
+# VACUUM, which rebuilds the file once; afterwards the maintenance worker
+# returns free pages to the filesystem a few at a time.
+def migrate_incremental_vacuum(db):
+    if db.execute('PRAGMA auto_vacuum').fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+        return
+    db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    db.execute('VACUUM')
+
+def migrate_index_tags(db):
+    for entity_type in TAGGED_TABLES:
+        index_tags(db, entity_type)
+
+def migrate_counters_reactivate(db):
+    db.execute('DROP TRIGGER IF EXISTS trg_projects_counters_reactivate')
+    db.execute(COUNTERS_REACTIVATE_TRIGGER)
+    rebuild_counters(db)
+
+def migrate_sync_log(db):
+    for entity_type, table in SYNC_TABLES.items():
+        db.execute(f'''
+            INSERT OR IGNORE INTO sync_changes (entity_type, item_id, version, deleted)
+            SELECT ?, id, (SELECT version FROM sync_state) + ROW_NUMBER() OVER (ORDER BY id), {sync_deleted_sql(entity_type, '')}
+            FROM {table}
+        ''', (entity_type,))
+        db.execute('UPDATE sync_state SET version = (SELECT COALESCE(MAX(version), 0) FROM sync_changes)')
+
+# Schema changes that have to rewrite existing data live here. Each runs
+# once, in order, and is recorded in schema_version. Transactional ones run
+# in their own transaction; the others (VACUUM cannot run inside one) must
+# be safe to repeat if they are interrupted.
+MIGRATIONS = (
+    (1, 'Normalize timestamps and estimated times', migrate_normalize_columns, True),
+    (2, 'Enable incremental auto-vacuum', migrate_incremental_vacuum, False),
+    (3, 'Index existing tags', migrate_index_tags, True),
+    (4, 'Record existing rows in the sync log', migrate_sync_log, True),
+    (5, 'Count archived tasks when a project is reactivated', migrate_counters_reactivate, True),
+)
+
+def schema_version(db):
+    return db.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+def run_migrations(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.commit()
     
-    project = db.execute(
-        'SELECT * FROM projects WHERE id = ? AND is_active = 1',
-        (project_id,)
-    ).fetchone()
+    applied = []
+    for version, name, migrate, transactional in MIGRATIONS:
+        if version <= schema_version(db):
+            continue
+        if not transactional:
+            migrate(db)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= schema_version(db):
+                db.rollback()
+                continue
+            if transactional:
+                migrate(db)
+            db.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append((version, name))
+    return applied
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and apply pending schema migrations."""
+    init_db()
+    db = sqlite3.connect(DATABASE)
+    for version, name, applied_at in db.execute('SELECT version, name, applied_at FROM schema_version ORDER BY version'):
+        click.echo(f'{version:>4}  {applied_at}  {name}')
+    db.close()
+
+# Per-project counters are kept in project_counters by triggers so the
+# dashboard can read every project's counts with a single join.
+COUNTED_ITEMS = (
+    ('ideas', 'idea_count'),
+    ('notes', 'note_count'),
+    ('backburner_links', 'link_count'),
+)
+
+COUNTERS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS project_counters (
+        project_id INTEGER PRIMARY KEY,
+        open_task_count INTEGER NOT NULL DEFAULT 0,
+        completed_task_count INTEGER NOT NULL DEFAULT 0,
+        idea_count INTEGER NOT NULL DEFAULT 0,
+        note_count INTEGER NOT NULL DEFAULT 0,
+        link_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+    );
     
-    if not project:
-        return None
+    CREATE TRIGGER IF NOT EXISTS trg_projects_counters_insert
+    AFTER INSERT ON projects WHEN NEW.is_active = 1
+    BEGIN
+        INSERT OR IGNORE INTO project_counters (project_id) VALUES (NEW.id);
+    END;
     
-    project = dict(project)
+    CREATE TRIGGER IF NOT EXISTS trg_projects_counters_deactivate
+    AFTER UPDATE OF is_active ON projects WHEN NEW.is_active = 0 AND OLD.is_active = 1
+    BEGIN
+        DELETE FROM project_counters WHERE project_id = NEW.id;
+    END;
     
-    task_count = db.execute(
-        'SELECT COUNT(*) FROM tasks WHERE project_id = ? AND is_completed = 0',
-        (project_id,)
-    ).fetchone()[0]
+    CREATE TRIGGER IF NOT EXISTS trg_projects_counters_delete
+    AFTER DELETE ON projects
+    BEGIN
+        DELETE FROM project_counters WHERE project_id = OLD.id;
+    END;
     
-    completed_count = db.execute(
-        'SELECT COUNT(*) FROM tasks WHERE project_id = ? AND is_completed = 1',
-        (project_id,)
-    ).fetchone()[0]
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_counters_insert
+    AFTER INSERT ON tasks WHEN NEW.project_id IS NOT NULL
+    BEGIN
+        UPDATE project_counters
+        SET open_task_count = open_task_count + (NEW.is_completed = 0),
+            completed_task_count = completed_task_count + (NEW.is_completed = 1)
+        WHERE project_id = NEW.project_id;
+    END;
     
-    idea_count = db.execute(
-        'SELECT COUNT(*) FROM ideas WHERE project_id = ?',
-        (project_id,)
-    ).fetchone()[0]
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_counters_delete
+    AFTER DELETE ON tasks WHEN OLD.project_id IS NOT NULL
+    BEGIN
+        UPDATE project_counters
+        SET open_task_count = open_task_count - (OLD.is_completed = 0),
+            completed_task_count = completed_task_count - (OLD.is_completed = 1)
+        WHERE project_id = OLD.project_id;
+    END;
     
-    note_count = db.execute(
-        'SELECT COUNT(*) FROM notes WHERE project_id = ?',
-        (project_id,)
-    ).fetchone()[0]
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_counters_update
+    AFTER UPDATE OF is_completed, project_id ON tasks
+    BEGIN
+        UPDATE project_counters
+        SET open_task_count = open_task_count - (OLD.is_completed = 0),
+            completed_task_count = completed_task_count - (OLD.is_completed = 1)
+        WHERE project_id = OLD.project_id;
+        UPDATE project_counters
+        SET open_task_count = open_task_count + (NEW.is_completed = 0),
+            completed_task_count = completed_task_count + (NEW.is_completed = 1)
+        WHERE project_id = NEW.project_id;
+    END;
+''' + ''.join(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_insert
+    AFTER INSERT ON {table} WHEN NEW.project_id IS NOT NULL
+    BEGIN
+        UPDATE project_counters SET {column} = {column} + 1
+        WHERE project_id = NEW.project_id;
+    END;
     
-    project['task_count'] = task_count
-    project['completed_count'] = completed_count
-    project['idea_count'] = idea_count
-    project['note_count'] = note_count
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_delete
+    AFTER DELETE ON {table} WHEN OLD.project_id IS NOT NULL
+    BEGIN
+        UPDATE project_counters SET {column} = {column} - 1
+        WHERE project_id = OLD.project_id;
+    END;
     
-    return project
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_counters_update
+    AFTER UPDATE OF project_id ON {table}
+    WHEN OLD.project_id IS NOT NEW.project_id
+    BEGIN
+        UPDATE project_counters SET {column} = {column} - 1
+        WHERE project_id = OLD.project_id;
+        UPDATE project_counters SET {column} = {column} + 1
+        WHERE project_id = NEW.project_id;
+    END;
+''' for table, column in COUNTED_ITEMS)
 
-@app.route('/')
-def index():
+COUNTERS_QUERY = '''
+    SELECT p.id AS project_id,
+        (SELECT COUNT(*) FROM tasks WHERE project_id = p.id AND is_completed = 0) AS open_task_count,
+        (SELECT COUNT(*) FROM tasks WHERE project_id = p.id AND is_completed = 1)
+            + (SELECT COUNT(*) FROM archived_items
+               WHERE project_id = p.id AND entity_type = 'task' AND json_extract(data, '$.is_completed') = 1)
+            AS completed_task_count,
+        (SELECT COUNT(*) FROM ideas WHERE project_id = p.id) AS idea_count,
+        (SELECT COUNT(*) FROM notes WHERE project_id = p.id) AS note_count,
+        (SELECT COUNT(*) FROM backburner_links WHERE project_id = p.id) AS link_count
+    FROM projects p
+    WHERE p.is_active = 1
+'''
+
+COUNTER_COLUMNS = ('open_task_count', 'completed_task_count', 'idea_count', 'note_count', 'link_count')
+
+# A reactivated project is recounted with COUNTERS_QUERY itself, so its
+# archived tasks are counted the same way a rebuild counts them.
+COUNTERS_REACTIVATE_TRIGGER = f'''
+    CREATE TRIGGER IF NOT EXISTS trg_projects_counters_reactivate
+    AFTER UPDATE OF is_active ON projects WHEN NEW.is_active = 1 AND OLD.is_active = 0
+    BEGIN
+        INSERT OR REPLACE INTO project_counters (project_id, {', '.join(COUNTER_COLUMNS)})
+        {COUNTERS_QUERY.rstrip()} AND p.id = NEW.id;
+    END;
+'''
+
+def init_counters(db):
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'project_counters'"
+    ).fetchone()
+    db.executescript(COUNTERS_SCHEMA + COUNTERS_REACTIVATE_TRIGGER)
+    if not exists:
+        rebuild_counters(db)
+
+def rebuild_counters(db):
+    db.execute('DELETE FROM project_counters')
+    db.execute(f'''
+        INSERT INTO project_counters (project_id, {', '.join(COUNTER_COLUMNS)})
+        {COUNTERS_QUERY}
+    ''')
+
+def verify_counters(db):
+    stored = {
+        row[0]: tuple(row[1:])
+        for row in db.execute(f"SELECT project_id, {', '.join(COUNTER_COLUMNS)} FROM project_counters")
+    }
+    mismatches = []
+    for row in db.execute(COUNTERS_QUERY):
+        expected = tuple(row[1:])
+        actual = stored.pop(row[0], None)
+        if actual != expected:
+            mismatches.append((row[0], actual, expected))
+    for project_id, actual in stored.items():
+        mismatches.append((project_id, actual, None))
+    return mismatches
+
+@app.cli.group()
+def counters():
+    """Maintain the per-project counters table."""
+
+@counters.command('rebuild')
+def counters_rebuild_command():
+    """Recompute every project's counters from the item tables."""
     db = get_db()
+    rebuild_counters(db)
+    db.commit()
+    click.echo('Rebuilt counters for %d projects' % db.execute('SELECT COUNT(*) FROM project_counters').fetchone()[0])
+
+@counters.command('verify')
+@click.option('--fix', is_flag=True, help='Rebuild the counters if any mismatch is found.')
+def counters_verify_command(fix):
+    """Compare stored counters against a full recount."""
+    db = get_db()
+    mismatches = verify_counters(db)
+    for project_id, actual, expected in mismatches:
+        click.echo(f'project {project_id}: stored={actual} expected={expected}')
+    if not mismatches:
+        click.echo('Counters OK')
+        return
+    if fix:
+        rebuild_counters(db)
+        db.commit()
+        click.echo('Counters rebuilt')
+    else:
+        raise SystemExit(1)
+
+# Completion stats. Tasks created and completed are rolled up per project
+# into daily and weekly buckets (UTC days, weeks starting on Monday), so a
+# range query reads one row per period and project however many tasks there
+# are. Triggers keep the rollups current on every write: archived tasks stay
+# counted and deleted ones drop out. Tasks without a project use project 0.
+STATS_PERIODS = {
+    'day': ('task_stats_daily', 'date({})'),
+    'week': ('task_stats_weekly', "date({}, 'weekday 0', '-6 days')"),
+}
+
+ENERGY_LEVELS = ('low', 'medium', 'high')
+
+STATS_COLUMNS = ('created_count', 'completed_count', 'completed_minutes') + tuple(
+    f'completed_{level}_energy' for level in ENERGY_LEVELS
+)
+
+STATS_MAX_DAYS = 3660
+
+STATS_TASK_COLUMNS = ('created_at', 'completed_at', 'is_completed', 'estimated_time', 'energy_level')
+
+# The task columns each event's contribution depends on.
+STATS_EVENT_COLUMNS = {
+    'created': ('created_at', 'project_id'),
+    'completed': ('is_completed', 'completed_at', 'project_id', 'estimated_time', 'energy_level'),
+}
+
+def task_stats_values(field, event):
+    if event == 'created':
+        return {'created_count': '1'}
+    values = {'completed_count': '1', 'completed_minutes': f"COALESCE({field('estimated_time')}, 0)"}
+    for level in ENERGY_LEVELS:
+        values[f'completed_{level}_energy'] = f"({field('energy_level')} IS '{level}')"
+    return values
+
+# Rows whose timestamp does not parse as a date (or is NULL) are left out.
+def task_stats_condition(field, event, bucket):
+    if event == 'created':
+        return f"{bucket.format(field('created_at'))} IS NOT NULL"
+    return f"{field('is_completed')} = 1 AND {bucket.format(field('completed_at'))} IS NOT NULL"
+
+# Adds (sign 1) or removes (sign -1) one task's creation or completion in
+# every period table. `field` maps a task column to its SQL expression.
+def task_stats_sql(field, event, sign):
+    timestamp = field('created_at' if event == 'created' else 'completed_at')
+    values = task_stats_values(field, event)
+    return ''.join(f'''
+            INSERT INTO {table} (period, project_id, {', '.join(values)})
+            SELECT {bucket.format(timestamp)}, COALESCE({field('project_id')}, 0),
+                {', '.join(f'{sign} * {value}' for value in values.values())}
+            WHERE {task_stats_condition(field, event, bucket)}
+            ON CONFLICT (period, project_id) DO UPDATE SET
+                {', '.join(f'{column} = {column} + excluded.{column}' for column in values)};'''
+        for table, bucket in STATS_PERIODS.values())
+
+def task_field(row):
+    return lambda column: f'{row}.{column}'
+
+# Archived tasks keep their columns as JSON, apart from project_id.
+def archived_task_field(row):
+    return lambda column: f'{row}.project_id' if column == 'project_id' else f"json_extract({row}.data, '$.{column}')"
+
+def task_stats_changed(event):
+    return ' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in STATS_EVENT_COLUMNS[event])
+
+def task_stats_trigger(name, timing, removed, added, events=('created', 'completed')):
+    body = ''.join(
+        (task_stats_sql(removed, event, -1) if removed else '') + (task_stats_sql(added, event, 1) if added else '')
+        for event in events
+    )
+    return f'''
+    CREATE TRIGGER IF NOT EXISTS {name}
+    {timing}
+    BEGIN{body}
+    END;
+    '''
+
+STATS_SCHEMA = ''.join(f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        period TEXT NOT NULL,
+        project_id INTEGER NOT NULL,
+        {' '.join(f'{column} INTEGER NOT NULL DEFAULT 0,' for column in STATS_COLUMNS)}
+        PRIMARY KEY (period, project_id)
+    ) WITHOUT ROWID;
     
-    projects = []
-    project_rows = db.execute(
-        'SELECT * FROM projects WHERE is_active = 1 ORDER BY created_at DESC'
-    ).fetchall()
+    CREATE INDEX IF NOT EXISTS idx_{table}_project ON {table}(project_id, period);
+''' for table, _ in STATS_PERIODS.values()) + ''.join((
+    task_stats_trigger('trg_tasks_stats_insert', 'AFTER INSERT ON tasks', None, task_field('NEW')),
+    task_stats_trigger('trg_tasks_stats_delete', 'AFTER DELETE ON tasks', task_field('OLD'), None),
+    task_stats_trigger(
+        'trg_tasks_stats_created_update',
+        f"AFTER UPDATE OF {', '.join(STATS_EVENT_COLUMNS['created'])} ON tasks WHEN {task_stats_changed('created')}",
+        task_field('OLD'), task_field('NEW'), ('created',)
+    ),
+    task_stats_trigger(
+        'trg_tasks_stats_completed_update',
+        f"AFTER UPDATE OF {', '.join(STATS_EVENT_COLUMNS['completed'])} ON tasks "
+        f"WHEN (OLD.is_completed = 1 OR NEW.is_completed = 1) AND ({task_stats_changed('completed')})",
+        task_field('OLD'), task_field('NEW'), ('completed',)
+    ),
+    task_stats_trigger('trg_archived_items_stats_insert', "AFTER INSERT ON archived_items WHEN NEW.entity_type = 'task'",
+                       None, archived_task_field('NEW')),
+    task_stats_trigger('trg_archived_items_stats_delete', "AFTER DELETE ON archived_items WHEN OLD.entity_type = 'task'",
+                       archived_task_field('OLD'), None),
+))
+
+STATS_TASKS_QUERY = f'''
+    SELECT project_id, {', '.join(STATS_TASK_COLUMNS)} FROM tasks
+    UNION ALL
+    SELECT project_id, {', '.join(f'{archived_task_field("a")(column)} AS {column}' for column in STATS_TASK_COLUMNS)}
+    FROM archived_items a
+    WHERE entity_type = 'task'
+'''
+
+def init_stats(db):
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'task_stats_daily'"
+    ).fetchone()
+    db.executescript(STATS_SCHEMA)
+    if not exists:
+        rebuild_stats(db)
+
+def rebuild_stats(db):
+    field = lambda column: column
+    for table, bucket in STATS_PERIODS.values():
+        selects = []
+        for event in ('created', 'completed'):
+            values = task_stats_values(field, event)
+            selects.append(f'''
+                SELECT {bucket.format(field('created_at' if event == 'created' else 'completed_at'))} AS period,
+                    COALESCE(project_id, 0) AS project_id,
+                    {', '.join(f'{values.get(column, 0)} AS {column}' for column in STATS_COLUMNS)}
+                FROM all_tasks
+                WHERE {task_stats_condition(field, event, bucket)}
+            ''')
+        db.execute(f'DELETE FROM {table}')
+        db.execute(f'''
+            WITH all_tasks AS ({STATS_TASKS_QUERY})
+            INSERT INTO {table} (period, project_id, {', '.join(STATS_COLUMNS)})
+            SELECT period, project_id, {', '.join(f'SUM({column})' for column in STATS_COLUMNS)}
+            FROM ({' UNION ALL '.join(selects)})
+            GROUP BY period, project_id
+        ''')
+
+def utc_today():
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+def stats_entry(values):
+    return {
+        'created': values['created_count'],
+        'completed': values['completed_count'],
+        'completed_minutes': values['completed_minutes'],
+        'completed_by_energy': {level: values[f'completed_{level}_energy'] for level in ENERGY_LEVELS},
+    }
+
+# Reads one rollup row per period (per project, unless one is given) and
+# fills the periods without activity with zeros.
+def task_stats(db, period, start, end, project_id=None):
+    table, bucket = STATS_PERIODS[period]
+    start = db.execute(f"SELECT {bucket.format('?')}", (start,)).fetchone()[0]
+    where = ['period BETWEEN ? AND ?']
+    params = [start, end]
+    if project_id is not None:
+        where.append('project_id = ?')
+        params.append(project_id)
+    rows = {
+        row['period']: row
+        for row in db.execute(f'''
+            SELECT period, {', '.join(f'SUM({column}) AS {column}' for column in STATS_COLUMNS)}
+            FROM {table}
+            WHERE {' AND '.join(where)}
+            GROUP BY period
+        ''', params)
+    }
     
-    for row in project_rows:
-        project = dict(row)
-        
-        task_count = db.execute(
-            'SELECT COUNT(*) FROM tasks WHERE project_id = ? AND is_completed = 0',
-            (project['id'],)
-        ).fetchone()[0]
+    step = timedelta(days=1 if period == 'day' else 7)
+    current = datetime.strptime(start, '%Y-%m-%d')
+    last = datetime.strptime(end, '%Y-%m-%d')
+    totals = dict.fromkeys(STATS_COLUMNS, 0)
+    series = []
+    while current <= last:
+        key = current.strftime('%Y-%m-%d')
+        row = rows.get(key)
+        values = {column: row[column] if row else 0 for column in STATS_COLUMNS}
+        for column in STATS_COLUMNS:
+            totals[column] += values[column]
+        series.append({'period': key, **stats_entry(values)})
+        current += step
+    return {'period': period, 'from': start, 'to': end, 'project_id': project_id,
+            'totals': stats_entry(totals), 'series': series}
+
+@app.cli.group()
+def stats():
+    """Maintain the completion stats rollups."""
+
+@stats.command('rebuild')
+def stats_rebuild_command():
+    """Recompute the daily and weekly rollups from every task, archived ones included."""
+    started = time.perf_counter()
+    db = get_db()
+    rebuild_stats(db)
+    db.commit()
+    days = db.execute('SELECT COUNT(DISTINCT period) FROM task_stats_daily').fetchone()[0]
+    click.echo(f'Rebuilt stats for {days} days in {time.perf_counter() - started:.2f}s')
+
+# Full-text search uses one external-content FTS5 table per entity type; the
+# triggers below keep each index in step with its content table.
+SEARCH_INDEXES = {
+    'project': ('projects', 'search_projects', ('name', 'description'), (10.0, 1.0)),
+    'task': ('tasks', 'search_tasks', ('title', 'description'), (10.0, 1.0)),
+    'idea': ('ideas', 'search_ideas', ('title', 'description', 'tags'), (10.0, 1.0, 5.0)),
+    'link': ('backburner_links', 'search_links', ('title', 'url', 'description', 'tags'), (10.0, 3.0, 1.0, 5.0)),
+    'note': ('notes', 'search_notes', ('title', 'content', 'tags'), (10.0, 1.0, 5.0)),
+}
+
+SEARCH_MARK_START = '\x02'
+SEARCH_MARK_END = '\x03'
+
+def search_schema(table, index, columns):
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'NEW.{c}' for c in columns)
+    old_cols = ', '.join(f'OLD.{c}' for c in columns)
+    return f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+            {cols}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );
         
-        idea_count = db.execute(
-            'SELECT COUNT(*) FROM ideas WHERE project_id = ?',
-            (project['id'],)
-        ).fetchone()[0]
+        CREATE TRIGGER IF NOT EXISTS trg_{index}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {index} (rowid, {cols}) VALUES (NEW.id, {new_cols});
+        END;
         
-        note_count = db.execute(
-            'SELECT COUNT(*) FROM notes WHERE project_id = ?',
-            (project['id'],)
-        ).fetchone()[0]
+        CREATE TRIGGER IF NOT EXISTS trg_{index}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {index} ({index}, rowid, {cols}) VALUES ('delete', OLD.id, {old_cols});
+        END;
         
-        project['task_count'] = task_count
-        project['idea_count'] = idea_count
-        project['note_count'] = note_count
-        projects.append(project)
-    
-    today = datetime.now().strftime('%Y-%m-%d')
-    focus_tasks = db.execute('''
-        SELECT t.*, p.name as project_name
-        FROM tasks t
-        LEFT JOIN projects p ON t.project_id = p.id
-        WHERE t.is_completed = 0
-        AND (t.priority IN ('high', 'urgent') OR DATE(t.due_date) = ?)
-        ORDER BY 
-            CASE t.priority 
-                WHEN 'urgent' THEN 4 
-                WHEN 'high' THEN 3 
-                WHEN 'medium' THEN 2 
-                ELSE 1 
-            END DESC, 
-            t.due_date ASC
-        LIMIT 5
-    ''', (today,)).fetchall()
-    
-    focus_tasks = [dict(row) for row in focus_tasks]
-    
-    recent_ideas = db.execute('''
-        SELECT i.*, p.name as project_name
-        FROM ideas i
-        LEFT JOIN projects p ON i.project_id = p.id
-        ORDER BY i.created_at DESC
-        LIMIT 3
-    ''').fetchall()
-    
-    recent_ideas = [dict(row) for row in recent_ideas]
+        CREATE TRIGGER IF NOT EXISTS trg_{index}_update AFTER UPDATE OF {cols} ON {table}
+        BEGIN
+            INSERT INTO {index} ({index}, rowid, {cols}) VALUES ('delete', OLD.id, {old_cols});
+            INSERT INTO {index} (rowid, {cols}) VALUES (NEW.id, {new_cols});
+        END;
+    '''
 
-    recent_notes = db.execute('''
-        SELECT n.*, p.name as project_name
-        FROM notes n
-        LEFT JOIN projects p ON n.project_id = p.id
-        ORDER BY n.updated_at DESC
-        LIMIT 3
-    ''').fetchall()
+def init_search(db):
+    existing = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    try:
+        for table, index, columns, _ in SEARCH_INDEXES.values():
+            db.executescript(search_schema(table, index, columns))
+            if index not in existing:
+                db.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+    except sqlite3.OperationalError as e:
+        if 'fts5' not in str(e):
+            raise
+        app.logger.warning('SQLite was built without FTS5; search is disabled')
 
-    recent_notes = [dict(row) for row in recent_notes]
-    
-    return render_template('index.html', 
-                         projects=projects, 
-                         focus_tasks=focus_tasks,
-                         recent_ideas=recent_ideas,
-                         recent_notes=recent_notes)
+def rebuild_search(db):
+    for _, index, _, _ in SEARCH_INDEXES.values():
+        db.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
 
-@app.route('/api/tasks/quick-add', methods=['POST'])
-def quick_add_task():
+def search_match_expression(query):
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms if term)
+
+def search_highlight(text):
+    if text is None:
+        return None
+    escaped = str(escape(text))
+    return escaped.replace(SEARCH_MARK_START, '<mark>').replace(SEARCH_MARK_END, '</mark>')
+
+@app.cli.group()
+def search():
+    """Maintain the full-text search indexes."""
+
+@search.command('rebuild')
+def search_rebuild_command():
+    """Backfill every search index from its content table."""
     db = get_db()
-    data = request.get_json()
-    
-    db.execute('''
-        INSERT INTO tasks (title, description, priority, energy_level, estimated_time, due_date, project_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data['title'],
-        data.get('description', ''),
-        data.get('priority', 'medium'),
-        data.get('energy_level', 'medium'),
-        data.get('estimated_time', ''),
-        data.get('due_date', ''),
-        data.get('project_id') if data.get('project_id') else None
-    ))
+    init_search(db)
+    rebuild_search(db)
     db.commit()
-    
-    return jsonify({'success': True})
+    click.echo('Rebuilt %d search indexes' % len(SEARCH_INDEXES))
 
-@app.route('/api/tasks/<int:task_id>/complete', methods=['POST'])
-def complete_task(task_id):
-    db = get_db()
+# Tags are normalized into tags/item_tags; the tags text column on each item
+# keeps a canonical 'a, b' copy for display and full-text search. item_tags
+# is keyed (entity_type, tag_id, item_id), so per-tag lookups and per-type
+# tag counts are range scans of the primary key.
+TAGGED_TABLES = {
+    'idea': 'ideas',
+    'link': 'backburner_links',
+    'note': 'notes',
+}
+
+TAG_MAX_LENGTH = 50
+
+TAGS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS tags (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE COLLATE NOCASE
+    );
     
-    task = db.execute('SELECT id FROM tasks WHERE id = ?', (task_id,)).fetchone()
-    if not task:
-        return jsonify({'success': False, 'error': 'Task not found'}), 404
+    CREATE TABLE IF NOT EXISTS item_tags (
+        entity_type TEXT NOT NULL,
+        tag_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        PRIMARY KEY (entity_type, tag_id, item_id),
+        FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
     
+    CREATE INDEX IF NOT EXISTS idx_item_tags_item ON item_tags(entity_type, item_id);
+''' + ''.join(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_tags_delete AFTER DELETE ON {table}
+    BEGIN
+        DELETE FROM item_tags WHERE entity_type = '{entity_type}' AND item_id = OLD.id;
+    END;
+''' for entity_type, table in TAGGED_TABLES.items())
+
+def init_tags(db):
+    db.executescript(TAGS_SCHEMA)
+
+def parse_tags(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, (list, tuple)):
+        raise TypeError('Tags must be a list or a comma-separated string')
+    names = []
+    seen = set()
+    for name in value:
+        if not isinstance(name, str):
+            raise TypeError('Tags must be strings')
+        name = ' '.join(name.split())[:TAG_MAX_LENGTH]
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+def tags_text(value):
+    return None if value is None else ', '.join(parse_tags(value))
+
+def set_item_tags(db, entity_type, item_id, names):
+    db.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', [(name,) for name in names])
+    tag_ids = [row[0] for row in db.execute(
+        'SELECT id FROM tags WHERE name IN (SELECT value FROM json_each(?))',
+        (json.dumps(names),)
+    )]
     db.execute('''
-        UPDATE tasks 
-        SET is_completed = 1, completed_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (task_id,))
-    db.commit()
-    
-    return jsonify({'success': True})
+        DELETE FROM item_tags
+        WHERE entity_type = ? AND item_id = ? AND tag_id NOT IN (SELECT value FROM json_each(?))
+    ''', (entity_type, item_id, json.dumps(tag_ids)))
+    db.executemany(
+        'INSERT OR IGNORE INTO item_tags (entity_type, tag_id, item_id) VALUES (?, ?, ?)',
+        [(entity_type, tag_id, item_id) for tag_id in tag_ids]
+    )
 
-@app.route('/api/tasks/<int:task_id>/uncomplete', methods=['POST'])
-def uncomplete_task(task_id):
-    db = get_db()
-    
-    task = db.execute('SELECT id FROM tasks WHERE id = ?', (task_id,)).fetchone()
-    if not task:
-        return jsonify({'success': False, 'error': 'Task not found'}), 404
+def sync_item_tags(db, entity_type, item_id):
+    row = db.execute(f'SELECT tags FROM {TAGGED_TABLES[entity_type]} WHERE id = ?', (item_id,)).fetchone()
+    set_item_tags(db, entity_type, item_id, parse_tags(row[0] or '') if row else [])
+
+# Rebuilds item_tags from the tags text of every item with an id above
+# after_id, rewriting the text in canonical form where it differs.
+def index_tags(db, entity_type, after_id=0):
+    table = TAGGED_TABLES[entity_type]
+    rows = db.execute(f'''
+        SELECT id, tags FROM {table}
+        WHERE id > ? AND tags IS NOT NULL AND tags != ''
+    ''', (after_id,)).fetchall()
+    for item_id, text in rows:
+        names = parse_tags(text)
+        set_item_tags(db, entity_type, item_id, names)
+        if ', '.join(names) != text:
+            db.execute(f'UPDATE {table} SET tags = ? WHERE id = ?', (', '.join(names), item_id))
+    return len(rows)
+
+# Both forms look tags up by name and read item ids from the primary key;
+# 'all' intersects one such lookup per tag.
+def tag_filter(entity_type, names, match='all'):
+    if match == 'any':
+        return '''id IN (
+            SELECT item_id FROM item_tags
+            WHERE entity_type = ? AND tag_id IN (SELECT id FROM tags WHERE name IN (SELECT value FROM json_each(?)))
+        )''', [entity_type, json.dumps(names)]
+    clause = '''id IN (
+            SELECT item_id FROM item_tags
+            WHERE entity_type = ? AND tag_id = (SELECT id FROM tags WHERE name = ?)
+        )'''
+    params = []
+    for name in names:
+        params.extend((entity_type, name))
+    return '(' + ' AND '.join([clause] * len(names)) + ')', params
+
+def tag_counts(db, entity_type=None, limit=None):
+    where = 'WHERE entity_type = ?' if entity_type else ''
+    params = [entity_type] if entity_type else []
+    return [dict(row) for row in db.execute(f'''
+        SELECT t.name, c.count
+        FROM (SELECT tag_id, COUNT(*) AS count FROM item_tags {where} GROUP BY tag_id) c
+        JOIN tags t ON t.id = c.tag_id
+        ORDER BY c.count DESC, t.name
+        LIMIT ?
+    ''', params + [limit or -1])]
+
+# NDJSON export/import. Projects are written first so an importer can remap
+# project ids before it sees the items that reference them.
+TRANSFER_TABLES = (
+    ('project', 'projects', ('name', 'description', 'color', 'created_at', 'is_active')),
+    ('task', 'tasks', ('title', 'description', 'priority', 'energy_level', 'estimated_time',
+                       'is_completed', 'created_at', 'completed_at', 'due_date', 'project_id')),
+    ('idea', 'ideas', ('title', 'description', 'tags', 'created_at', 'project_id')),
+    ('link', 'backburner_links', ('url', 'title', 'description', 'tags', 'created_at', 'project_id')),
+    ('note', 'notes', ('title', 'content', 'tags', 'created_at', 'updated_at', 'project_id')),
+)
+
+TRANSFER_TYPES = {entity_type: (table, columns) for entity_type, table, columns in TRANSFER_TABLES}
+
+TRANSFER_DEFAULTS = {
+    'priority': "'medium'",
+    'energy_level': "'medium'",
+    'is_completed': '0',
+    'created_at': 'CURRENT_TIMESTAMP',
+    'updated_at': 'CURRENT_TIMESTAMP',
+}
+
+def transfer_insert_sql(table, columns):
+    expressions = dict(TYPED_COLUMNS[table])
+    values = ', '.join(
+        f'COALESCE({expressions.get(column, "?")}, {TRANSFER_DEFAULTS[column]})' if column in TRANSFER_DEFAULTS
+        else expressions.get(column, '?')
+        for column in columns
+    )
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values})"
+
+class TransferError(ValueError):
+    pass
+
+def export_ndjson(db):
+    started = time.perf_counter()
+    count = 0
+    for entity_type, table, columns in TRANSFER_TABLES:
+        cursor = db.execute(f"SELECT id, {', '.join(columns)} FROM {table} ORDER BY id")
+        names = [d[0] for d in cursor.description]
+        for row in cursor:
+            record = dict(zip(names, row))
+            record['type'] = entity_type
+            count += 1
+            yield json.dumps(record, separators=(',', ':')) + '\n'
+        if entity_type in ARCHIVE_SOURCES:
+            archived = db.execute(
+                'SELECT item_id, project_id, data FROM archived_items WHERE entity_type = ? ORDER BY item_id',
+                (entity_type,)
+            )
+            for item_id, project_id, data in archived:
+                record = {'id': item_id, **json.loads(data), 'project_id': project_id, 'type': entity_type}
+                count += 1
+                yield json.dumps(record, separators=(',', ':')) + '\n'
+    elapsed = time.perf_counter() - started
+    app.logger.info('Exported %d rows in %.2fs (%.0f rows/s)', count, elapsed, count / elapsed if elapsed else 0)
+
+def import_ndjson(db, lines, batch_size=IMPORT_BATCH_SIZE):
+    started = time.perf_counter()
+    project_ids = {}
+    pending = {entity_type: [] for entity_type in TRANSFER_TYPES}
+    counts = {entity_type: 0 for entity_type in TRANSFER_TYPES}
+    buffered = 0
     
-    db.execute('''
-        UPDATE tasks 
-        SET is_completed = 0, completed_at = NULL
-        WHERE id = ?
-    ''', (task_id,))
-    db.commit()
+    def flush():
+        for entity_type, rows in pending.items():
+            if rows:
+                table, columns = TRANSFER_TYPES[entity_type]
+                last_id = db.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+                try:
+                    db.executemany(transfer_insert_sql(table, columns), rows)
+                    if entity_type in TAGGED_TABLES:
+                        index_tags(db, entity_type, last_id)
+                except sqlite3.IntegrityError as e:
+                    db.rollback()
+                    raise TransferError(f'Could not import {entity_type} rows: {e}')
+                except TypeError as e:
+                    db.rollback()
+                    raise TransferError(f'Could not import {entity_type} tags: {e}')
+                counts[entity_type] += len(rows)
+                rows.clear()
+        db.commit()
     
-    return jsonify({'success': True})
-
-@app.route('/api/ideas/quick-add', methods=['POST'])
-def quick_add_idea():
-    db = get_db()
-    data = request.get_json()
+    for line_number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            entity_type = record['type']
+            table, columns = TRANSFER_TYPES[entity_type]
+        except (ValueError, KeyError, TypeError):
+            db.rollback()
+            raise TransferError(f'Invalid record on line {line_number}')
+        # Ids key the project map, so anything but an integer is rejected
+        # here rather than failing as an unhashable key or a foreign key.
+        if any(value is not None and (isinstance(value, bool) or not isinstance(value, int))
+               for value in (record.get('id'), record.get('project_id'))):
+            db.rollback()
+            raise TransferError(f'Invalid id on line {line_number}')
+        
+        if entity_type == 'project':
+            if not record.get('name'):
+                db.rollback()
+                raise TransferError(f'Project without a name on line {line_number}')
+            cursor = db.execute(transfer_insert_sql(table, columns), (
+                record['name'],
+                record.get('description', ''),
+                record.get('color') or '#6366f1',
+                record.get('created_at'),
+                record.get('is_active', 1)
+            ))
+            if record.get('id') is not None:
+                project_ids[record['id']] = cursor.lastrowid
+            counts['project'] += 1
+        else:
+            values = [record.get(column) for column in columns]
+            project_index = columns.index('project_id')
+            values[project_index] = project_ids.get(values[project_index])
+            pending[entity_type].append(values)
+        
+        buffered += 1
+        if buffered >= batch_size:
+            flush()
+            buffered = 0
     
-    db.execute('''
-        INSERT INTO ideas (title, description, project_id)
-        VALUES (?, ?, ?)
-    ''', (
-        data['title'],
-        data.get('description', ''),
-        data.get('project_id') if data.get('project_id') else None
-    ))
-    db.commit()
+    flush()
     
-    return jsonify({'success': True})
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        'counts': counts,
+        'rows': total,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(total / elapsed) if elapsed else total
+    }
 
-@app.route('/api/links/quick-add', methods=['POST'])
-def quick_add_link():
-    db = get_db()
-    data = request.get_json()
+@app.cli.command('export')
+@click.argument('output', type=click.File('w'), default='-')
+def export_command(output):
+    """Write every project, task, idea, link and note as NDJSON."""
+    started = time.perf_counter()
+    count = 0
+    for line in export_ndjson(get_db()):
+        output.write(line)
+        count += 1
+    elapsed = time.perf_counter() - started
+    click.echo(f'Exported {count} rows in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} rows/s)', err=True)
+
+@app.cli.command('import')
+@click.argument('source', type=click.File('r'), default='-')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Rows per transaction.')
+def import_command(source, batch_size):
+    """Load NDJSON produced by the export command, remapping project ids."""
+    try:
+        stats = import_ndjson(get_db(), source, batch_size)
+    except TransferError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Imported {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_second']} rows/s)", err=True)
+
+# Delta sync for offline clients. Triggers keep one row per item in
+# sync_changes holding the sync version of its last write; a delete leaves
+# a tombstone, and so does deactivating a project. GET /api/sync returns what
+# changed after the version a client already has. Compaction drops old
+# tombstones and raises the horizon; a client that last synced before the
+# horizon may have missed deletes, so it is told to start over.
+SYNC_TABLES = {entity_type: table for entity_type, table, _ in TRANSFER_TABLES}
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 5000
+
+def sync_deleted_sql(entity_type, row):
+    return f'{row}is_active = 0' if entity_type == 'project' else '0'
+
+SYNC_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0,
+        horizon INTEGER NOT NULL DEFAULT 0
+    );
     
-    db.execute('''
-        INSERT INTO backburner_links (url, title, description, project_id)
-        VALUES (?, ?, ?, ?)
-    ''', (
-        data['url'],
-        data.get('title', ''),
-        data.get('description', ''),
-        data.get('project_id') if data.get('project_id') else None
-    ))
-    db.commit()
+    INSERT OR IGNORE INTO sync_state (id) VALUES (1);
     
-    return jsonify({'success': True})
-
-@app.route('/api/notes/quick-add', methods=['POST'])
-def quick_add_note():
-    db = get_db()
-    data = request.get_json()
+    CREATE TABLE IF NOT EXISTS sync_changes (
+        entity_type TEXT NOT NULL,
+        item_id INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (entity_type, item_id)
+    ) WITHOUT ROWID;
     
-    db.execute('''
-        INSERT INTO notes (title, content, project_id)
-        VALUES (?, ?, ?)
-    ''', (
-        data.get('title', ''),
-        data['content'],
-        data.get('project_id') if data.get('project_id') else None
-    ))
-    db.commit()
+    CREATE INDEX IF NOT EXISTS idx_sync_changes_version ON sync_changes(version, deleted);
     
-    return jsonify({'success': True})
+    CREATE TABLE IF NOT EXISTS sync_operations (
+        op_id TEXT PRIMARY KEY,
+        result TEXT NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID;
+''' + ''.join(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_sync_{event.lower()} AFTER {event} ON {table}
+    BEGIN
+        UPDATE sync_state SET version = version + 1;
+        DELETE FROM sync_changes WHERE entity_type = '{entity_type}' AND item_id = {row}.id;
+        INSERT INTO sync_changes (entity_type, item_id, version, deleted)
+        VALUES ('{entity_type}', {row}.id, (SELECT version FROM sync_state), {deleted});
+    END;
+''' for entity_type, table in SYNC_TABLES.items() for event, row, deleted in (
+    ('INSERT', 'NEW', sync_deleted_sql(entity_type, 'NEW.')),
+    ('UPDATE', 'NEW', sync_deleted_sql(entity_type, 'NEW.')),
+    ('DELETE', 'OLD', '1'),
+))
 
-@app.route('/api/tasks/<int:task_id>/update', methods=['PUT'])
-def update_task(task_id):
-    db = get_db()
-    data = request.get_json()
+def init_sync(db):
+    db.executescript(SYNC_SCHEMA)
+
+def sync_version(db):
+    return db.execute('SELECT version FROM sync_state').fetchone()[0]
+
+def sync_changes(db, since, limit=SYNC_PAGE_SIZE):
+    state = db.execute('SELECT version, horizon FROM sync_state').fetchone()
+    if since > state['version'] or 0 < since < state['horizon']:
+        return {'reset': True, 'version': state['version'], 'more': False, 'changes': []}
     
-    task = db.execute('SELECT id FROM tasks WHERE id = ?', (task_id,)).fetchone()
-    if not task:
-        return jsonify({'success': False, 'error': 'Task not found'}), 404
+    # A client starting from scratch has nothing to delete.
+    rows = db.execute(f'''
+        SELECT entity_type, item_id, version, deleted FROM sync_changes
+        WHERE version > ? {'' if since else 'AND deleted = 0'}
+        ORDER BY version
+        LIMIT ?
+    ''', (since, limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
     
-    db.execute('''
-        UPDATE tasks 
-        SET title = ?, description = ?, priority = ?, energy_level = ?, 
-            estimated_time = ?, due_date = ?
-        WHERE id = ?
-    ''', (
-        data['title'],
-        data.get('description', ''),
-        data.get('priority', 'medium'),
-        data.get('energy_level', 'medium'),
-        data.get('estimated_time'),
-        data.get('due_date'),
-        task_id
-    ))
-    db.commit()
+    wanted = {}
+    for row in rows:
+        if not row['deleted']:
+            wanted.setdefault(row['entity_type'], []).append(row['item_id'])
+    items = {}
+    for entity_type, ids in wanted.items():
+        table, columns = TRANSFER_TYPES[entity_type]
+        for item in db.execute(
+            f"SELECT id, {', '.join(columns)} FROM {table} WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(ids),)
+        ):
+            items[entity_type, item['id']] = dict(item)
     
-    return jsonify({'success': True})
+    return {
+        'reset': False,
+        'version': rows[-1]['version'] if more else state['version'],
+        'more': more,
+        'changes': [{
+            'type': row['entity_type'],
+            'id': row['item_id'],
+            'version': row['version'],
+            'deleted': bool(row['deleted']),
+            'data': items.get((row['entity_type'], row['item_id'])),
+        } for row in rows]
+    }
 
-@app.route('/api/ideas/<int:idea_id>/update', methods=['PUT'])
-def update_idea(idea_id):
-    db = get_db()
-    data = request.get_json()
+def compact_sync_log(db, days=None):
+    cutoff = '-%d days' % (app.config['SYNC_TOMBSTONE_DAYS'] if days is None else days)
+    horizon = db.execute(
+        "SELECT MAX(version) FROM sync_changes WHERE deleted = 1 AND changed_at < datetime('now', ?)",
+        (cutoff,)
+    ).fetchone()[0]
+    tombstones = 0
+    if horizon is not None:
+        tombstones = db.execute('DELETE FROM sync_changes WHERE deleted = 1 AND version <= ?', (horizon,)).rowcount
+        db.execute('UPDATE sync_state SET horizon = MAX(horizon, ?)', (horizon,))
+    operations = db.execute(
+        "DELETE FROM sync_operations WHERE applied_at < datetime('now', ?)",
+        (cutoff,)
+    ).rowcount
+    db.commit()
+    return {'tombstones': tombstones, 'operations': operations,
+            'horizon': db.execute('SELECT horizon FROM sync_state').fetchone()[0]}
+
+# Pushed operations carry a client-made op_id. Applied ones are remembered
+# in sync_operations, so a client that replays its queue after a lost
+# response does not create anything twice. An id or project_id of the form
+# "op:<op_id>" refers to the item an earlier create made.
+def sync_operation_result(db, op_id, applied):
+    if op_id in applied:
+        return applied[op_id]
+    row = db.execute('SELECT result FROM sync_operations WHERE op_id = ?', (op_id,)).fetchone()
+    return json.loads(row['result']) if row else None
+
+def resolve_sync_ref(db, value, applied):
+    if not isinstance(value, str) or not value.startswith('op:'):
+        return value
+    result = sync_operation_result(db, value[3:], applied)
+    if result is None:
+        raise BatchError(f'Unknown operation {value[3:]!r}')
+    return result['id']
+
+def apply_sync_operation(db, operation, applied):
+    operation = dict(operation)
+    operation['id'] = resolve_sync_ref(db, operation.get('id'), applied)
+    if isinstance(operation.get('data'), dict) and 'project_id' in operation['data']:
+        operation['data'] = {**operation['data'], 'project_id': resolve_sync_ref(db, operation['data']['project_id'], applied)}
+    return run_batch_operation(db, operation)
+
+# Cold tier. Completed tasks older than ARCHIVE_AFTER_DAYS, and every item of
+# a deleted project, are moved out of the hot tables in batches into
+# archived_items, one row per item with its columns as JSON. Item ids are never
+# reused, so restoring an item puts it back under its old id.
+ARCHIVE_SOURCES = {
+    'task': ('tasks', 'COALESCE(completed_at, created_at)'),
+    'idea': ('ideas', 'created_at'),
+    'link': ('backburner_links', 'created_at'),
+    'note': ('notes', 'updated_at'),
+}
+
+ARCHIVE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS archived_items (
+        id INTEGER PRIMARY KEY,
+        entity_type TEXT NOT NULL,
+        item_id INTEGER NOT NULL,
+        project_id INTEGER,
+        sort_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data TEXT NOT NULL,
+        UNIQUE (entity_type, item_id)
+    );
     
-    idea = db.execute('SELECT id FROM ideas WHERE id = ?', (idea_id,)).fetchone()
-    if not idea:
-        return jsonify({'success': False, 'error': 'Idea not found'}), 404
+    CREATE INDEX IF NOT EXISTS idx_archive_recent ON archived_items(entity_type, sort_at, item_id);
+    CREATE INDEX IF NOT EXISTS idx_archive_project ON archived_items(project_id, entity_type, sort_at, item_id);
+    CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks(is_completed, completed_at);
     
-    db.execute('''
-        UPDATE ideas 
-        SET title = ?, description = ?
-        WHERE id = ?
-    ''', (
-        data['title'],
-        data.get('description', ''),
-        idea_id
-    ))
-    db.commit()
+    CREATE TRIGGER IF NOT EXISTS trg_archived_items_counters_insert
+    AFTER INSERT ON archived_items
+    WHEN NEW.entity_type = 'task' AND json_extract(NEW.data, '$.is_completed') = 1
+    BEGIN
+        UPDATE project_counters SET completed_task_count = completed_task_count + 1
+        WHERE project_id = NEW.project_id;
+    END;
     
-    return jsonify({'success': True})
+    CREATE TRIGGER IF NOT EXISTS trg_archived_items_counters_delete
+    AFTER DELETE ON archived_items
+    WHEN OLD.entity_type = 'task' AND json_extract(OLD.data, '$.is_completed') = 1
+    BEGIN
+        UPDATE project_counters SET completed_task_count = completed_task_count - 1
+        WHERE project_id = OLD.project_id;
+    END;
+'''
 
-@app.route('/api/notes/<int:note_id>/update', methods=['PUT'])
-def update_note(note_id):
+def init_archive(db):
+    db.executescript(ARCHIVE_SCHEMA)
+
+def archive_columns(entity_type):
+    return [column for column in TRANSFER_TYPES[entity_type][1] if column != 'project_id']
+
+def archive_candidates(after_days, project_id=None):
+    if project_id is not None:
+        for entity_type, (table, _) in ARCHIVE_SOURCES.items():
+            yield entity_type, f'SELECT id FROM {table} WHERE project_id = ? LIMIT ?', (project_id,)
+        return
+    yield 'task', '''
+        SELECT id FROM tasks
+        WHERE is_completed = 1 AND completed_at < datetime('now', ?)
+        ORDER BY completed_at
+        LIMIT ?
+    ''', (f'-{int(after_days)} days',)
+    for entity_type, (table, _) in ARCHIVE_SOURCES.items():
+        yield entity_type, f'''
+            SELECT id FROM {table}
+            WHERE project_id IN (SELECT id FROM projects WHERE is_active = 0)
+            LIMIT ?
+        ''', ()
+
+def archive_batch(db, entity_type, query, params, batch_size):
+    table, sort_at = ARCHIVE_SOURCES[entity_type]
+    data = ', '.join(f"'{column}', {column}" for column in archive_columns(entity_type))
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        ids = json.dumps([row[0] for row in db.execute(query, params + (batch_size,))])
+        db.execute(f'''
+            INSERT INTO archived_items (entity_type, item_id, project_id, sort_at, data)
+            SELECT ?, id, project_id, {sort_at}, json_object({data})
+            FROM {table}
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', (entity_type, ids))
+        moved = db.execute(f'DELETE FROM {table} WHERE id IN (SELECT value FROM json_each(?))', (ids,)).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return moved
+
+# Each batch is its own short write transaction, so archiving a large
+# backlog never holds the write lock for long. With a deadline no new batch
+# starts once it has passed; the rest waits for the next run.
+def run_archive(db, after_days=None, batch_size=None, project_id=None, deadline=None):
+    after_days = app.config['ARCHIVE_AFTER_DAYS'] if after_days is None else after_days
+    batch_size = app.config['ARCHIVE_BATCH_SIZE'] if batch_size is None else batch_size
+    # A negative age would become '--N days', which SQLite cannot parse, and
+    # silently archive nothing.
+    if after_days < 0:
+        raise ValueError('after_days must be 0 or more')
+    if batch_size < 1:
+        raise ValueError('batch_size must be at least 1')
+    counts = Counter()
+    for entity_type, query, params in archive_candidates(after_days, project_id):
+        while deadline is None or time.perf_counter() < deadline:
+            moved = archive_batch(db, entity_type, query, params, batch_size)
+            counts[entity_type] += moved
+            if moved < batch_size:
+                break
+    return counts
+
+# Puts an archived item back in its hot table inside the caller's
+# transaction. Items of a deleted project come back unassigned. Returns the
+# restored item's project id wrapped in a tuple, or None if nothing matched.
+def restore_archived(db, entity_type, item_id):
+    table, _ = ARCHIVE_SOURCES[entity_type]
+    columns = archive_columns(entity_type)
+    restored = db.execute(f'''
+        INSERT INTO {table} (id, {', '.join(columns)}, project_id)
+        SELECT a.item_id, {', '.join(f"json_extract(a.data, '$.{column}')" for column in columns)},
+            (SELECT p.id FROM projects p WHERE p.id = a.project_id AND p.is_active = 1)
+        FROM archived_items a
+        WHERE a.entity_type = ? AND a.item_id = ?
+        RETURNING project_id
+    ''', (entity_type, item_id)).fetchone()
+    if restored is None:
+        return None
+    if entity_type in TAGGED_TABLES:
+        sync_item_tags(db, entity_type, item_id)
+    db.execute('DELETE FROM archived_items WHERE entity_type = ? AND item_id = ?', (entity_type, item_id))
+    return (restored[0],)
+
+def archived_item(row):
+    item = json.loads(row['data'])
+    item.update(id=row['item_id'], project_id=row['project_id'], archived_at=row['archived_at'], archived=True)
+    return item
+
+ARCHIVE_ORDER = (('sort_at', 'DESC'), ('item_id', 'DESC'))
+
+def archive_rows(db, entity_type, project_id=None, after=None, limit=PAGE_SIZE, filters=()):
+    where = ['entity_type = ?']
+    params = [entity_type]
+    if project_id is not None:
+        where.append('project_id = ?')
+        params.append(project_id)
+    if filters:
+        clauses, filter_params = filter_clauses(filters, lambda column: f"json_extract(data, '$.{column}')")
+        where.extend(clauses)
+        params.extend(filter_params)
+    if after:
+        clause, cursor_params = keyset_condition(ARCHIVE_ORDER, decode_cursor(after))
+        where.append(clause)
+        params.extend(cursor_params)
+    
+    return db.execute(f'''
+        SELECT * FROM archived_items
+        WHERE {' AND '.join(where)}
+        ORDER BY sort_at DESC, item_id DESC
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+
+def fetch_archive_page(db, entity_type, project_id=None, after=None, limit=PAGE_SIZE):
+    rows = archive_rows(db, entity_type, project_id, after, limit)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]['sort_at'], rows[-1]['item_id']])
+    return Page([archived_item(row) for row in rows], next_cursor)
+
+def archive_stats(db):
+    return {
+        entity_type: db.execute(
+            'SELECT COUNT(*) FROM archived_items WHERE entity_type = ?',
+            (entity_type,)
+        ).fetchone()[0]
+        for entity_type in ARCHIVE_SOURCES
+    }
+
+@app.cli.group()
+def archive():
+    """Move cold rows between the hot tables and the archive."""
+
+@archive.command('run')
+@click.option('--days', type=click.IntRange(min=0), help='Archive tasks completed more than this many days ago.')
+@click.option('--batch-size', type=click.IntRange(min=1), help='Rows moved per transaction.')
+def archive_run_command(days, batch_size):
+    """Archive old completed tasks and the items of deleted projects."""
+    started = time.perf_counter()
+    counts = run_archive(get_db(), days, batch_size)
+    elapsed = time.perf_counter() - started
+    click.echo(', '.join(f'{counts[entity_type]} {entity_type}s' for entity_type in ARCHIVE_SOURCES)
+               + f' archived in {elapsed:.2f}s')
+
+@archive.command('stats')
+def archive_stats_command():
+    """Show how many items of each type are archived."""
+    for entity_type, count in archive_stats(get_db()).items():
+        click.echo(f'{entity_type:<6} {count}')
+
+# Change versions back the ETags on GET routes. Scope 0 is bumped by every
+# write; each project also has its own scope bumped by writes to its items.
+VERSIONED_TABLES = (
+    ('projects', 'id'),
+    ('tasks', 'project_id'),
+    ('ideas', 'project_id'),
+    ('notes', 'project_id'),
+    ('backburner_links', 'project_id'),
+    ('archived_items', 'project_id'),
+)
+
+def bump_version_sql(scope):
+    return f'''
+            INSERT INTO change_versions (scope, version) SELECT {scope}, 1 WHERE {scope} IS NOT NULL
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1;'''
+
+VERSIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS change_versions (
+        scope INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    
+    INSERT OR IGNORE INTO change_versions (scope, version) VALUES (0, 0);
+''' + ''.join(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_versions_insert AFTER INSERT ON {table}
+    BEGIN{bump_version_sql('0')}{bump_version_sql('NEW.' + column)}
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_versions_update AFTER UPDATE ON {table}
+    BEGIN{bump_version_sql('0')}{bump_version_sql('OLD.' + column)}{bump_version_sql(f'(CASE WHEN NEW.{column} IS NOT OLD.{column} THEN NEW.{column} END)')}
+    END;
+    
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_versions_delete AFTER DELETE ON {table}
+    BEGIN{bump_version_sql('0')}{bump_version_sql('OLD.' + column)}
+    END;
+''' for table, column in VERSIONED_TABLES)
+
+def init_versions(db):
+    db.executescript(VERSIONS_SCHEMA)
+
+def change_version(db, project_id=None):
+    if project_id is None:
+        row = db.execute('SELECT version FROM change_versions WHERE scope = 0').fetchone()
+        return row[0] if row else 0
+    row = db.execute(
+        'SELECT version FROM change_versions WHERE scope = ?',
+        (project_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def code_version():
+    root = Path(__file__).resolve().parent
+    paths = [root / 'focus.py'] + sorted((root / 'templates').glob('*.html'))
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(f'{path.name}:{path.stat().st_mtime_ns}'.encode())
+    return digest.hexdigest()[:12]
+
+CODE_VERSION = code_version()
+
+# Serves a strong ETag derived from the change version and answers a
+# matching If-None-Match with 304 before the view runs any queries.
+def conditional(per_project=False, vary=()):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            db = get_db()
+            # One read transaction, so the version in the tag and the rows
+            # the view reads agree.
+            if not db.in_transaction:
+                db.execute('BEGIN')
+            g.fragment_revisions = {}
+            project_id = kwargs.get('project_id') if per_project else None
+            parts = [CODE_VERSION, asset_version(), negotiated_encoding(), view.__name__,
+                     request.query_string.decode(), str(change_version(db, project_id))]
+            parts.extend(str(value()) for value in vary)
+            etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+            
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# Static assets. `flask --app focus assets build` minifies ASSET_FILES, names
+# each copy after a hash of its content and writes gzip (and brotli, when it
+# is installed) variants next to it in static/dist. Templates link them with
+# asset_url(), and /assets serves them with a year-long immutable cache,
+# picking the precompressed variant the client accepts. Without a build, or
+# in debug mode, asset_url() falls back to the source files.
+ASSET_FILES = ('css/style.css', 'js/app.js')
+ASSET_DIR = Path(app.static_folder) / 'dist'
+ASSET_MAX_AGE = 365 * 86400
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip() + '\n'
+
+def minify_js(text):
+    # Drops indentation, blank lines and whole-line comments but keeps every
+    # line break, so automatic semicolon insertion is unaffected, and leaves
+    # the lines of multi-line template literals as they are.
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        if line.replace('\\`', '').count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+ASSET_MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+def build_assets():
+    source = Path(app.static_folder)
+    manifest = {}
+    built = []
+    for name in ASSET_FILES:
+        path = Path(name)
+        data = ASSET_MINIFIERS[path.suffix]((source / name).read_text()).encode()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        hashed = path.with_name(f'{path.stem}.{digest}{path.suffix}').as_posix()
+        target = ASSET_DIR / hashed
+        variants = [(target, data), (Path(f'{target}.gz'), gzip.compress(data, 9, mtime=0))]
+        if brotli is not None:
+            variants.append((Path(f'{target}.br'), brotli.compress(data, quality=11)))
+        for variant, content in variants:
+            if not variant.exists():
+                variant.parent.mkdir(parents=True, exist_ok=True)
+                variant.write_bytes(content)
+        manifest[name] = hashed
+        built.append((name, hashed, (source / name).stat().st_size, [len(content) for _, content in variants]))
+    
+    partial = ASSET_DIR / 'manifest.json.partial'
+    partial.write_text(json.dumps(manifest, indent=2) + '\n')
+    partial.replace(ASSET_DIR / 'manifest.json')
+    return built
+
+def clean_assets():
+    # Removes builds that the current manifest no longer points at.
+    keep = set(asset_manifest().values())
+    removed = 0
+    for path in ASSET_DIR.rglob('*'):
+        name = path.relative_to(ASSET_DIR).as_posix()
+        for _, suffix in ASSET_ENCODINGS:
+            name = name.removesuffix(suffix)
+        if path.is_file() and path.name != 'manifest.json' and name not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+asset_manifest_cache = {'mtime': None, 'files': {}, 'version': ''}
+
+def asset_manifest():
+    path = ASSET_DIR / 'manifest.json'
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime != asset_manifest_cache['mtime']:
+        text = path.read_text() if mtime is not None else '{}'
+        asset_manifest_cache.update(mtime=mtime, files=json.loads(text),
+                                    version=hashlib.sha1(text.encode()).hexdigest()[:12])
+    return asset_manifest_cache['files']
+
+def asset_version():
+    asset_manifest()
+    return '' if app.debug else asset_manifest_cache['version']
+
+@app.template_global()
+def asset_url(filename):
+    hashed = None if app.debug else asset_manifest().get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=hashed)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    accepted = request.accept_encodings
+    for encoding, suffix in ASSET_ENCODINGS + ((None, ''),):
+        if encoding is not None and not accepted[encoding]:
+            continue
+        path = safe_join(str(ASSET_DIR), filename + suffix)
+        if path is not None and os.path.isfile(path):
+            break
+    else:
+        return jsonify({'success': False, 'error': 'Asset not found'}), 404
+    
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], max_age=ASSET_MAX_AGE)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+# HTML, JSON and text responses larger than COMPRESS_MIN_SIZE are compressed
+# with brotli (when installed) or gzip, whichever the client prefers. Views
+# using conditional() fold the negotiated encoding into their ETag, so each
+# encoding of a page gets its own validator.
+COMPRESSIBLE_MIMETYPES = ('text/html', 'application/json', 'text/plain', 'application/x-ndjson')
+
+def negotiated_encoding():
+    if not app.config['COMPRESS']:
+        return 'identity'
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] and accepted['br'] >= accepted['gzip']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return 'identity'
+
+@app.after_request
+def compress_response(response):
+    if (not app.config['COMPRESS'] or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiated_encoding()
+    if encoding == 'identity' or response.status_code in (204, 304):
+        return response
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    if encoding == 'br':
+        data = brotli.compress(data, quality=app.config['COMPRESS_BROTLI_QUALITY'])
+    else:
+        data = gzip.compress(data, app.config['COMPRESS_LEVEL'], mtime=0)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# Streamed responses cannot be compressed after the fact, so views that
+# stream compressible output encode it chunk by chunk as it is produced.
+def compressed_chunks(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=app.config['COMPRESS_BROTLI_QUALITY'])
+        compress, finish = compressor.process, compressor.finish
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(app.config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    else:
+        for chunk in chunks:
+            yield chunk.encode()
+        return
+    for chunk in chunks:
+        data = compress(chunk.encode())
+        if data:
+            yield data
+    yield finish()
+
+def stream_json(chunks):
+    encoding = negotiated_encoding()
+    response = Response(stream_with_context(compressed_chunks(chunks, encoding)), mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.cli.group()
+def assets():
+    """Build fingerprinted, precompressed static assets."""
+
+@assets.command('build')
+@click.option('--clean', is_flag=True, help='Also delete builds the new manifest no longer uses.')
+def assets_build_command(clean):
+    """Minify, fingerprint and precompress the static files."""
+    for name, hashed, size, sizes in build_assets():
+        click.echo(f'{name} -> dist/{hashed}  {size} -> ' + ' / '.join(str(size) for size in sizes) + ' bytes')
+    if clean:
+        click.echo(f'{clean_assets()} stale file(s) removed')
+
+# Tasks carry a numeric priority_rank and a normalized due date as virtual
+# generated columns, indexed so the focus list and suggestions walk an index
+# in rank order instead of sorting every open task.
+PRIORITY_RANK_SQL = '''CASE priority
+    WHEN 'urgent' THEN 4
+    WHEN 'high' THEN 3
+    WHEN 'medium' THEN 2
+    ELSE 1
+END'''
+
+RANKING_COLUMNS = (
+    ('priority_rank', f'INTEGER GENERATED ALWAYS AS ({PRIORITY_RANK_SQL}) VIRTUAL'),
+    ('due', 'TEXT GENERATED ALWAYS AS (date(due_date)) VIRTUAL'),
+)
+
+RANKING_SCHEMA = '''
+    CREATE INDEX IF NOT EXISTS idx_tasks_ranking ON tasks(is_completed, energy_level, priority_rank DESC, due);
+    CREATE INDEX IF NOT EXISTS idx_tasks_focus ON tasks(is_completed, priority_rank DESC, due);
+    CREATE INDEX IF NOT EXISTS idx_tasks_project_rank ON tasks(project_id, is_completed, priority_rank DESC, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_tasks_rank ON tasks(is_completed, priority_rank DESC, created_at, id);
+    DROP INDEX IF EXISTS idx_tasks_priority;
+    DROP INDEX IF EXISTS idx_tasks_completed;
+'''
+
+RANKED_TASKS_QUERY = '''
+    SELECT t.*, p.name as project_name
+    FROM tasks t
+    LEFT JOIN projects p ON t.project_id = p.id
+    WHERE t.is_completed = 0 AND {condition}
+    ORDER BY t.priority_rank DESC, t.due
+'''
+
+def init_ranking(db):
+    existing = {row[1] for row in db.execute('PRAGMA table_xinfo(tasks)')}
+    for column, definition in RANKING_COLUMNS:
+        if column not in existing:
+            db.execute(f'ALTER TABLE tasks ADD COLUMN {column} {definition}')
+    db.executescript(RANKING_SCHEMA)
+
+def ranking_weights():
+    return (app.config['RANK_WEIGHT_PRIORITY'], app.config['RANK_WEIGHT_DUE'],
+            app.config['RANK_WEIGHT_QUICK'], app.config['RANK_QUICK_MINUTES'])
+
+def task_score(task, today, weights):
+    priority_weight, due_weight, quick_weight, quick_minutes = weights
+    score = priority_weight * task['priority_rank']
+    if task['due']:
+        days = (datetime.strptime(task['due'], '%Y-%m-%d').date() - today).days
+        score += due_weight / (1 + max(days, 0))
+    if task['estimated_time']:
+        score += quick_weight / (1 + max(task['estimated_time'], 0) / quick_minutes)
+    return score
+
+# Due dates are compared with the UTC day, the same clock the completion
+# stats use. Rows must arrive in priority_rank DESC order: once even a
+# perfect due date and estimate at the current rank cannot beat the worst
+# kept task, no later row can either and the scan stops.
+def top_ranked(rows, limit, today=None):
+    weights = ranking_weights()
+    priority_weight, due_weight, quick_weight, _ = weights
+    today = today or datetime.strptime(utc_today(), '%Y-%m-%d').date()
+    best = []
+    for position, row in enumerate(rows):
+        if len(best) == limit and priority_weight * row['priority_rank'] + due_weight + quick_weight < best[0][0]:
+            break
+        entry = (task_score(row, today, weights), -position, dict(row))
+        if len(best) < limit:
+            heapq.heappush(best, entry)
+        else:
+            heapq.heappushpop(best, entry)
+    return [row for _, _, row in sorted(best, key=lambda entry: entry[:2], reverse=True)]
+
+def ranked_tasks(db, condition, params, limit):
+    return top_ranked(db.execute(RANKED_TASKS_QUERY.format(condition=condition), params), limit)
+
+def ranked_tasks_by_energy(db, energy_levels, limit):
+    streams = [
+        db.execute(RANKED_TASKS_QUERY.format(condition='t.energy_level = ?'), (energy,))
+        for energy in energy_levels
+    ]
+    return top_ranked(heapq.merge(*streams, key=lambda row: -row['priority_rank']), limit)
+
+def dict_from_row(row):
+    return dict(row) if row else None
+
+PROJECT_WITH_COUNTS_QUERY = '''
+    SELECT p.*,
+        COALESCE(c.open_task_count, 0) AS task_count,
+        COALESCE(c.completed_task_count, 0) AS completed_count,
+        COALESCE(c.idea_count, 0) AS idea_count,
+        COALESCE(c.note_count, 0) AS note_count,
+        COALESCE(c.link_count, 0) AS link_count
+    FROM projects p
+    LEFT JOIN project_counters c ON c.project_id = p.id
+    WHERE p.is_active = 1
+'''
+
+def get_project_with_counts(project_id):
     db = get_db()
-    data = request.get_json()
     
-    note = db.execute('SELECT id FROM notes WHERE id = ?', (note_id,)).fetchone()
-    if not note:
-        return jsonify({'success': False, 'error': 'Note not found'}), 404
+    project = db.execute(
+        PROJECT_WITH_COUNTS_QUERY + ' AND p.id = ?',
+        (project_id,)
+    ).fetchone()
     
-    db.execute('''
-        UPDATE notes 
-        SET title = ?, content = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (
-        data.get('title', ''),
-        data['content'],
-        note_id
-    ))
+    return dict_from_row(project)
+
+@app.route('/')
+@conditional(vary=(utc_today,))
+def index():
+    db = get_db()
+    
+    projects = db.execute(
+        PROJECT_WITH_COUNTS_QUERY + ' ORDER BY p.created_at DESC'
+    ).fetchall()
+    projects = [dict(row) for row in projects]
+    
+    focus_tasks = ranked_tasks(db, '(t.priority_rank >= 3 OR t.due = ?)', (utc_today(),), 5)
+    
+    recent_ideas = db.execute('''
+        SELECT i.*, p.name as project_name
+        FROM ideas i
+        LEFT JOIN projects p ON i.project_id = p.id
+        ORDER BY i.created_at DESC
+        LIMIT 3
+    ''').fetchall()
+    
+    recent_ideas = [dict(row) for row in recent_ideas]
+
+    recent_notes = db.execute('''
+        SELECT n.*, p.name as project_name
+        FROM notes n
+        LEFT JOIN projects p ON n.project_id = p.id
+        ORDER BY n.updated_at DESC
+        LIMIT 3
+    ''').fetchall()
+
+    recent_notes = [dict(row) for row in recent_notes]
+    
+    return render_template('index.html', 
+                         projects=projects, 
+                         focus_tasks=focus_tasks,
+                         recent_ideas=recent_ideas,
+                         recent_notes=recent_notes)
+
+def project_ref(data):
+    return data.get('project_id') if data.get('project_id') else None
+
+# Every write the API can perform, keyed by entity type and operation. Each
+# entry is one statement plus a function building its parameters from
+# (item_id, data). The statement returns the row it wrote, so a route learns
+# the item's project, or that it does not exist, without a separate SELECT;
+# the statement texts are constant and stay prepared in the connection's
+# statement cache.
+MUTATIONS = {
+    'task': {
+        'create': (f'''
+            INSERT INTO tasks (title, description, priority, energy_level, estimated_time, due_date, project_id)
+            VALUES (?, ?, ?, ?, {MINUTES_SQL}, {TIMESTAMP_SQL}, ?)
+            RETURNING *
+        ''', lambda item_id, data: (
+            data['title'],
+            data.get('description', ''),
+            data.get('priority', 'medium'),
+            data.get('energy_level', 'medium'),
+            data.get('estimated_time'),
+            data.get('due_date'),
+            project_ref(data)
+        )),
+        'update': (f'''
+            UPDATE tasks 
+            SET title = ?, description = ?, priority = ?, energy_level = ?, 
+                estimated_time = {MINUTES_SQL}, due_date = {TIMESTAMP_SQL}
+            WHERE id = ?
+            RETURNING *
+        ''', lambda item_id, data: (
+            data['title'],
+            data.get('description', ''),
+            data.get('priority', 'medium'),
+            data.get('energy_level', 'medium'),
+            data.get('estimated_time'),
+            data.get('due_date'),
+            item_id
+        )),
+        'complete': ('''
+            UPDATE tasks 
+            SET is_completed = 1, completed_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            RETURNING *
+        ''', lambda item_id, data: (item_id,)),
+        'uncomplete': ('''
+            UPDATE tasks 
+            SET is_completed = 0, completed_at = NULL
+            WHERE id = ?
+            RETURNING *
+        ''', lambda item_id, data: (item_id,)),
+        'delete': ('DELETE FROM tasks WHERE id = ? RETURNING *', lambda item_id, data: (item_id,)),
+    },
+    'idea': {
+        'create': ('''
+            INSERT INTO ideas (title, description, tags, project_id)
+            VALUES (?, ?, ?, ?)
+            RETURNING *
+        ''', lambda item_id, data: (
+            data['title'],
+            data.get('description', ''),
+            tags_text(data.get('tags')),
+            project_ref(data)
+        )),
+        'update': ('''
+            UPDATE ideas 
+            SET title = ?, description = ?, tags = COALESCE(?, tags)
+            WHERE id = ?
+            RETURNING *
+        ''', lambda item_id, data: (
+            data['title'],
+            data.get('description', ''),
+            tags_text(data.get('tags')),
+            item_id
+        )),
+        'delete': ('DELETE FROM ideas WHERE id = ? RETURNING *', lambda item_id, data: (item_id,)),
+    },
+    'link': {
+        'create': ('''
+            INSERT INTO backburner_links (url, title, description, tags, project_id)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING *
+        ''', lambda item_id, data: (
+            data['url'],
+            data.get('title', ''),
+            data.get('description', ''),
+            tags_text(data.get('tags')),
+            project_ref(data)
+        )),
+        'update': ('''
+            UPDATE backburner_links 
+            SET url = ?, title = ?, description = ?, tags = COALESCE(?, tags)
+            WHERE id = ?
+            RETURNING *
+        ''', lambda item_id, data: (
+            data['url'],
+            data.get('title', ''),
+            data.get('description', ''),
+            tags_text(data.get('tags')),
+            item_id
+        )),
+        'delete': ('DELETE FROM backburner_links WHERE id = ? RETURNING *', lambda item_id, data: (item_id,)),
+    },
+    'note': {
+        'create': ('''
+            INSERT INTO notes (title, content, tags, project_id)
+            VALUES (?, ?, ?, ?)
+            RETURNING *
+        ''', lambda item_id, data: (
+            data.get('title', ''),
+            data['content'],
+            tags_text(data.get('tags')),
+            project_ref(data)
+        )),
+        'update': ('''
+            UPDATE notes 
+            SET title = ?, content = ?, tags = COALESCE(?, tags), updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            RETURNING *
+        ''', lambda item_id, data: (
+            data.get('title', ''),
+            data['content'],
+            tags_text(data.get('tags')),
+            item_id
+        )),
+        'delete': ('DELETE FROM notes WHERE id = ? RETURNING *', lambda item_id, data: (item_id,)),
+    },
+    'project': {
+        'create': ('''
+            INSERT INTO projects (name, description, color)
+            VALUES (?, ?, ?)
+            RETURNING *
+        ''', lambda item_id, data: (
+            data['name'],
+            data.get('description', ''),
+            data.get('color', '#6366f1')
+        )),
+        'update': ('''
+            UPDATE projects 
+            SET name = ?, description = ?, color = ?
+            WHERE id = ? AND is_active = 1
+            RETURNING *
+        ''', lambda item_id, data: (
+            data['name'],
+            data.get('description', ''),
+            data.get('color', '#3b82f6'),
+            item_id
+        )),
+        'delete': ('UPDATE projects SET is_active = 0 WHERE id = ? AND is_active = 1 RETURNING *',
+                   lambda item_id, data: (item_id,)),
+    },
+}
+
+ENTITY_NAMES = {
+    'task': 'Task',
+    'idea': 'Idea',
+    'link': 'Link',
+    'note': 'Note',
+    'project': 'Project',
+}
+
+ITEM_TABLES = {
+    'task': 'tasks',
+    'idea': 'ideas',
+    'link': 'backburner_links',
+    'note': 'notes',
+}
+
+# Macros used to render a single changed item for the page that asked for
+# it, so the client can patch the DOM instead of reloading.
+FRAGMENT_MACROS = {
+    'project': {
+        'task': 'task_item',
+        'idea': 'idea_item',
+        'link': 'link_item',
+        'note': 'note_item',
+    },
+    'dashboard': {
+        'task': 'focus_task_item',
+        'idea': 'recent_idea_item',
+        'note': 'recent_note_item',
+        'project': 'project_card',
+    },
+}
+
+# Rendered item fragments are kept in a byte-bounded LRU cache, keyed by
+# macro, item id and the change version of the item's project (the global
+# version for items without one). Triggers bump that version on any write to
+# the project or its items, so a changed row, a renamed project or new
+# counters all give a new key and stale entries simply age out. Every worker
+# process has its own cache.
+class FragmentCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+    
+    def put(self, key, html):
+        cost = len(html.encode())
+        if cost > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self.entries[key] = (html, cost)
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                metrics.inc('focus_fragment_cache_evictions_total')
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+fragment_cache = FragmentCache(app.config['FRAGMENT_CACHE_BYTES'])
+
+PROJECT_FRAGMENTS = ('project_card',)
+
+# Versions are only trusted under the read transaction conditional() holds,
+# so they match the rows being rendered; other responses render uncached.
+def fragment_revision(macro, item):
+    revisions = g.get('fragment_revisions') if has_request_context() else None
+    if revisions is None:
+        return None
+    scope = item.get('id') if macro in PROJECT_FRAGMENTS else item.get('project_id')
+    if scope not in revisions:
+        revisions[scope] = change_version(get_db(), scope)
+    return revisions[scope]
+
+@app.template_global('fragment')
+def render_fragment(macro, item):
+    item = dict(item)
+    # Templates reload from disk while auto-reload is on, so nothing is cached.
+    revision = fragment_revision(macro, item)
+    cached = revision is not None and fragment_cache.max_bytes > 0 and not app.jinja_env.auto_reload
+    if cached:
+        key = (macro, item.get('id'), revision)
+        html = fragment_cache.get(key)
+        if html is not None:
+            metrics.inc('focus_fragment_cache_requests_total', [('macro', macro), ('result', 'hit')])
+            return html
+        metrics.inc('focus_fragment_cache_requests_total', [('macro', macro), ('result', 'miss')])
+    
+    started = time.perf_counter()
+    html = Markup(str(get_template_attribute('_items.html', macro)(item)))
+    metrics.observe('focus_template_render_seconds', time.perf_counter() - started, [('template', f'_items.html:{macro}')])
+    if cached:
+        fragment_cache.put(key, html)
+    return html
+
+def fetch_item(db, entity_type, item_id):
+    if entity_type == 'project':
+        row = db.execute(PROJECT_WITH_COUNTS_QUERY + ' AND p.id = ?', (item_id,)).fetchone()
+    else:
+        row = db.execute(f'''
+            SELECT i.*, p.name AS project_name
+            FROM {ITEM_TABLES[entity_type]} i
+            LEFT JOIN projects p ON i.project_id = p.id
+            WHERE i.id = ?
+        ''', (item_id,)).fetchone()
+    return dict_from_row(row)
+
+def fetch_counters(db, project_id):
+    if project_id is None:
+        return None
+    return dict_from_row(db.execute(
+        'SELECT * FROM project_counters WHERE project_id = ?',
+        (project_id,)
+    ).fetchone())
+
+def render_item(view, entity_type, item):
+    macro = FRAGMENT_MACROS.get(view, {}).get(entity_type)
+    if macro == 'task_item' and item['is_completed']:
+        macro = 'completed_task_item'
+    if macro is None:
+        return None
+    return str(render_fragment(macro, item))
+
+def mutation_response(db, entity_type, item_id, project_id=None, deleted=False, **extra):
+    payload = {'success': True, **extra}
+    view = request.args.get('view')
+    if not view:
+        return jsonify(payload)
+    
+    item = None
+    if not deleted and item_id is not None:
+        item = fetch_item(db, entity_type, item_id)
+    if item is not None:
+        project_id = item['id'] if entity_type == 'project' else item['project_id']
+    
+    payload.update({
+        'type': entity_type,
+        'id': item_id,
+        'item': item,
+        'counters': fetch_counters(db, project_id)
+    })
+    if item is not None:
+        payload['html'] = render_item(view, entity_type, item)
+    return jsonify(payload)
+
+# The outcome of run_mutation(): the written row as it is after the write
+# (before it, for deletes) and the project whose pages and counters the
+# write touched.
+Mutation = namedtuple('Mutation', 'id item project_id')
+
+def run_mutation(db, entity_type, op, item_id=None, data=None):
+    statement, params = MUTATIONS[entity_type][op]
+    data = data or {}
+    rows = db.execute(statement, params(item_id, data)).fetchall()
+    if not rows:
+        return None
+    item = dict(rows[0])
+    if op in ('create', 'update') and entity_type in TAGGED_TABLES and data.get('tags') is not None:
+        set_item_tags(db, entity_type, item['id'], parse_tags(data['tags']))
+    return Mutation(item['id'], item, item['id'] if entity_type == 'project' else item['project_id'])
+
+# Archived items stay addressable by id from the routes, /api/batch and
+# /api/sync alike. A write that finds no hot row falls back to the archive:
+# deleting removes the archived row, uncompleting restores the task first.
+# 'restore' has no hot statement and only moves an item back.
+def apply_mutation(db, entity_type, op, item_id=None, data=None):
+    if op == 'restore':
+        restored = restore_archived(db, entity_type, item_id)
+        return None if restored is None else Mutation(item_id, None, restored[0])
+    result = run_mutation(db, entity_type, op, item_id, data)
+    if result is not None or entity_type not in ARCHIVE_SOURCES:
+        return result
+    if op == 'delete':
+        row = db.execute(
+            'DELETE FROM archived_items WHERE entity_type = ? AND item_id = ? RETURNING *',
+            (entity_type, item_id)
+        ).fetchone()
+        return None if row is None else Mutation(item_id, archived_item(row), row['project_id'])
+    if op == 'uncomplete' and restore_archived(db, entity_type, item_id) is not None:
+        return run_mutation(db, entity_type, op, item_id, data)
+    return None
+
+# Committed writes are published to a bounded in-memory log that /api/events
+# streams to open tabs. Event ids carry the process start time so a client
+# reconnecting after a restart, or after falling out of the log, is told to
+# reload instead of silently missing changes.
+#
+# With several worker processes (EVENTS_SHARED) events are written to the
+# change_events table instead. Every worker with open streams tails the table
+# into its own log, and ids are the table's, so a client can reconnect to any
+# worker and resume where it left off.
+CHANGE_EVENTS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS change_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event TEXT NOT NULL
+    );
+'''
+
+def init_change_events(db):
+    db.executescript(CHANGE_EVENTS_SCHEMA)
+
+class ChangeFeed:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.events = deque()
+        self.epoch = int(time.time())
+        self.last_id = 0
+        self.streams = 0
+        self.closed = False
+        self.thread = None
+        self.pid = None
+    
+    def publish(self, event, number=None):
+        with self.condition:
+            self.last_id = self.last_id + 1 if number is None else number
+            self.events.append((self.last_id, event))
+            while len(self.events) > app.config['EVENTS_LOG_SIZE']:
+                self.events.popleft()
+            self.condition.notify_all()
+    
+    def follow(self):
+        if not app.config['EVENTS_SHARED']:
+            return
+        with self.condition:
+            if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            db = connect_db(readonly=True)
+            rows = db.execute(
+                'SELECT id, event FROM change_events ORDER BY id DESC LIMIT ?',
+                (app.config['EVENTS_LOG_SIZE'],)
+            ).fetchall()
+            db.close()
+            self.epoch = 0
+            self.events = deque((number, json.loads(event)) for number, event in reversed(rows))
+            self.last_id = self.events[-1][0] if self.events else 0
+            self.thread = threading.Thread(target=self.tail, name='focus-change-feed', daemon=True)
+            self.thread.start()
+    
+    def tail(self):
+        db = connect_db(readonly=True)
+        while not self.closed:
+            time.sleep(app.config['EVENTS_POLL_MS'] / 1000)
+            rows = db.execute(
+                'SELECT id, event FROM change_events WHERE id > ? ORDER BY id',
+                (self.last_id,)
+            ).fetchall()
+            for number, event in rows:
+                self.publish(json.loads(event), number)
+    
+    def open_stream(self):
+        # Every open stream holds a server thread for as long as the tab
+        # stays open, so past EVENTS_MAX_STREAMS new ones are turned away.
+        limit = app.config['EVENTS_MAX_STREAMS']
+        with self.condition:
+            if limit and self.streams >= limit:
+                return False
+            self.streams += 1
+            return True
+    
+    def close_stream(self):
+        with self.condition:
+            self.streams -= 1
+    
+    def close(self):
+        # Ends open streams so a worker that is shutting down is not held
+        # up by them; clients reconnect to another worker.
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+    
+    def event_id(self, number):
+        return f'{self.epoch}-{number}'
+    
+    def position(self, last_event_id):
+        epoch, _, number = (last_event_id or '').partition('-')
+        if not number.isdigit() or epoch != str(self.epoch) or int(number) > self.last_id:
+            return None
+        return int(number)
+    
+    def since(self, position):
+        with self.condition:
+            if position < self.last_id and (not self.events or position < self.events[0][0] - 1):
+                return None
+            return [(number, event) for number, event in self.events if number > position]
+    
+    def wait(self, position, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.last_id > position or self.closed, timeout)
+        return self.since(position)
+
+change_feed = ChangeFeed()
+
+def record_change_event(db, event):
+    number = db.execute('INSERT INTO change_events (event) VALUES (?)', (json.dumps(event),)).lastrowid
+    if number % 100 == 0:
+        db.execute('DELETE FROM change_events WHERE id <= ?', (number - app.config['EVENTS_LOG_SIZE'],))
+
+def change_event(db, entity_type, op, item_id, project_id=None):
+    if entity_type == 'project':
+        project_id = item_id
+    event = {
+        'type': entity_type,
+        'id': item_id,
+        'op': op,
+        'project_id': project_id,
+        'counters': fetch_counters(db, project_id),
+        'version': sync_version(db)
+    }
+    return event
+
+# Shared events are written in the transaction of the change they describe,
+# so a mutation or a whole write-queue group stays one write transaction.
+# The in-memory feed is only told once the commit has landed.
+def commit_changes(db, events):
+    shared = app.config['EVENTS_SHARED']
+    if shared:
+        for event in events:
+            record_change_event(db, event)
     db.commit()
+    if not shared:
+        for event in events:
+            change_feed.publish(event)
+
+def commit_change(db, entity_type, op, item_id, project_id=None):
+    commit_changes(db, [change_event(db, entity_type, op, item_id, project_id)])
+
+# Optional write-behind mode for quick-add: inserts are handed to a single
+# writer thread that commits them in groups bounded by a time window and a
+# batch size, so many captures share one fsync.
+class WriteQueue:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.started_at = None
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.commits = 0
+        self.commit_seconds = 0.0
+        self.batch_sizes = Counter()
+    
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+                return
+            self.queue = queue.Queue()
+            self.pid = os.getpid()
+            self.started_at = time.time()
+            self.thread = threading.Thread(target=self.run, name='focus-write-queue', daemon=True)
+            self.thread.start()
+    
+    def stop(self, timeout=5):
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            self.queue.put(None)
+            self.thread.join(timeout)
+    
+    def submit(self, entity_type, data):
+        self.start()
+        future = Future()
+        with self.lock:
+            self.submitted += 1
+        self.queue.put((entity_type, data, future))
+        return future
+    
+    def run(self):
+        db = connect_db()
+        batch_size = max(1, app.config['WRITE_QUEUE_BATCH_SIZE'])
+        window = app.config['WRITE_QUEUE_WINDOW_MS'] / 1000
+        stopping = False
+        while not stopping:
+            job = self.queue.get()
+            if job is None:
+                break
+            jobs = [job]
+            deadline = time.monotonic() + window
+            while len(jobs) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                jobs.append(job)
+            self.commit_batch(db, jobs)
+        db.close()
     
-    return jsonify({'success': True})
+    def commit_batch(self, db, jobs):
+        started = time.perf_counter()
+        results = []
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            for entity_type, data, future in jobs:
+                db.execute('SAVEPOINT queued_write')
+                try:
+                    results.append((future, run_mutation(db, entity_type, 'create', data=data).id, None))
+                except (KeyError, TypeError, AttributeError, sqlite3.IntegrityError) as e:
+                    db.execute('ROLLBACK TO queued_write')
+                    results.append((future, None, e))
+                db.execute('RELEASE queued_write')
+            commit_changes(db, [
+                change_event(db, entity_type, 'create', item_id, project_ref(data))
+                for (entity_type, data, _), (_, item_id, error) in zip(jobs, results)
+                if error is None
+            ])
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.rollback()
+            results = [(future, None, e) for _, _, future in jobs]
+        
+        with self.lock:
+            self.commits += 1
+            self.commit_seconds += time.perf_counter() - started
+            self.batch_sizes[len(jobs)] += 1
+            for _, _, error in results:
+                if error is None:
+                    self.committed += 1
+                else:
+                    self.failed += 1
+        
+        for future, item_id, error in results:
+            if error is None:
+                future.set_result(item_id)
+            else:
+                future.set_exception(error)
+    
+    def stats(self):
+        with self.lock:
+            elapsed = time.time() - self.started_at if self.started_at else 0
+            return {
+                'enabled': app.config['WRITE_QUEUE'],
+                'ack': app.config['WRITE_QUEUE_ACK'],
+                'pending': self.queue.qsize(),
+                'submitted': self.submitted,
+                'committed': self.committed,
+                'failed': self.failed,
+                'commits': self.commits,
+                'rows_per_second': round(self.committed / elapsed, 2) if elapsed else 0,
+                'average_batch_size': round(sum(size * n for size, n in self.batch_sizes.items()) / self.commits, 2) if self.commits else 0,
+                'max_batch_size': max(self.batch_sizes) if self.batch_sizes else 0,
+                'average_commit_ms': round(self.commit_seconds * 1000 / self.commits, 3) if self.commits else 0,
+                'batch_sizes': {str(size): n for size, n in sorted(self.batch_sizes.items())}
+            }
 
-@app.route('/api/links/<int:link_id>/update', methods=['PUT'])
-def update_link(link_id):
-    db = get_db()
+write_queue = WriteQueue()
+atexit.register(write_queue.stop)
+
+def quick_add(entity_type):
     data = request.get_json()
     
-    link = db.execute('SELECT id FROM backburner_links WHERE id = ?', (link_id,)).fetchone()
-    if not link:
-        return jsonify({'success': False, 'error': 'Link not found'}), 404
+    if app.config['WRITE_QUEUE']:
+        future = write_queue.submit(entity_type, data)
+        if app.config['WRITE_QUEUE_ACK'] == 'async':
+            return jsonify({'success': True, 'queued': True}), 202
+        try:
+            item_id = future.result(timeout=app.config['WRITE_QUEUE_TIMEOUT'])
+        except FutureTimeoutError:
+            return jsonify({'success': False, 'error': 'Write queue timed out'}), 503
+        except KeyError as e:
+            return jsonify({'success': False, 'error': f'Missing field {e.args[0]}'}), 400
+        except (TypeError, AttributeError, sqlite3.IntegrityError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except sqlite3.Error:
+            return jsonify({'success': False, 'error': 'Could not save item'}), 503
+        return mutation_response(get_db(), entity_type, item_id, id=item_id)
     
-    db.execute('''
-        UPDATE backburner_links 
-        SET url = ?, title = ?, description = ?
-        WHERE id = ?
-    ''', (
-        data['url'],
-        data.get('title', ''),
-        data.get('description', ''),
-        link_id
-    ))
-    db.commit()
+    db = get_db()
+    created = run_mutation(db, entity_type, 'create', data=data)
+    commit_change(db, entity_type, 'create', created.id, created.project_id)
     
-    return jsonify({'success': True})
+    return mutation_response(db, entity_type, created.id)
 
-@app.route('/api/tasks/<int:task_id>/delete', methods=['DELETE'])
-def delete_task(task_id):
+@app.route('/api/write-queue/stats')
+def write_queue_stats():
+    return jsonify(write_queue.stats())
+
+@app.route('/api/tasks/quick-add', methods=['POST'])
+def quick_add_task():
+    return quick_add('task')
+
+@app.route('/api/tasks/<int:task_id>/complete', methods=['POST'])
+def complete_task(task_id):
     db = get_db()
     
-    task = db.execute('SELECT id FROM tasks WHERE id = ?', (task_id,)).fetchone()
-    if not task:
+    task = run_mutation(db, 'task', 'complete', task_id)
+    if task is None:
         return jsonify({'success': False, 'error': 'Task not found'}), 404
     
-    db.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-    db.commit()
+    commit_change(db, 'task', 'complete', task_id, task.project_id)
     
-    return jsonify({'success': True, 'message': 'Task deleted successfully'})
+    return mutation_response(db, 'task', task_id)
 
-@app.route('/api/ideas/<int:idea_id>/delete', methods=['DELETE'])
-def delete_idea(idea_id):
+@app.route('/api/tasks/<int:task_id>/uncomplete', methods=['POST'])
+def uncomplete_task(task_id):
     db = get_db()
     
-    idea = db.execute('SELECT id FROM ideas WHERE id = ?', (idea_id,)).fetchone()
-    if not idea:
-        return jsonify({'success': False, 'error': 'Idea not found'}), 404
+    task = apply_mutation(db, 'task', 'uncomplete', task_id)
+    if task is None:
+        return jsonify({'success': False, 'error': 'Task not found'}), 404
     
-    db.execute('DELETE FROM ideas WHERE id = ?', (idea_id,))
-    db.commit()
+    commit_change(db, 'task', 'uncomplete', task_id, task.project_id)
     
-    return jsonify({'success': True, 'message': 'Idea deleted successfully'})
+    return mutation_response(db, 'task', task_id)
 
-@app.route('/api/notes/<int:note_id>/delete', methods=['DELETE'])
-def delete_note(note_id):
+@app.route('/api/ideas/quick-add', methods=['POST'])
+def quick_add_idea():
+    return quick_add('idea')
+
+@app.route('/api/links/quick-add', methods=['POST'])
+def quick_add_link():
+    return quick_add('link')
+
+@app.route('/api/notes/quick-add', methods=['POST'])
+def quick_add_note():
+    return quick_add('note')
+
+def update_item(entity_type, item_id):
     db = get_db()
     
-    note = db.execute('SELECT id FROM notes WHERE id = ?', (note_id,)).fetchone()
-    if not note:
-        return jsonify({'success': False, 'error': 'Note not found'}), 404
+    updated = run_mutation(db, entity_type, 'update', item_id, request.get_json())
+    if updated is None:
+        return jsonify({'success': False, 'error': f'{ENTITY_NAMES[entity_type]} not found'}), 404
     
-    db.execute('DELETE FROM notes WHERE id = ?', (note_id,))
-    db.commit()
+    commit_change(db, entity_type, 'update', item_id, updated.project_id)
     
-    return jsonify({'success': True, 'message': 'Note deleted successfully'})
+    return mutation_response(db, entity_type, item_id)
 
-@app.route('/api/links/<int:link_id>/delete', methods=['DELETE'])
-def delete_link(link_id):
+@app.route('/api/tasks/<int:task_id>/update', methods=['PUT'])
+def update_task(task_id):
+    return update_item('task', task_id)
+
+@app.route('/api/ideas/<int:idea_id>/update', methods=['PUT'])
+def update_idea(idea_id):
+    return update_item('idea', idea_id)
+
+@app.route('/api/notes/<int:note_id>/update', methods=['PUT'])
+def update_note(note_id):
+    return update_item('note', note_id)
+
+@app.route('/api/links/<int:link_id>/update', methods=['PUT'])
+def update_link(link_id):
+    return update_item('link', link_id)
+
+def delete_item(entity_type, item_id):
     db = get_db()
     
-    link = db.execute('SELECT id FROM backburner_links WHERE id = ?', (link_id,)).fetchone()
-    if not link:
-        return jsonify({'success': False, 'error': 'Link not found'}), 404
+    deleted = apply_mutation(db, entity_type, 'delete', item_id)
+    if deleted is None:
+        return jsonify({'success': False, 'error': f'{ENTITY_NAMES[entity_type]} not found'}), 404
     
-    db.execute('DELETE FROM backburner_links WHERE id = ?', (link_id,))
-    db.commit()
+    commit_change(db, entity_type, 'delete', item_id, deleted.project_id)
     
-    return jsonify({'success': True, 'message': 'Link deleted successfully'})
+    return mutation_response(db, entity_type, item_id, project_id=deleted.project_id, deleted=True,
+                             message=f'{ENTITY_NAMES[entity_type]} deleted successfully')
+
+@app.route('/api/tasks/<int:task_id>/delete', methods=['DELETE'])
+def delete_task(task_id):
+    return delete_item('task', task_id)
+
+@app.route('/api/ideas/<int:idea_id>/delete', methods=['DELETE'])
+def delete_idea(idea_id):
+    return delete_item('idea', idea_id)
+
+@app.route('/api/notes/<int:note_id>/delete', methods=['DELETE'])
+def delete_note(note_id):
+    return delete_item('note', note_id)
+
+@app.route('/api/links/<int:link_id>/delete', methods=['DELETE'])
+def delete_link(link_id):
+    return delete_item('link', link_id)
 
 @app.route('/api/projects', methods=['POST'])
 def create_project():
     db = get_db()
     data = request.get_json()
     
-    db.execute('''
-        INSERT INTO projects (name, description, color)
-        VALUES (?, ?, ?)
-    ''', (
-        data['name'],
-        data.get('description', ''),
-        data.get('color', '#6366f1')
-    ))
-    db.commit()
+    project = run_mutation(db, 'project', 'create', data=data)
+    commit_change(db, 'project', 'create', project.id)
     
-    return jsonify({'success': True})
+    return mutation_response(db, 'project', project.id)
 
 @app.route('/api/projects/<int:project_id>/update', methods=['PUT'])
 def update_project(project_id):
     db = get_db()
     data = request.get_json()
     
-    project = db.execute(
-        'SELECT * FROM projects WHERE id = ? AND is_active = 1',
-        (project_id,)
-    ).fetchone()
-    
-    if not project:
+    if run_mutation(db, 'project', 'update', project_id, data) is None:
         return jsonify({'success': False, 'error': 'Project not found'}), 404
     
-    db.execute('''
-        UPDATE projects 
-        SET name = ?, description = ?, color = ?
-        WHERE id = ?
-    ''', (
-        data['name'],
-        data.get('description', ''),
-        data.get('color', '#3b82f6'),
-        project_id
-    ))
-    db.commit()
+    commit_change(db, 'project', 'update', project_id)
+    
+    return mutation_response(db, 'project', project_id, message='Project updated successfully')
+
+BATCH_MAX_OPERATIONS = 500
+
+class BatchError(Exception):
+    pass
+
+def run_batch_operation(db, operation):
+    if not isinstance(operation, dict):
+        raise BatchError('Operation must be an object')
+    entity_type = operation.get('type')
+    op = operation.get('op')
+    if op not in MUTATIONS.get(entity_type, {}) and not (op == 'restore' and entity_type in ARCHIVE_SOURCES):
+        raise BatchError(f'Unsupported operation {op!r} on {entity_type!r}')
+    
+    item_id = operation.get('id')
+    if op != 'create' and not isinstance(item_id, int):
+        raise BatchError('Missing id')
+    data = operation.get('data') or {}
+    if not isinstance(data, dict):
+        raise BatchError('Operation data must be an object')
+    
+    try:
+        result = apply_mutation(db, entity_type, op, item_id, data)
+    except KeyError as e:
+        raise BatchError(f'Missing field {e.args[0]}')
+    except (TypeError, sqlite3.IntegrityError) as e:
+        raise BatchError(str(e))
+    
+    if result is None:
+        raise BatchError(f'{ENTITY_NAMES[entity_type]} not found')
+    # A restored item reappears to every other client as a new one.
+    return entity_type, 'create' if op == 'restore' else op, result.id, result.project_id
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    db = get_db()
+    data = request.get_json()
+    
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list):
+        return jsonify({'success': False, 'error': 'Expected a list of operations'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'success': False, 'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}), 400
+    
+    mode = data.get('mode', 'atomic')
+    if mode not in ('atomic', 'best_effort'):
+        return jsonify({'success': False, 'error': 'Mode must be atomic or best_effort'}), 400
+    
+    results = []
+    changes = []
+    db.execute('BEGIN IMMEDIATE')
+    for index, operation in enumerate(operations):
+        db.execute('SAVEPOINT batch_operation')
+        try:
+            change = run_batch_operation(db, operation)
+        except BatchError as e:
+            db.execute('ROLLBACK TO batch_operation')
+            db.execute('RELEASE batch_operation')
+            results.append({'index': index, 'success': False, 'error': str(e)})
+            if mode == 'atomic':
+                db.rollback()
+                return jsonify({'success': False, 'mode': mode, 'results': results}), 409
+            continue
+        db.execute('RELEASE batch_operation')
+        changes.append(change)
+        results.append({'index': index, 'success': True, 'id': change[2]})
+    commit_batch_changes(db, changes)
+    
+    return jsonify({
+        'success': all(result['success'] for result in results),
+        'mode': mode,
+        'results': results
+    })
+
+def commit_batch_changes(db, changes):
+    commit_changes(db, [change_event(db, *change) for change in changes])
+    for entity_type, op, item_id, project_id in changes:
+        if entity_type == 'project' and op == 'delete':
+            run_archive(db, project_id=item_id)
+
+@app.route('/api/sync')
+def sync_pull():
+    since = request.args.get('since', 0, type=int)
+    limit = max(1, min(request.args.get('limit', SYNC_PAGE_SIZE, type=int), SYNC_MAX_PAGE_SIZE))
+    db = get_db()
+    # One read transaction, so the change list and the rows agree.
+    db.execute('BEGIN')
+    try:
+        return jsonify(sync_changes(db, since, limit))
+    finally:
+        db.rollback()
+
+@app.route('/api/sync', methods=['POST'])
+def sync_push():
+    db = get_db()
+    data = request.get_json()
+    
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list):
+        return jsonify({'success': False, 'error': 'Expected a list of operations'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'success': False, 'error': f'At most {BATCH_MAX_OPERATIONS} operations per request'}), 400
+    
+    results = []
+    changes = []
+    applied = {}
+    db.execute('BEGIN IMMEDIATE')
+    for operation in operations:
+        op_id = operation.get('op_id') if isinstance(operation, dict) else None
+        if not isinstance(op_id, str) or not op_id:
+            results.append({'op_id': op_id, 'success': False, 'error': 'Missing op_id'})
+            continue
+        result = sync_operation_result(db, op_id, applied)
+        if result is None:
+            db.execute('SAVEPOINT sync_operation')
+            try:
+                change = apply_sync_operation(db, operation, applied)
+            except BatchError as e:
+                db.execute('ROLLBACK TO sync_operation')
+                db.execute('RELEASE sync_operation')
+                results.append({'op_id': op_id, 'success': False, 'error': str(e)})
+                continue
+            db.execute('RELEASE sync_operation')
+            changes.append(change)
+            result = applied[op_id] = {'success': True, 'id': change[2]}
+            db.execute('INSERT INTO sync_operations (op_id, result) VALUES (?, ?)', (op_id, json.dumps(result)))
+        results.append({'op_id': op_id, **result})
+    commit_batch_changes(db, changes)
+    
+    return jsonify({
+        'success': all(result['success'] for result in results),
+        'results': results,
+        'version': sync_version(db)
+    })
+
+# Each section is read with keyset pagination: the cursor holds the sort key
+# of the last row returned, so every page costs the same however deep it is.
+PROJECT_SECTIONS = {
+    'tasks': ('tasks', 'is_completed = 0', (
+        ('priority_rank', 'DESC'), ('created_at', 'ASC'), ('id', 'ASC'))),
+    'completed_tasks': ('tasks', 'is_completed = 1', (
+        ('completed_at', 'DESC'), ('id', 'DESC'))),
+    'ideas': ('ideas', None, (('created_at', 'DESC'), ('id', 'DESC'))),
+    'links': ('backburner_links', None, (('created_at', 'DESC'), ('id', 'DESC'))),
+    'notes': ('notes', None, (('updated_at', 'DESC'), ('id', 'DESC'))),
+}
+
+# Sections whose older rows may have moved to the archive; their pages are
+# merged with archived rows of the same type on the same sort key that also
+# match the section's filters. A deleted project's open tasks are archived
+# too, so only completed ones belong in the completed list.
+ARCHIVED_SECTIONS = {
+    'completed_tasks': ('task', (('is_completed', 'in', [1]),)),
+}
+
+SECTION_TYPES = {
+    'tasks': 'task',
+    'completed_tasks': 'task',
+    'ideas': 'idea',
+    'links': 'link',
+    'notes': 'note',
+}
+
+SECTION_MACROS = {
+    'tasks': 'task_item',
+    'completed_tasks': 'completed_task_item',
+    'ideas': 'idea_item',
+    'links': 'link_item',
+    'notes': 'note_item',
+}
+
+Page = namedtuple('Page', 'items next')
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list) or any(isinstance(v, (list, dict)) for v in values):
+        raise ValueError('Invalid cursor')
+    return values
+
+def keyset_condition(order, values):
+    if len(values) != len(order):
+        raise ValueError('Invalid cursor')
+    # Columns sorted the same way are compared as one row value, which
+    # SQLite can seek to in a matching index instead of scanning up to it.
+    runs = []
+    for i, (_, direction) in enumerate(order):
+        if runs and runs[-1][1] == direction:
+            runs[-1][0].append(i)
+        else:
+            runs.append(([i], direction))
+    clauses = []
+    params = []
+    for r, (positions, direction) in enumerate(runs):
+        previous = [i for run, _ in runs[:r] for i in run]
+        terms = [f'{order[i][0]} = ?' for i in previous]
+        columns = ', '.join(order[i][0] for i in positions)
+        marks = ', '.join('?' for _ in positions)
+        terms.append(f"({columns}) {'<' if direction == 'DESC' else '>'} ({marks})")
+        clauses.append('(' + ' AND '.join(terms) + ')')
+        params.extend(values[i] for i in previous + positions)
+    return '(' + ' OR '.join(clauses) + ')', params
+
+# Yields (sort key, item) pairs for up to limit + 1 rows, straight from the
+# cursor unless archived rows have to be merged in.
+def section_entries(db, project_id, section, after=None, limit=PAGE_SIZE, tags=None, match='all',
+                    filters=(), fields=None):
+    table, condition, order = PROJECT_SECTIONS[section]
+    where = ['1']
+    params = []
+    if project_id is not None:
+        where.append('project_id = ?')
+        params.append(project_id)
+    if condition:
+        where.append(condition)
+    if tags:
+        clause, tag_params = tag_filter(SECTION_TYPES[section], tags, match)
+        where.append(clause)
+        params.extend(tag_params)
+    if filters:
+        clauses, filter_params = filter_clauses(filters)
+        where.extend(clauses)
+        params.extend(filter_params)
+    if after:
+        clause, cursor_params = keyset_condition(order, decode_cursor(after))
+        where.append(clause)
+        params.extend(cursor_params)
     
-    return jsonify({'success': True, 'message': 'Project updated successfully'})
+    key_columns = ', '.join(f'{expr} AS _key{i}' for i, (expr, _) in enumerate(order))
+    order_by = ', '.join(f'{expr} {direction}' for expr, direction in order)
+    cursor = db.execute(f'''
+        SELECT {'*' if fields is None else ', '.join(fields)}, {key_columns} FROM {table}
+        WHERE {' AND '.join(where)}
+        ORDER BY {order_by}
+        LIMIT ?
+    ''', params + [limit + 1])
+    
+    names = [column[0] for column in cursor.description]
+    width = len(names) - len(order)
+    entries = ((list(row[width:]), dict(zip(names[:width], row))) for row in cursor)
+    if section not in ARCHIVED_SECTIONS:
+        return entries
+    
+    entries = list(entries)
+    entity_type, section_filters = ARCHIVED_SECTIONS[section]
+    for row in archive_rows(db, entity_type, project_id, after, limit, section_filters + tuple(filters)):
+        item = archived_item(row)
+        if fields is not None:
+            item = {field: item.get(field) for field in fields}
+        entries.append(([row['sort_at'], row['item_id']], item))
+    entries.sort(key=lambda entry: (entry[0][0] or '', entry[0][1]), reverse=True)
+    return entries
+
+def fetch_section_page(db, project_id, section, after=None, limit=PAGE_SIZE, tags=None, match='all',
+                       filters=()):
+    entries = list(section_entries(db, project_id, section, after, limit, tags, match, filters))
+    
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1][0])
+    
+    return Page([item for _, item in entries], next_cursor)
+
+def page_limit(default=PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+# Filters the list endpoints accept besides project_id and tags, by entity
+# type: query parameter -> (column, kind). `in` takes a comma-separated list,
+# `from`/`to` an inclusive YYYY-MM-DD bound.
+LIST_FILTERS = {
+    'task': {
+        'priority': ('priority', 'in'),
+        'energy': ('energy_level', 'in'),
+        'due_from': ('due_date', 'from'),
+        'due_to': ('due_date', 'to'),
+    },
+}
+
+LIST_MAX_PAGE_SIZE = 5000
+
+def list_filters(entity_type, args):
+    accepted = LIST_FILTERS.get(entity_type, {})
+    for name in {name for filters in LIST_FILTERS.values() for name in filters} - accepted.keys():
+        if args.get(name):
+            raise ValueError(f'{ENTITY_NAMES[entity_type]}s cannot be filtered by {name}')
+    filters = []
+    for name, (column, kind) in accepted.items():
+        value = args.get(name)
+        if not value:
+            continue
+        if kind == 'in':
+            filters.append((column, kind, [part.strip() for part in value.split(',') if part.strip()]))
+            continue
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f'{name} must be YYYY-MM-DD')
+        if kind == 'to':
+            day += timedelta(days=1)
+        filters.append((column, kind, day.strftime('%Y-%m-%d')))
+    return filters
+
+def filter_clauses(filters, field=lambda column: column):
+    clauses = []
+    params = []
+    for column, kind, value in filters:
+        if kind == 'in':
+            clauses.append(f'{field(column)} IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(value))
+        else:
+            clauses.append(f"{field(column)} {'>=' if kind == 'from' else '<'} ?")
+            params.append(value)
+    return clauses, params
+
+# ?fields=title,due_date selects only those columns (and always id), so
+# large text columns are not read unless they are asked for.
+def list_fields(entity_type, value):
+    if not value:
+        return None
+    allowed = TRANSFER_TYPES[entity_type][1]
+    fields = ['id']
+    for field in (part.strip() for part in value.split(',')):
+        if not field or field in fields:
+            continue
+        if field not in allowed:
+            raise ValueError(f'Unknown field {field!r}')
+        fields.append(field)
+    return fields
+
+def stream_page(entries, limit):
+    dumps = app.json.dumps
+    yield '{"items": ['
+    last = None
+    for count, (key, item) in enumerate(entries):
+        if count == limit:
+            yield f'], "next": {dumps(encode_cursor(last))}}}'
+            return
+        yield (', ' if count else '') + dumps(item)
+        last = key
+    yield '], "next": null}'
 
 @app.route('/project/<int:project_id>')
+@conditional(per_project=True)
 def project_detail(project_id):
     db = get_db()
     
+    project = get_project_with_counts(project_id)
+    
+    if not project:
+        return "Project not found", 404
+    
+    sections = {
+        section: fetch_section_page(db, project_id, section)
+        for section in ('tasks', 'ideas', 'links', 'notes')
+    }
+    sections['completed_tasks'] = fetch_section_page(db, project_id, 'completed_tasks', limit=5)
+    
+    return render_template('project.html', project=project, **sections)
+
+@app.route('/api/projects/<int:project_id>/<any(tasks, ideas, links, notes):section>')
+@conditional(per_project=True)
+def project_section(project_id, section):
+    db = get_db()
+    
     project = db.execute(
-        'SELECT * FROM projects WHERE id = ? AND is_active = 1',
+        'SELECT id FROM projects WHERE id = ? AND is_active = 1',
         (project_id,)
     ).fetchone()
     
     if not project:
-        return "Project not found", 404
+        return jsonify({'success': False, 'error': 'Project not found'}), 404
+    
+    if section == 'tasks' and request.args.get('completed') in ('1', 'true'):
+        section = 'completed_tasks'
     
-    project = dict(project)
-    
-    tasks = db.execute('''
-        SELECT * FROM tasks 
-        WHERE project_id = ? AND is_completed = 0
-        ORDER BY 
-            CASE priority 
-                WHEN 'urgent' THEN 4 
-                WHEN 'high' THEN 3 
-                WHEN 'medium' THEN 2 
-                ELSE 1 
-            END DESC, 
-            created_at ASC
-    ''', (project_id,)).fetchall()
-    tasks = [dict(row) for row in tasks]
-    
-    completed_tasks = db.execute('''
-        SELECT * FROM tasks 
-        WHERE project_id = ? AND is_completed = 1
-        ORDER BY completed_at DESC
-        LIMIT 10
-    ''', (project_id,)).fetchall()
-    completed_tasks = [dict(row) for row in completed_tasks]
-    
-    ideas = db.execute('''
-        SELECT * FROM ideas 
-        WHERE project_id = ?
-        ORDER BY created_at DESC
-    ''', (project_id,)).fetchall()
-    ideas = [dict(row) for row in ideas]
-    
-    links = db.execute('''
-        SELECT * FROM backburner_links 
-        WHERE project_id = ?
-        ORDER BY created_at DESC
-    ''', (project_id,)).fetchall()
-    links = [dict(row) for row in links]
-    
-    notes = db.execute('''
-        SELECT * FROM notes 
-        WHERE project_id = ?
-        ORDER BY updated_at DESC
-    ''', (project_id,)).fetchall()
-    notes = [dict(row) for row in notes]
-    
-    return render_template('project.html',
-                         project=project,
-                         tasks=tasks,
-                         completed_tasks=completed_tasks,
-                         ideas=ideas,
-                         links=links,
-                         notes=notes)
+    return section_response(db, project_id, section)
+
+# Shared by the per-project and the cross-project listings: ?tags=a,b
+# filters ideas, links and notes to items carrying every tag, or any of
+# them with ?match=any.
+def section_response(db, project_id, section):
+    tags = parse_tags(request.args.get('tags', ''))
+    match = request.args.get('match', 'all')
+    if match not in ('all', 'any'):
+        return jsonify({'success': False, 'error': 'Match must be all or any'}), 400
+    entity_type = SECTION_TYPES[section]
+    if tags and entity_type not in TAGGED_TABLES:
+        return jsonify({'success': False, 'error': 'Tasks cannot be filtered by tag'}), 400
+    try:
+        filters = list_filters(entity_type, request.args)
+        fields = list_fields(entity_type, request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if request.args.get('format') == 'html':
+        if fields is not None:
+            return jsonify({'success': False, 'error': 'Fields cannot be selected with format=html'}), 400
+        try:
+            page = fetch_section_page(db, project_id, section,
+                                      after=request.args.get('after'),
+                                      limit=page_limit(),
+                                      tags=tags, match=match, filters=filters)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+        macro = SECTION_MACROS[section]
+        return jsonify({'html': ''.join(render_fragment(macro, item) for item in page.items), 'next': page.next})
+    
+    limit = page_limit(maximum=LIST_MAX_PAGE_SIZE)
+    try:
+        entries = section_entries(db, project_id, section,
+                                  after=request.args.get('after'),
+                                  limit=limit,
+                                  tags=tags, match=match,
+                                  filters=filters, fields=fields)
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    return stream_json(stream_page(entries, limit))
+
+@app.route('/api/<any(tasks, ideas, links, notes):section>')
+@conditional()
+def list_items(section):
+    if section == 'tasks' and request.args.get('completed') in ('1', 'true'):
+        section = 'completed_tasks'
+    return section_response(get_db(), request.args.get('project_id', type=int), section)
+
+@app.route('/api/tags')
+@conditional()
+def get_tags():
+    entity_type = request.args.get('type')
+    if entity_type is not None and entity_type not in TAGGED_TABLES:
+        return jsonify({'success': False, 'error': f'Unknown type {entity_type!r}'}), 400
+    return jsonify(tag_counts(get_db(), entity_type, request.args.get('limit', type=int)))
+
+@app.route('/api/stats')
+@conditional(vary=(utc_today,))
+def get_stats():
+    period = request.args.get('period', 'day')
+    if period not in STATS_PERIODS:
+        return jsonify({'success': False, 'error': 'Period must be day or week'}), 400
+    try:
+        end = datetime.strptime(request.args.get('to') or utc_today(), '%Y-%m-%d')
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    if start > end:
+        return jsonify({'success': False, 'error': 'from must not be after to'}), 400
+    if (end - start).days >= STATS_MAX_DAYS:
+        return jsonify({'success': False, 'error': f'At most {STATS_MAX_DAYS} days per query'}), 400
+    
+    return jsonify(task_stats(get_db(), period, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'),
+                              request.args.get('project_id', type=int)))
 
 @app.route('/quick-capture')
+@conditional()
 def quick_capture():
     db = get_db()
     projects = db.execute(
@@ -613,6 +3365,7 @@ def quick_capture():
     return render_template('quick_capture.html', projects=projects)
 
 @app.route('/api/projects', methods=['GET'])
+@conditional()
 def get_projects():
     db = get_db()
     projects = db.execute(
@@ -630,60 +3383,78 @@ def get_projects():
 def delete_project(project_id):
     db = get_db()
     
-    project = db.execute(
-        'SELECT * FROM projects WHERE id = ? AND is_active = 1',
-        (project_id,)
-    ).fetchone()
-    
-    if not project:
+    if run_mutation(db, 'project', 'delete', project_id) is None:
         return jsonify({'success': False, 'error': 'Project not found'}), 404
     
-    db.execute('''
-        UPDATE projects 
-        SET is_active = 0 
-        WHERE id = ?
-    ''', (project_id,))
+    commit_change(db, 'project', 'delete', project_id)
+    run_archive(db, project_id=project_id)
+    
+    return mutation_response(db, 'project', project_id, deleted=True,
+                             message='Project deleted successfully')
+
+ARCHIVE_MACROS = {
+    'task': 'completed_task_item',
+    'idea': 'idea_item',
+    'link': 'link_item',
+    'note': 'note_item',
+}
+
+@app.route('/api/archive')
+@conditional()
+def browse_archive():
+    db = get_db()
     
-    db.execute('UPDATE tasks SET project_id = NULL WHERE project_id = ?', (project_id,))
-    db.execute('UPDATE ideas SET project_id = NULL WHERE project_id = ?', (project_id,))
-    db.execute('UPDATE notes SET project_id = NULL WHERE project_id = ?', (project_id,))
-    db.execute('UPDATE backburner_links SET project_id = NULL WHERE project_id = ?', (project_id,))
+    entity_type = request.args.get('type', 'task')
+    if entity_type not in ARCHIVE_SOURCES:
+        return jsonify({'success': False, 'error': f'Unknown type {entity_type!r}'}), 400
     
-    db.commit()
+    try:
+        page = fetch_archive_page(db, entity_type,
+                                  project_id=request.args.get('project_id', type=int),
+                                  after=request.args.get('after'),
+                                  limit=page_limit())
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    
+    if request.args.get('format') == 'html':
+        html = []
+        for item in page.items:
+            macro = ARCHIVE_MACROS[entity_type]
+            if entity_type == 'task' and not item['is_completed']:
+                macro = 'task_item'
+            html.append(render_fragment(macro, item))
+        return jsonify({'html': ''.join(html), 'next': page.next})
     
-    return jsonify({'success': True, 'message': 'Project deleted successfully'})
+    return jsonify(page._asdict())
 
-@app.route('/api/smart-suggestions')
-def smart_suggestions():
+@app.route('/api/archive/<any(task, idea, link, note):entity_type>/<int:item_id>/restore', methods=['POST'])
+def restore_item(entity_type, item_id):
     db = get_db()
     
-    now = datetime.now()
-    hour = now.hour
+    restored = apply_mutation(db, entity_type, 'restore', item_id)
+    if restored is None:
+        return jsonify({'success': False, 'error': f'{ENTITY_NAMES[entity_type]} not found in the archive'}), 404
+    
+    commit_change(db, entity_type, 'create', item_id, restored.project_id)
+    
+    return mutation_response(db, entity_type, item_id, message=f'{ENTITY_NAMES[entity_type]} restored')
+
+def current_energy_filter():
+    hour = datetime.now().hour
     
     if 6 <= hour < 12:
-        energy_filter = ('high', 'medium')
+        return ('high', 'medium')
     elif 12 <= hour < 17:
-        energy_filter = ('medium', 'high', 'low')
+        return ('medium', 'high', 'low')
     else:
-        energy_filter = ('low', 'medium')
-    
-    placeholders = ','.join('?' * len(energy_filter))
-    
-    suggestions = db.execute(f'''
-        SELECT t.*, p.name as project_name
-        FROM tasks t
-        LEFT JOIN projects p ON t.project_id = p.id
-        WHERE t.is_completed = 0
-        AND t.energy_level IN ({placeholders})
-        ORDER BY 
-            CASE t.priority 
-                WHEN 'urgent' THEN 4 
-                WHEN 'high' THEN 3 
-                WHEN 'medium' THEN 2 
-                ELSE 1 
-            END DESC
-        LIMIT 3
-    ''', energy_filter).fetchall()
+        return ('low', 'medium')
+
+@app.route('/api/smart-suggestions')
+@conditional(vary=(current_energy_filter, utc_today))
+def smart_suggestions():
+    db = get_db()
+    
+    suggestions = ranked_tasks_by_energy(db, current_energy_filter(), 3)
     
     return jsonify([{
         'id': task['id'],
@@ -693,6 +3464,807 @@ def smart_suggestions():
         'project_name': task['project_name']
     } for task in suggestions])
 
+@app.route('/api/search')
+def search_items():
+    db = get_db()
+    
+    query = request.args.get('q', '').strip()
+    match = search_match_expression(query)
+    if not match:
+        return jsonify({'success': False, 'error': 'Missing search query'}), 400
+    
+    types = [t for t in request.args.get('type', '').split(',') if t] or list(SEARCH_INDEXES)
+    if any(t not in SEARCH_INDEXES for t in types):
+        return jsonify({'success': False, 'error': 'Unknown search type'}), 400
+    
+    project_id = request.args.get('project_id', type=int)
+    limit = page_limit()
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    selects = []
+    params = []
+    for entity_type in types:
+        table, index, columns, weights = SEARCH_INDEXES[entity_type]
+        if entity_type == 'project':
+            project_column = 'c.id'
+            active = ' AND c.is_active = 1'
+        else:
+            project_column = 'c.project_id'
+            active = ''
+        selects.append(f'''
+            SELECT '{entity_type}' AS type, c.id AS id, {project_column} AS project_id,
+                highlight({index}, 0, ?, ?) AS title,
+                snippet({index}, -1, ?, ?, '…', 24) AS snippet,
+                bm25({index}, {', '.join(str(w) for w in weights)}) AS rank
+            FROM {index}
+            JOIN {table} c ON c.id = {index}.rowid
+            WHERE {index} MATCH ?{active}
+        ''')
+        params.extend([SEARCH_MARK_START, SEARCH_MARK_END, SEARCH_MARK_START, SEARCH_MARK_END, match])
+    
+    where = ''
+    if project_id is not None:
+        where = 'WHERE r.project_id = ?'
+        params.append(project_id)
+    
+    try:
+        rows = db.execute(f'''
+            SELECT r.*, p.name AS project_name
+            FROM ({' UNION ALL '.join(selects)}) r
+            LEFT JOIN projects p ON p.id = r.project_id
+            {where}
+            ORDER BY r.rank, r.type, r.id
+            LIMIT ? OFFSET ?
+        ''', params + [limit + 1, offset]).fetchall()
+    except sqlite3.OperationalError as e:
+        if 'no such table' in str(e):
+            return jsonify({'success': False, 'error': 'Search is not available'}), 503
+        return jsonify({'success': False, 'error': 'Invalid search query'}), 400
+    
+    next_offset = offset + limit if len(rows) > limit else None
+    
+    return jsonify({
+        'results': [{
+            'type': row['type'],
+            'id': row['id'],
+            'project_id': row['project_id'],
+            'project_name': row['project_name'],
+            'title': search_highlight(row['title']),
+            'snippet': search_highlight(row['snippet']),
+            'rank': row['rank']
+        } for row in rows[:limit]],
+        'next_offset': next_offset
+    })
+
+@app.route('/api/export')
+def export_data():
+    def generate():
+        yield from export_ndjson(get_db())
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=focus-export.ndjson'}
+    )
+
+@app.route('/api/import', methods=['POST'])
+def import_data():
+    db = get_db()
+    batch_size = request.args.get('batch_size', IMPORT_BATCH_SIZE, type=int)
+    
+    try:
+        stats = import_ndjson(db, request.stream, max(1, batch_size))
+    except TransferError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    commit_changes(db, [{'op': 'reset'}])
+    return jsonify({'success': True, **stats})
+
+@app.route('/api/fragments/<any(task, idea, link, note, project):entity_type>/<int:item_id>')
+def item_fragment(entity_type, item_id):
+    return mutation_response(get_db(), entity_type, item_id)
+
+EVENTS_RETRY_AFTER = 30
+
+@app.route('/api/events')
+def change_events():
+    change_feed.follow()
+    if not change_feed.open_stream():
+        metrics.inc('focus_event_streams_rejected_total')
+        response = jsonify({'success': False, 'error': 'Too many open event streams'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(EVENTS_RETRY_AFTER)
+        return response
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    position = change_feed.position(last_event_id)
+    heartbeat = app.config['EVENTS_HEARTBEAT']
+    
+    def generate():
+        current = position
+        yield 'retry: 3000\n\n'
+        if current is None:
+            current = change_feed.last_id
+            event = 'reset' if last_event_id else 'hello'
+            yield f'id: {change_feed.event_id(current)}\nevent: {event}\ndata: {{}}\n\n'
+        while not change_feed.closed:
+            events = change_feed.wait(current, heartbeat)
+            if events is None:
+                current = change_feed.last_id
+                yield f'id: {change_feed.event_id(current)}\nevent: reset\ndata: {{}}\n\n'
+                continue
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+            for number, event in events:
+                current = number
+                name = 'reset' if event.get('op') == 'reset' else 'change'
+                yield f'id: {change_feed.event_id(number)}\nevent: {name}\ndata: {json.dumps(event)}\n\n'
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(change_feed.close_stream)
+    return response
+
+# Online backups. Snapshots are copied with SQLite's backup API a few pages
+# per step, pausing between steps, so each step only holds a short read
+# transaction and writers carry on. Every snapshot is integrity-checked
+# before it is kept and gets a JSON manifest with its checksum.
+SNAPSHOT_PATTERN = 'focus-*.db*'
+
+class BackupError(Exception):
+    pass
+
+class BackupRestarted(Exception):
+    pass
+
+def backup_dir():
+    return Path(app.config['BACKUP_DIR'] or Path(DATABASE).resolve().parent / 'backups')
+
+backup_thread_lock = threading.Lock()
+
+@contextmanager
+def backup_lock(directory):
+    # Serializes snapshots between threads and, where flock exists, between
+    # worker processes sharing the backup directory.
+    with backup_thread_lock, open(directory / '.lock', 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def copy_database(target_path):
+    pages = max(1, app.config['BACKUP_PAGES'])
+    pause = app.config['BACKUP_STEP_PAUSE_MS'] / 1000
+    state = {'steps': 0, 'restarts': 0, 'remaining': None}
+    
+    # A write from another connection between steps makes SQLite start the
+    # copy over; after BACKUP_MAX_RESTARTS of those the rest is copied in a
+    # single step, which in WAL mode still only holds a read snapshot.
+    def progress(status, remaining, total):
+        state['steps'] += 1
+        if state['remaining'] is not None and remaining >= state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > app.config['BACKUP_MAX_RESTARTS']:
+                raise BackupRestarted()
+        state['remaining'] = remaining
+        if pause:
+            time.sleep(pause)
+    
+    source = sqlite3.connect(DATABASE)
+    source.execute('PRAGMA busy_timeout = %d' % app.config['SQLITE_BUSY_TIMEOUT'])
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        except BackupRestarted:
+            source.backup(target)
+            state['steps'] += 1
+        page_count = target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    return {'pages': page_count, 'steps': state['steps'], 'restarts': state['restarts']}
+
+def integrity_problems(path):
+    db = sqlite3.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        rows = [row[0] for row in db.execute('PRAGMA integrity_check')]
+    finally:
+        db.close()
+    return [] if rows == ['ok'] else rows
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def manifest_path(path):
+    return path.with_name(path.name + '.json')
+
+def list_snapshots(directory=None):
+    directory = directory or backup_dir()
+    snapshots = []
+    for path in sorted(directory.glob(SNAPSHOT_PATTERN)):
+        if path.suffix not in ('.db', '.gz'):
+            continue
+        manifest = {}
+        if manifest_path(path).exists():
+            manifest = json.loads(manifest_path(path).read_text())
+        snapshots.append({**manifest, 'name': path.name, 'size': path.stat().st_size})
+    return snapshots
+
+def prune_snapshots(directory, retain):
+    if retain <= 0:
+        return []
+    removed = []
+    for snapshot in list_snapshots(directory)[:-retain]:
+        path = directory / snapshot['name']
+        path.unlink(missing_ok=True)
+        manifest_path(path).unlink(missing_ok=True)
+        removed.append(snapshot['name'])
+    return removed
+
+def newest_snapshot_age(directory):
+    snapshots = list_snapshots(directory)
+    if not snapshots:
+        return None
+    return time.time() - (directory / snapshots[-1]['name']).stat().st_mtime
+
+def create_snapshot(compress=None, verify=True, if_older_than=None):
+    compress = app.config['BACKUP_COMPRESS'] if compress is None else compress
+    directory = backup_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    
+    with backup_lock(directory):
+        if if_older_than is not None:
+            age = newest_snapshot_age(directory)
+            if age is not None and age < if_older_than:
+                return None
+        
+        started = time.perf_counter()
+        created_at = datetime.now()
+        name = 'focus-' + created_at.strftime('%Y%m%d-%H%M%S')
+        if list(directory.glob(name + '.db*')):
+            name += created_at.strftime('-%f')
+        partial = directory / (name + '.db.partial')
+        try:
+            stats = copy_database(partial)
+            if verify:
+                problems = integrity_problems(partial)
+                if problems:
+                    raise BackupError('Integrity check failed: ' + '; '.join(problems[:5]))
+            path = directory / (name + '.db')
+            if compress:
+                path = directory / (name + '.db.gz')
+                with open(partial, 'rb') as source, gzip.open(path, 'wb', compresslevel=6) as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+                partial.unlink()
+            else:
+                partial.rename(path)
+        except Exception:
+            partial.unlink(missing_ok=True)
+            metrics.inc('focus_backups_total', [('result', 'failed')])
+            raise
+        
+        manifest = {
+            'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'compressed': bool(compress),
+            'sha256': file_sha256(path),
+            'integrity': 'ok' if verify else 'unchecked',
+            'seconds': round(time.perf_counter() - started, 3),
+            **stats
+        }
+        manifest_path(path).write_text(json.dumps(manifest, indent=2) + '\n')
+        removed = prune_snapshots(directory, app.config['BACKUP_RETAIN'])
+    
+    metrics.inc('focus_backups_total', [('result', 'ok')])
+    metrics.observe('focus_backup_duration_seconds', manifest['seconds'])
+    app.logger.info('Backup %s written in %.2fs (%d pages, %d restarts)', path.name, manifest['seconds'],
+                    manifest['pages'], manifest['restarts'])
+    return {**manifest, 'name': path.name, 'size': path.stat().st_size, 'pruned': removed}
+
+def verify_snapshot(name, directory=None):
+    directory = directory or backup_dir()
+    path = directory / name
+    if path.parent != directory or not path.is_file():
+        raise BackupError(f'No snapshot named {name}')
+    
+    problems = []
+    manifest_file = manifest_path(path)
+    if manifest_file.exists():
+        expected = json.loads(manifest_file.read_text()).get('sha256')
+        if expected and expected != file_sha256(path):
+            problems.append('Checksum does not match the manifest')
+    else:
+        problems.append('Manifest is missing')
+    
+    if path.suffix == '.gz':
+        checked = directory / (path.name + '.verify')
+        try:
+            with gzip.open(path, 'rb') as source, open(checked, 'wb') as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            problems.extend(integrity_problems(checked))
+        except (OSError, EOFError, zlib.error) as e:
+            problems.append(f'Could not decompress: {e}')
+        except sqlite3.DatabaseError as e:
+            problems.append(str(e))
+        finally:
+            checked.unlink(missing_ok=True)
+    else:
+        try:
+            problems.extend(integrity_problems(path))
+        except sqlite3.DatabaseError as e:
+            problems.append(str(e))
+    return problems
+
+# Scheduled snapshots run on a background thread in every process; the
+# backup lock and the age check against the newest snapshot keep several
+# workers from taking the same snapshot twice.
+class BackupScheduler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+    
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='focus-backup', daemon=True)
+            self.thread.start()
+    
+    def run(self):
+        interval = app.config['BACKUP_INTERVAL']
+        while True:
+            try:
+                create_snapshot(if_older_than=interval)
+            except (OSError, sqlite3.Error, BackupError) as e:
+                app.logger.error('Scheduled backup failed: %s', e)
+            age = newest_snapshot_age(backup_dir())
+            time.sleep(max(1, interval - (age or 0)))
+
+backup_scheduler = BackupScheduler()
+
+@app.before_request
+def start_backup_scheduler():
+    if app.config['BACKUP_INTERVAL'] > 0:
+        backup_scheduler.start()
+
+# Behind a reverse proxy on the same host every client arrives from
+# localhost, so trusting the address is an explicit opt-in.
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = app.config['ADMIN_TOKEN']
+        if token:
+            allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        else:
+            allowed = app.config['ADMIN_ALLOW_LOCALHOST'] and request.remote_addr in ('127.0.0.1', '::1')
+        if not allowed:
+            return jsonify({'success': False, 'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/admin/backups', methods=['GET'])
+@admin_required
+def list_backups():
+    return jsonify({'directory': str(backup_dir()), 'snapshots': list_snapshots() if backup_dir().exists() else []})
+
+@app.route('/api/admin/backups', methods=['POST'])
+@admin_required
+def create_backup():
+    compress = request.args.get('compress')
+    try:
+        snapshot = create_snapshot(compress=None if compress is None else compress in ('1', 'true'))
+    except (OSError, sqlite3.Error, BackupError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, 'snapshot': snapshot}), 201
+
+@app.route('/api/admin/backups/<name>/verify', methods=['POST'])
+@admin_required
+def verify_backup(name):
+    try:
+        problems = verify_snapshot(name)
+    except BackupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    return jsonify({'success': not problems, 'name': name, 'problems': problems})
+
+@app.cli.group()
+def backup():
+    """Take and check online snapshots of the database."""
+
+@backup.command('create')
+@click.option('--compress/--no-compress', default=None, help='Gzip the snapshot (default: BACKUP_COMPRESS).')
+@click.option('--verify/--no-verify', default=True, show_default=True, help='Run an integrity check before keeping it.')
+def backup_create_command(compress, verify):
+    """Snapshot the live database into BACKUP_DIR and apply retention."""
+    try:
+        snapshot = create_snapshot(compress, verify)
+    except BackupError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{snapshot['name']}: {snapshot['size']} bytes, {snapshot['pages']} pages in "
+               f"{snapshot['steps']} steps, {snapshot['seconds']:.2f}s, integrity {snapshot['integrity']}")
+    for name in snapshot['pruned']:
+        click.echo(f'pruned {name}')
+
+@backup.command('list')
+def backup_list_command():
+    """List the snapshots in BACKUP_DIR, oldest first."""
+    for snapshot in list_snapshots() if backup_dir().exists() else []:
+        click.echo(f"{snapshot['name']:<32} {snapshot['size']:>12}  {snapshot.get('integrity', '?')}")
+
+@backup.command('verify')
+@click.argument('names', nargs=-1)
+def backup_verify_command(names):
+    """Check snapshot checksums and integrity (default: every snapshot)."""
+    names = names or [snapshot['name'] for snapshot in list_snapshots()]
+    failed = 0
+    for name in names:
+        try:
+            problems = verify_snapshot(name)
+        except BackupError as e:
+            problems = [str(e)]
+        click.echo(f"{name}: {'ok' if not problems else '; '.join(problems)}")
+        failed += bool(problems)
+    if failed:
+        raise SystemExit(1)
+
+# Background maintenance. A worker thread waits for an idle window (no
+# request in flight for MAINTENANCE_IDLE_SECONDS) and runs whichever jobs
+# are due. Each job gets MAINTENANCE_BUDGET_MS; a progress handler
+# interrupts SQLite once it is spent. Runs are claimed and recorded in
+# maintenance_runs, so several worker processes share one schedule.
+MAINTENANCE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS maintenance_runs (
+        job TEXT PRIMARY KEY,
+        started_at TIMESTAMP,
+        seconds REAL,
+        status TEXT,
+        detail TEXT
+    );
+'''
+
+def maintenance_checkpoint(db, deadline):
+    busy, log_frames, checkpointed = db.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    return {'busy': busy, 'log_frames': log_frames, 'checkpointed_frames': checkpointed}
+
+def maintenance_optimize(db, deadline):
+    db.execute('PRAGMA analysis_limit = %d' % app.config['MAINTENANCE_ANALYSIS_LIMIT'])
+    db.execute('PRAGMA optimize')
+    return {}
+
+def maintenance_analyze(db, deadline):
+    db.execute('PRAGMA analysis_limit = %d' % app.config['MAINTENANCE_ANALYSIS_LIMIT'])
+    db.execute('ANALYZE')
+    return {}
+
+def maintenance_vacuum(db, deadline):
+    if db.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return {'skipped': 'auto_vacuum is not incremental'}
+    step = max(1, app.config['MAINTENANCE_VACUUM_STEP'])
+    freed = 0
+    free_pages = db.execute('PRAGMA freelist_count').fetchone()[0]
+    # Each step is its own short write transaction. executescript() runs the
+    # pragma to completion; execute() would free a single page.
+    while free_pages and time.perf_counter() < deadline:
+        db.executescript('PRAGMA incremental_vacuum(%d)' % min(step, free_pages))
+        remaining = db.execute('PRAGMA freelist_count').fetchone()[0]
+        freed += free_pages - remaining
+        if remaining >= free_pages:
+            break
+        free_pages = remaining
+    return {'freed_pages': freed, 'free_pages': free_pages}
+
+def maintenance_sync_compact(db, deadline):
+    return compact_sync_log(db)
+
+def maintenance_archive(db, deadline):
+    return dict(run_archive(db, deadline=deadline))
+
+# (name, config key holding its interval in seconds, function)
+MAINTENANCE_JOBS = (
+    ('archive', 'MAINTENANCE_ARCHIVE_INTERVAL', maintenance_archive),
+    ('checkpoint', 'MAINTENANCE_CHECKPOINT_INTERVAL', maintenance_checkpoint),
+    ('optimize', 'MAINTENANCE_OPTIMIZE_INTERVAL', maintenance_optimize),
+    ('analyze', 'MAINTENANCE_ANALYZE_INTERVAL', maintenance_analyze),
+    ('vacuum', 'MAINTENANCE_VACUUM_INTERVAL', maintenance_vacuum),
+    ('sync_compact', 'MAINTENANCE_SYNC_COMPACT_INTERVAL', maintenance_sync_compact),
+)
+
+MAINTENANCE_JOB_NAMES = tuple(name for name, _, _ in MAINTENANCE_JOBS)
+
+def init_maintenance(db):
+    db.executescript(MAINTENANCE_SCHEMA)
+    db.executemany('INSERT OR IGNORE INTO maintenance_runs (job) VALUES (?)',
+                   [(name,) for name in MAINTENANCE_JOB_NAMES])
+
+def claim_maintenance_job(db, name, interval):
+    claimed = db.execute('''
+        UPDATE maintenance_runs SET started_at = CURRENT_TIMESTAMP
+        WHERE job = ? AND (started_at IS NULL OR started_at <= datetime('now', ?))
+    ''', (name, f'-{int(interval)} seconds')).rowcount
+    db.commit()
+    return claimed == 1
+
+def run_maintenance_job(db, name, budget_ms=None):
+    function = {job: function for job, _, function in MAINTENANCE_JOBS}[name]
+    budget = (app.config['MAINTENANCE_BUDGET_MS'] if budget_ms is None else budget_ms) / 1000
+    started = time.perf_counter()
+    deadline = started + budget
+    db.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+    try:
+        detail = function(db, deadline)
+        status = 'ok'
+    except sqlite3.OperationalError as e:
+        if db.in_transaction:
+            db.rollback()
+        status = 'timeout' if 'interrupt' in str(e) else 'error'
+        detail = {'error': str(e)}
+    finally:
+        db.set_progress_handler(None, 0)
+    seconds = time.perf_counter() - started
+    
+    db.execute(
+        'UPDATE maintenance_runs SET seconds = ?, status = ?, detail = ? WHERE job = ?',
+        (round(seconds, 4), status, json.dumps(detail), name)
+    )
+    db.commit()
+    
+    metrics.inc('focus_maintenance_runs_total', [('job', name), ('status', status)])
+    metrics.observe('focus_maintenance_seconds', seconds, [('job', name)])
+    app.logger.info('Maintenance %s: %s in %.3fs %s', name, status, seconds, detail)
+    return {'job': name, 'status': status, 'seconds': round(seconds, 4), **detail}
+
+def maintenance_status(db):
+    return [
+        {**dict(row), 'detail': json.loads(row['detail']) if row['detail'] else None}
+        for row in db.execute('SELECT * FROM maintenance_runs ORDER BY job')
+    ]
+
+# last_seen lives in shared memory created before the server forks, so a
+# worker process only counts as idle once requests have stopped arriving at
+# every worker. In-flight requests are only counted per process.
+class RequestActivity:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.last_seen = RawValue('d', time.monotonic())
+    
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.last_seen.value = time.monotonic()
+    
+    def end(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.last_seen.value = time.monotonic()
+    
+    def idle_for(self):
+        with self.lock:
+            return 0 if self.in_flight else time.monotonic() - self.last_seen.value
+
+request_activity = RequestActivity()
+
+# Event streams stay open for as long as a tab does; they are not activity.
+IDLE_EXEMPT_ENDPOINTS = ('change_events', 'static', 'asset')
+
+class MaintenanceWorker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+    
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='focus-maintenance', daemon=True)
+            self.thread.start()
+    
+    def run(self):
+        db = connect_db()
+        while True:
+            time.sleep(app.config['MAINTENANCE_POLL'])
+            for name, interval_key, _ in MAINTENANCE_JOBS:
+                interval = app.config[interval_key]
+                if interval <= 0 or request_activity.idle_for() < app.config['MAINTENANCE_IDLE_SECONDS']:
+                    continue
+                try:
+                    if claim_maintenance_job(db, name, interval):
+                        run_maintenance_job(db, name)
+                except sqlite3.Error as e:
+                    if db.in_transaction:
+                        db.rollback()
+                    app.logger.error('Maintenance %s failed: %s', name, e)
+
+maintenance_worker = MaintenanceWorker()
+
+@app.before_request
+def track_request_activity():
+    if request.endpoint in IDLE_EXEMPT_ENDPOINTS:
+        return
+    g.tracked_activity = True
+    request_activity.begin()
+    if app.config['MAINTENANCE']:
+        maintenance_worker.start()
+
+@app.teardown_request
+def end_request_activity(error):
+    if g.pop('tracked_activity', False):
+        request_activity.end()
+
+@app.route('/api/admin/maintenance')
+@admin_required
+def maintenance_report():
+    return jsonify({
+        'enabled': app.config['MAINTENANCE'],
+        'idle_seconds': round(request_activity.idle_for(), 3),
+        'jobs': maintenance_status(get_db())
+    })
+
+@app.cli.group()
+def maintenance():
+    """Run database maintenance jobs."""
+
+@maintenance.command('run')
+@click.argument('jobs', nargs=-1, type=click.Choice(MAINTENANCE_JOB_NAMES))
+@click.option('--budget-ms', type=float, help='Time budget per job (default: MAINTENANCE_BUDGET_MS).')
+def maintenance_run_command(jobs, budget_ms):
+    """Run the named jobs now, or every job if none is named."""
+    db = connect_db()
+    for name in jobs or MAINTENANCE_JOB_NAMES:
+        claim_maintenance_job(db, name, 0)
+        result = run_maintenance_job(db, name, budget_ms)
+        detail = ', '.join(f'{key}={value}' for key, value in result.items() if key not in ('job', 'status', 'seconds'))
+        click.echo(f"{name:<11} {result['status']:<8} {result['seconds'] * 1000:>9.1f} ms  {detail}")
+    db.close()
+
+@maintenance.command('status')
+def maintenance_status_command():
+    """Show when each job last ran and how long it took."""
+    for job in maintenance_status(get_db()):
+        seconds = '-' if job['seconds'] is None else f"{job['seconds'] * 1000:.1f} ms"
+        click.echo(f"{job['job']:<11} {job['started_at'] or 'never':<20} {job['status'] or '-':<8} {seconds:>10}")
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.query_count = 0
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.endpoint or 'unknown'
+        labels = [('endpoint', endpoint), ('method', request.method)]
+        metrics.observe('focus_request_duration_seconds', time.perf_counter() - started, labels)
+        metrics.observe('focus_request_queries', g.get('query_count', 0), [('endpoint', endpoint)], COUNT_BUCKETS)
+        metrics.inc('focus_requests_total', labels + [('status', response.status_code)])
+    return response
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('render_started', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_render_time(sender, template, context, **extra):
+    timers = g.get('render_started') if has_request_context() else None
+    if timers:
+        metrics.observe('focus_template_render_seconds', time.perf_counter() - timers.pop(), [('template', template.name)])
+
+@app.route('/metrics')
+def metrics_endpoint():
+    text = metrics.render([
+        ('focus_write_queue_pending', write_queue.queue.qsize()),
+        ('focus_change_feed_last_id', change_feed.last_id),
+        ('focus_event_streams', change_feed.streams),
+        ('focus_fragment_cache_bytes', fragment_cache.size),
+        ('focus_fragment_cache_entries', len(fragment_cache.entries)),
+    ])
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/slow-queries')
+def slow_query_log():
+    with slow_queries_lock:
+        entries = list(slow_queries)
+    return jsonify({'threshold_ms': app.config['SLOW_QUERY_MS'], 'queries': entries[::-1]})
+
+# Production serving. `flask --app focus serve` creates and migrates the
+# database once in the gunicorn master, then forks worker processes that each
+# run a pool of threads. Per-process state is set up lazily after the fork:
+# connections are per thread, and the write queue, backup scheduler and
+# maintenance worker start on a worker's first request.
+database_ready = False
+
+def create_app():
+    global database_ready
+    if not database_ready:
+        init_db()
+        database_ready = True
+    return app
+
+def stop_streams_on_exit(worker):
+    # gunicorn waits for open requests before a worker exits; event streams
+    # never finish, so end them and let the clients reconnect elsewhere.
+    handle_exit = worker.handle_exit
+    
+    def exit_handler(signum, frame):
+        change_feed.close()
+        handle_exit(signum, frame)
+    
+    signal.signal(signal.SIGTERM, exit_handler)
+
+@app.cli.command('serve')
+@click.option('--host', help='Interface to listen on (default: SERVE_HOST).')
+@click.option('--port', type=int, help='Port to listen on (default: SERVE_PORT).')
+@click.option('--workers', type=int, help='Worker processes (default: SERVE_WORKERS, or one per CPU).')
+@click.option('--threads', type=int, help='Threads per worker (default: SERVE_THREADS).')
+@click.option('--timeout', type=int, help='Seconds before a silent worker is restarted (default: SERVE_TIMEOUT).')
+@click.option('--graceful-timeout', type=int, help='Seconds a worker gets to finish requests on reload (default: SERVE_GRACEFUL_TIMEOUT).')
+@click.option('--keep-alive', type=int, help='Seconds an idle keep-alive connection stays open (default: SERVE_KEEP_ALIVE).')
+@click.option('--max-requests', type=int, help='Recycle a worker after this many requests, 0 never (default: SERVE_MAX_REQUESTS).')
+@click.option('--pid', 'pidfile', type=click.Path(dir_okay=False), help='Write the master process id to this file.')
+def serve_command(host, port, workers, threads, timeout, graceful_timeout, keep_alive, max_requests, pidfile):
+    """Serve FOCUS with gunicorn worker processes.
+    
+    Send the master SIGHUP to replace the workers gracefully, or SIGUSR2
+    followed by SIGQUIT to the old master to upgrade to new code without
+    dropping connections.
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise click.ClickException('gunicorn is not installed; run pip install gunicorn')
+    
+    config = app.config
+    workers = workers or config['SERVE_WORKERS'] or os.cpu_count() or 1
+    threads = threads or config['SERVE_THREADS']
+    timeout = config['SERVE_TIMEOUT'] if timeout is None else timeout
+    max_requests = config['SERVE_MAX_REQUESTS'] if max_requests is None else max_requests
+    if workers > 1:
+        config['EVENTS_SHARED'] = True
+    if not config['EVENTS_MAX_STREAMS']:
+        config['EVENTS_MAX_STREAMS'] = max(1, threads // 2)
+    if timeout and not config['REQUEST_TIMEOUT']:
+        config['REQUEST_TIMEOUT'] = timeout
+    
+    options = {
+        'bind': [f'{host or config["SERVE_HOST"]}:{port or config["SERVE_PORT"]}'],
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'timeout': timeout,
+        'graceful_timeout': config['SERVE_GRACEFUL_TIMEOUT'] if graceful_timeout is None else graceful_timeout,
+        'keepalive': config['SERVE_KEEP_ALIVE'] if keep_alive is None else keep_alive,
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'pidfile': pidfile,
+        'proc_name': 'focus',
+        'post_worker_init': stop_streams_on_exit,
+    }
+    
+    class FocusApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return app
+    
+    try:
+        build_assets()
+    except OSError as e:
+        click.echo(f'warning: could not build static assets: {e}', err=True)
+    create_app()
+    click.echo(f'Serving on {options["bind"][0]} with {workers} worker(s) x {options["threads"]} thread(s)')
+    FocusApplication().run()
+
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True, host='0.0.0.0', port=3287)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=3287)
\ No newline at end of file
@@ -104,6 +104,21 @@ function loadProjects() {
         color: card.style.getPropertyValue('--project-color') || '#1e40af'
     }));
     
+    if (!currentProjects.length) {
+        // Pages without project cards read the list from the local mirror.
+        mirroredItems('project')
+            .then(projects => {
+                currentProjects = projects.map(project => ({
+                    id: String(project.id),
+                    name: project.data.name,
+                    color: project.data.color
+                }));
+                updateProjectSelects();
+            })
+            .catch(() => updateProjectSelects());
+        return;
+    }
+    
     updateProjectSelects();
 }
 
@@ -192,7 +207,7 @@ function submitQuickTask() {
         return;
     }
     
-    fetch('/api/tasks/quick-add', {
+    sendWrite('/api/tasks/quick-add' + viewQuery(), {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -205,14 +220,20 @@ function submitQuickTask() {
             showToast('Task added successfully!', 'success');
             closeQuickCapture();
             
-            setTimeout(() => {
-                window.location.reload();
-            }, 1000);
+            if (!applyMutation('task', 'create', data)) {
+                setTimeout(() => {
+                    window.location.reload();
+                }, 1000);
+            }
         } else {
             showToast('Error adding task', 'error');
         }
     })
     .catch(error => {
+        if (saveOffline(error, { type: 'task', op: 'create', data: taskData })) {
+            closeQuickCapture();
+            return;
+        }
         console.error('Error:', error);
         showToast('Error adding task', 'error');
     });
@@ -230,7 +251,7 @@ function submitQuickIdea() {
         return;
     }
     
-    fetch('/api/ideas/quick-add', {
+    sendWrite('/api/ideas/quick-add' + viewQuery(), {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -243,14 +264,20 @@ function submitQuickIdea() {
             showToast('Idea captured!', 'success');
             closeQuickCapture();
             
-            setTimeout(() => {
-                window.location.reload();
-            }, 1000);
+            if (!applyMutation('idea', 'create', data)) {
+                setTimeout(() => {
+                    window.location.reload();
+                }, 1000);
+            }
         } else {
             showToast('Error capturing idea', 'error');
         }
     })
     .catch(error => {
+        if (saveOffline(error, { type: 'idea', op: 'create', data: ideaData })) {
+            closeQuickCapture();
+            return;
+        }
         console.error('Error:', error);
         showToast('Error capturing idea', 'error');
     });
@@ -269,7 +296,7 @@ function submitQuickLink() {
         return;
     }
     
-    fetch('/api/links/quick-add', {
+    sendWrite('/api/links/quick-add' + viewQuery(), {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -282,14 +309,20 @@ function submitQuickLink() {
             showToast('Link saved to backburner!', 'success');
             closeQuickCapture();
 
-            setTimeout(() => {
-                window.location.reload();
-            }, 1000);
+            if (!applyMutation('link', 'create', data)) {
+                setTimeout(() => {
+                    window.location.reload();
+                }, 1000);
+            }
         } else {
             showToast('Error saving link', 'error');
         }
     })
     .catch(error => {
+        if (saveOffline(error, { type: 'link', op: 'create', data: linkData })) {
+            closeQuickCapture();
+            return;
+        }
         console.error('Error:', error);
         showToast('Error saving link', 'error');
     });
@@ -307,7 +340,7 @@ function submitQuickNote() {
         return;
     }
     
-    fetch('/api/notes/quick-add', {
+    sendWrite('/api/notes/quick-add' + viewQuery(), {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -320,7 +353,7 @@ function submitQuickNote() {
             showToast('Note saved!', 'success');
             closeQuickCapture();
             
-            if (window.location.pathname.includes('/project/')) {
+            if (!applyMutation('note', 'create', data)) {
                 setTimeout(() => {
                     window.location.reload();
                 }, 1000);
@@ -330,6 +363,10 @@ function submitQuickNote() {
         }
     })
     .catch(error => {
+        if (saveOffline(error, { type: 'note', op: 'create', data: noteData })) {
+            closeQuickCapture();
+            return;
+        }
         console.error('Error:', error);
         showToast('Error saving note', 'error');
     });
@@ -339,12 +376,9 @@ function toggleTask(taskId) {
     const taskItem = document.querySelector(`[data-task-id="${taskId}"]`);
     const checkbox = taskItem.querySelector('.task-checkbox');
     const isCompleted = checkbox.classList.contains('checked');
+    const op = isCompleted ? 'uncomplete' : 'complete';
     
-    const endpoint = isCompleted ? 
-        `/api/tasks/${taskId}/uncomplete` : 
-        `/api/tasks/${taskId}/complete`;
-    
-    fetch(endpoint, { method: 'POST' })
+    sendWrite(`/api/tasks/${taskId}/${op}` + viewQuery(), { method: 'POST' })
         .then(response => response.json())
         .then(data => {
             if (data.success) {
@@ -352,39 +386,428 @@ function toggleTask(taskId) {
                     checkbox.classList.remove('checked');
                     checkbox.textContent = '';
                     showToast('Task marked incomplete', 'success');
-
                     taskItem.style.opacity = '1';
-                    setTimeout(() => {
-                        updateCompletedCount();
-                    }, 500);
-
-                    setTimeout(() => {
-                        window.location.reload();
-                    }, 1000);
                 } else {
                     checkbox.classList.add('checked');
                     checkbox.textContent = '✓';
                     showToast('Task completed!', 'success');
-                    
                     taskItem.style.opacity = '0.6';
-                    setTimeout(() => {
-                        updateCompletedCount();
-                    }, 500);
-
-                    setTimeout(() => {
-                        window.location.reload();
-                    }, 1000);
                 }
+                
+                setTimeout(() => {
+                    if (!applyMutation('task', op, data)) {
+                        window.location.reload();
+                    }
+                }, 500);
             } else {
                 showToast('Error updating task', 'error');
             }
         })
         .catch(error => {
+            if (saveOffline(error, { type: 'task', op: op, id: Number(taskId) })) {
+                checkbox.classList.toggle('checked', !isCompleted);
+                checkbox.textContent = isCompleted ? '' : '✓';
+                taskItem.style.opacity = isCompleted ? '1' : '0.6';
+                return;
+            }
             console.error('Error:', error);
             showToast('Error updating task', 'error');
         });
 }
 
+function currentView() {
+    return document.body.dataset.view || '';
+}
+
+function viewQuery() {
+    const view = currentView();
+    return view ? `?view=${view}` : '';
+}
+
+function findItemElements(type, id) {
+    const selector = type === 'project' ? '.project-card' : '';
+    return document.querySelectorAll(`.main-content ${selector}[data-${type}-id="${id}"]`);
+}
+
+function applyCounters(counters) {
+    if (!counters) {
+        return;
+    }
+    
+    let scope = null;
+    if (currentView() === 'dashboard') {
+        scope = document.querySelector(`.project-card[data-project-id="${counters.project_id}"]`);
+    } else if (currentView() === 'project' && document.body.dataset.projectId === String(counters.project_id)) {
+        scope = document.querySelector('.main-content');
+    }
+    
+    if (scope) {
+        scope.querySelectorAll('[data-counter]').forEach(element => {
+            if (element.dataset.counter in counters) {
+                element.textContent = counters[element.dataset.counter];
+            }
+        });
+    }
+}
+
+const PRIORITY_RANKS = { urgent: 4, high: 3, medium: 2, low: 1 };
+
+function insertTaskByPriority(list, html, priority) {
+    const rank = PRIORITY_RANKS[priority] || 1;
+    const next = Array.from(list.querySelectorAll(':scope > .task-item')).find(
+        element => (PRIORITY_RANKS[element.dataset.priority] || 1) < rank
+    );
+    
+    if (next) {
+        next.insertAdjacentHTML('beforebegin', html);
+    } else if (!list.parentElement.querySelector('.load-more-btn')) {
+        list.insertAdjacentHTML('beforeend', html);
+    }
+}
+
+function prependFragment(listId, html, limit = null) {
+    const list = document.getElementById(listId);
+    if (!list) {
+        return false;
+    }
+    
+    list.insertAdjacentHTML('afterbegin', html);
+    if (limit) {
+        while (list.children.length > limit) {
+            list.removeChild(list.lastElementChild);
+        }
+    }
+    return true;
+}
+
+function insertFragment(type, data) {
+    const item = data.item;
+    
+    if (currentView() === 'project') {
+        if (document.body.dataset.projectId !== String(item.project_id)) {
+            return true;
+        }
+        
+        if (type === 'task' && !item.is_completed) {
+            const list = document.getElementById('tasks-list');
+            if (!list) {
+                return false;
+            }
+            insertTaskByPriority(list, data.html, item.priority);
+            return true;
+        }
+        
+        const lists = { task: 'completed-tasks-list', idea: 'ideas-list', link: 'links-list', note: 'notes-list' };
+        return prependFragment(lists[type], data.html);
+    }
+    
+    if (currentView() === 'dashboard') {
+        const lists = { idea: 'recent-ideas-list', note: 'recent-notes-list', project: 'projects-grid' };
+        if (!lists[type]) {
+            return true;
+        }
+        return prependFragment(lists[type], data.html, type === 'project' ? null : 3);
+    }
+    
+    return true;
+}
+
+// Patches the current page with the item and counters returned by a
+// mutation. Returns false when the page cannot be patched and needs a reload.
+function applyMutation(type, op, data) {
+    if (!currentView()) {
+        return true;
+    }
+    if (op !== 'delete' && !data.item) {
+        return false;
+    }
+    
+    applyCounters(data.counters);
+    
+    const existing = findItemElements(type, data.id);
+    if (op === 'update' && existing.length && data.html) {
+        existing.forEach(element => {
+            element.outerHTML = data.html;
+        });
+        return true;
+    }
+    
+    existing.forEach(element => element.remove());
+    if (op === 'delete' || !data.html) {
+        return true;
+    }
+    if (type === 'task' && currentView() === 'dashboard') {
+        return true;
+    }
+    return insertFragment(type, data);
+}
+
+function changeIsVisible(change) {
+    if (currentView() === 'project') {
+        return document.body.dataset.projectId === String(change.project_id);
+    }
+    return currentView() === 'dashboard' && change.type !== 'link';
+}
+
+// Applies a change pushed by another tab or client. Deletes are patched
+// directly; anything else fetches the item's fragment for this view.
+function applyChange(change) {
+    applyCounters(change.counters);
+    
+    const existing = findItemElements(change.type, change.id);
+    if (change.op === 'delete') {
+        if (change.type === 'project' && currentView() === 'project' && changeIsVisible(change)) {
+            window.location.href = '/';
+        }
+        existing.forEach(element => element.remove());
+        return;
+    }
+    if (!changeIsVisible(change) || (change.type === 'task' && currentView() === 'dashboard')) {
+        return;
+    }
+    if (change.op === 'update' && !existing.length) {
+        return;
+    }
+    
+    fetch(`/api/fragments/${change.type}/${change.id}${viewQuery()}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success && data.item) {
+                applyMutation(change.type, change.op, data);
+                updateCompletedCount();
+            }
+        })
+        .catch(error => console.error('Error applying change:', error));
+}
+
+// Every open stream holds a server thread, so a hidden tab closes its stream
+// and resumes from the last event id once it is shown again. A server that
+// is at its stream limit answers 503; the tab then tries again later.
+const EVENTS_RETRY_MS = 30000;
+let changeStream = null;
+let lastChangeId = null;
+let latestChangeVersion = 0;
+
+// The mirror is shared by every tab, so once one tab has pulled a change
+// the others find it current and skip the request.
+const syncChanges = debounce(() => {
+    mirrorVersion()
+        .then(version => {
+            if (latestChangeVersion > version) {
+                synchronize();
+            }
+        })
+        .catch(error => console.error('Sync failed:', error));
+}, 2000);
+
+function subscribeToChanges() {
+    if (!currentView() || !window.EventSource || changeStream || document.hidden) {
+        return;
+    }
+    
+    const query = lastChangeId ? `?last_event_id=${encodeURIComponent(lastChangeId)}` : '';
+    const events = changeStream = new EventSource('/api/events' + query);
+    const remember = event => { lastChangeId = event.lastEventId || lastChangeId; };
+    events.addEventListener('hello', remember);
+    events.addEventListener('change', event => {
+        remember(event);
+        const change = JSON.parse(event.data);
+        applyChange(change);
+        latestChangeVersion = Math.max(latestChangeVersion, change.version || 0);
+        syncChanges();
+    });
+    events.addEventListener('reset', () => window.location.reload());
+    events.onerror = () => {
+        if (events.readyState === EventSource.CLOSED && changeStream === events) {
+            changeStream = null;
+            setTimeout(subscribeToChanges, EVENTS_RETRY_MS * (0.5 + Math.random()));
+        }
+    };
+}
+
+function unsubscribeFromChanges() {
+    if (changeStream) {
+        changeStream.close();
+        changeStream = null;
+    }
+}
+
+// Offline sync. Every item is mirrored in IndexedDB and kept current from
+// /api/sync, which only sends what changed since the version the mirror
+// holds. Writes that fail for lack of a connection are queued in the outbox
+// and pushed to /api/sync once the browser is back online; each carries an
+// op_id, so replaying a write whose response was lost never applies it twice.
+const SYNC_BATCH_SIZE = 500;
+let syncDatabase = null;
+let syncInProgress = null;
+
+function openSyncDatabase() {
+    if (!syncDatabase) {
+        syncDatabase = new Promise((resolve, reject) => {
+            if (!window.indexedDB) {
+                reject(new Error('IndexedDB is not available'));
+                return;
+            }
+            const request = indexedDB.open('focus', 1);
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                db.createObjectStore('items', { keyPath: ['type', 'id'] });
+                db.createObjectStore('outbox', { keyPath: 'seq', autoIncrement: true });
+                db.createObjectStore('meta');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+    return syncDatabase;
+}
+
+function requestResult(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function syncTransaction(stores, work) {
+    return openSyncDatabase().then(db => new Promise((resolve, reject) => {
+        const transaction = db.transaction(stores, 'readwrite');
+        const result = work(transaction);
+        transaction.oncomplete = () => resolve(result);
+        transaction.onerror = () => reject(transaction.error);
+        transaction.onabort = () => reject(transaction.error);
+    }));
+}
+
+function readStore(store, query) {
+    return openSyncDatabase().then(db => requestResult(db.transaction(store).objectStore(store).getAll(query)));
+}
+
+function mirroredItems(type) {
+    return readStore('items', IDBKeyRange.bound([type, -Infinity], [type, Infinity]));
+}
+
+function newOperationId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
+function queueOperation(operation) {
+    return syncTransaction('outbox', transaction => {
+        transaction.objectStore('outbox').add({
+            operation: { op_id: newOperationId(), ...operation },
+            queued_at: Date.now()
+        });
+    });
+}
+
+// Sends a write, marking a failure of the request itself. Errors thrown
+// while handling a response the server already accepted are left unmarked,
+// so such a write is never queued and replayed a second time.
+function sendWrite(url, options) {
+    return fetch(url, options).catch(error => {
+        error.offline = true;
+        throw error;
+    });
+}
+
+// Queues a write whose request never reached the server. Returns false for
+// any other failure, which the caller reports as usual.
+function saveOffline(error, operation) {
+    if (!error.offline) {
+        return false;
+    }
+    queueOperation(operation)
+        .then(() => showToast('Saved offline, it will sync when you reconnect', 'success'))
+        .catch(queueError => {
+            console.error('Error queueing offline change:', queueError);
+            showToast('Could not save while offline', 'error');
+        });
+    return true;
+}
+
+function flushOutbox() {
+    return readStore('outbox').then(entries => {
+        if (!entries.length) {
+            return 0;
+        }
+        const batch = entries.slice(0, SYNC_BATCH_SIZE);
+        return fetch('/api/sync', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ operations: batch.map(entry => entry.operation) })
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Sync push failed with ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => syncTransaction('outbox', transaction => {
+            // Rejected operations leave the outbox too: replaying them
+            // would only be rejected again.
+            const outbox = transaction.objectStore('outbox');
+            batch.forEach(entry => outbox.delete(entry.seq));
+            return data.results.filter(result => !result.success).length;
+        }))
+        .then(failed => {
+            if (failed) {
+                showToast(`${failed} offline change(s) could not be applied`, 'error');
+            } else {
+                showToast('Offline changes synced', 'success');
+            }
+            return entries.length > batch.length ? flushOutbox() : batch.length;
+        });
+    });
+}
+
+function pullChanges(since) {
+    return fetch(`/api/sync?since=${since}`)
+        .then(response => response.json())
+        .then(page => {
+            if (page.reset) {
+                return syncTransaction(['items', 'meta'], transaction => {
+                    transaction.objectStore('items').clear();
+                    transaction.objectStore('meta').put(0, 'version');
+                }).then(() => pullChanges(0));
+            }
+            return syncTransaction(['items', 'meta'], transaction => {
+                const items = transaction.objectStore('items');
+                page.changes.forEach(change => {
+                    if (change.deleted) {
+                        items.delete([change.type, change.id]);
+                    } else {
+                        items.put({ type: change.type, id: change.id, version: change.version, data: change.data });
+                    }
+                });
+                transaction.objectStore('meta').put(page.version, 'version');
+            }).then(() => page.more ? pullChanges(page.version) : page.version);
+        });
+}
+
+function mirrorVersion() {
+    return openSyncDatabase()
+        .then(db => requestResult(db.transaction('meta').objectStore('meta').get('version')))
+        .then(version => version || 0);
+}
+
+function synchronize() {
+    if (!syncInProgress) {
+        syncInProgress = flushOutbox()
+            .then(() => mirrorVersion())
+            .then(version => pullChanges(version))
+            .catch(error => console.error('Sync failed:', error))
+            .finally(() => {
+                syncInProgress = null;
+            });
+    }
+    return syncInProgress;
+}
+
 function updateCompletedCount() {
     const completedTasks = document.querySelectorAll('.task-checkbox.checked').length;
     const countElement = document.getElementById('completed-count');
@@ -568,7 +991,7 @@ function deleteProject(projectId, projectName) {
     
     showToast('Deleting project...', 'info');
     
-    fetch(`/api/projects/${projectId}/delete`, {
+    fetch(`/api/projects/${projectId}/delete` + viewQuery(), {
         method: 'DELETE',
         headers: {
             'Content-Type': 'application/json',
@@ -578,6 +1001,9 @@ function deleteProject(projectId, projectName) {
     .then(data => {
         if (data.success) {
             showToast('Project deleted successfully', 'success');
+            if (currentView() === 'dashboard' && applyMutation('project', 'delete', data)) {
+                return;
+            }
             setTimeout(() => {
                 window.location.href = '/';
             }, 1500);
@@ -595,8 +1021,17 @@ document.addEventListener('DOMContentLoaded', function() {
     setupAutoSave();
     restoreFormData();
     manageFocus();
-    
-    setInterval(updateCompletedCount, 30000);
+    subscribeToChanges();
+    synchronize();
+});
+
+window.addEventListener('online', synchronize);
+document.addEventListener('visibilitychange', () => {
+    if (document.hidden) {
+        unsubscribeFromChanges();
+    } else {
+        subscribeToChanges();
+    }
 });
 
 window.openQuickCapture = openQuickCapture;
@@ -608,4 +1043,8 @@ window.closeProjectModal = closeProjectModal;
 window.selectColor = selectColor;
 window.showToast = showToast;
 window.submitQuickNote = submitQuickNote;
-window.deleteProject = deleteProject;
\ No newline at end of file
+window.deleteProject = deleteProject;
+window.applyMutation = applyMutation;
+window.viewQuery = viewQuery;
+window.mirroredItems = mirroredItems;
+window.synchronize = synchronize;
\ No newline at end of file
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import focus
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(focus, 'DATABASE', str(tmp_path / 'focus.db'))
+    monkeypatch.setitem(focus.app.config, 'MAINTENANCE', False)
+    focus.init_db()
+    yield focus.app.test_client()
+    focus.close_thread_connections()
+
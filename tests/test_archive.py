@@ -0,0 +1,156 @@
+import itertools
+
+import pytest
+
+import focus
+
+op_ids = itertools.count(1)
+
+
+def in_db(fn):
+    with focus.app.app_context():
+        db = focus.get_db()
+        result = fn(db)
+        db.commit()
+        return result
+
+
+def create_project(client, name='Project'):
+    client.post('/api/projects', json={'name': name})
+    return in_db(lambda db: db.execute('SELECT MAX(id) FROM projects').fetchone()[0])
+
+
+def create_tasks(client, project_id, count):
+    response = client.post('/api/batch', json={'operations': [
+        {'type': 'task', 'op': 'create', 'data': {'title': f'Task {i}', 'project_id': project_id}}
+        for i in range(count)
+    ]})
+    return [result['id'] for result in response.get_json()['results']]
+
+
+def archive_completed(client, task_ids):
+    for task_id in task_ids:
+        client.post(f'/api/tasks/{task_id}/complete')
+    in_db(lambda db: db.execute("UPDATE tasks SET completed_at = datetime('now', '-60 days') WHERE is_completed = 1"))
+    return in_db(lambda db: focus.run_archive(db, after_days=30))
+
+
+def archived_ids(entity_type='task'):
+    return in_db(lambda db: {
+        row[0] for row in db.execute('SELECT item_id FROM archived_items WHERE entity_type = ?', (entity_type,))
+    })
+
+
+def hot_task(task_id):
+    return in_db(lambda db: focus.dict_from_row(db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()))
+
+
+def verify_counters():
+    return in_db(focus.verify_counters)
+
+
+def completed_ids(client, url='/api/tasks?completed=1'):
+    response = client.get(url)
+    assert response.status_code == 200
+    return [item['id'] for item in response.get_json()['items']]
+
+
+def write(client, via, op, task_id):
+    if via == 'route':
+        response = {
+            'uncomplete': lambda: client.post(f'/api/tasks/{task_id}/uncomplete'),
+            'delete': lambda: client.delete(f'/api/tasks/{task_id}/delete'),
+            'restore': lambda: client.post(f'/api/archive/task/{task_id}/restore'),
+        }[op]()
+        return response.status_code == 200
+    operation = {'type': 'task', 'op': op, 'id': task_id}
+    if via == 'sync':
+        operation['op_id'] = f'test-{next(op_ids)}'
+    response = client.post(f'/api/{via}', json={'operations': [operation]})
+    return response.get_json()['results'][0]['success']
+
+
+def test_archived_tasks_stay_in_completed_lists(client):
+    project_id = create_project(client)
+    task_ids = create_tasks(client, project_id, 3)
+    
+    counts = archive_completed(client, task_ids[:2])
+    
+    assert counts['task'] == 2
+    assert archived_ids() == set(task_ids[:2])
+    assert sorted(completed_ids(client)) == task_ids[:2]
+    assert sorted(completed_ids(client, f'/api/projects/{project_id}/tasks?completed=1')) == task_ids[:2]
+    assert verify_counters() == []
+
+
+def test_deleted_project_open_tasks_stay_out_of_completed_lists(client):
+    project_id = create_project(client)
+    open_id, completed_id = create_tasks(client, project_id, 2)
+    client.post(f'/api/tasks/{completed_id}/complete')
+    
+    assert client.delete(f'/api/projects/{project_id}/delete').status_code == 200
+    
+    assert archived_ids() == {open_id, completed_id}
+    assert completed_ids(client) == [completed_id]
+    assert verify_counters() == []
+
+
+def test_negative_archive_age_is_rejected(client):
+    with pytest.raises(ValueError):
+        in_db(lambda db: focus.run_archive(db, after_days=-1))
+
+
+@pytest.mark.parametrize('via', ['route', 'batch', 'sync'])
+def test_uncomplete_archived_task(client, via):
+    project_id = create_project(client)
+    task_id, = create_tasks(client, project_id, 1)
+    archive_completed(client, [task_id])
+    
+    assert write(client, via, 'uncomplete', task_id)
+    
+    assert archived_ids() == set()
+    assert hot_task(task_id)['is_completed'] == 0
+    assert completed_ids(client) == []
+    assert verify_counters() == []
+
+
+@pytest.mark.parametrize('via', ['route', 'batch', 'sync'])
+def test_delete_archived_task(client, via):
+    project_id = create_project(client)
+    task_id, = create_tasks(client, project_id, 1)
+    archive_completed(client, [task_id])
+    
+    assert write(client, via, 'delete', task_id)
+    
+    assert archived_ids() == set()
+    assert hot_task(task_id) is None
+    assert completed_ids(client) == []
+    assert verify_counters() == []
+    assert not write(client, via, 'delete', task_id)
+
+
+@pytest.mark.parametrize('via', ['route', 'batch', 'sync'])
+def test_restore_archived_task(client, via):
+    project_id = create_project(client)
+    task_id, = create_tasks(client, project_id, 1)
+    archive_completed(client, [task_id])
+    
+    assert write(client, via, 'restore', task_id)
+    
+    assert archived_ids() == set()
+    assert hot_task(task_id)['project_id'] == project_id
+    assert completed_ids(client) == [task_id]
+    assert verify_counters() == []
+    assert not write(client, via, 'restore', task_id)
+
+
+@pytest.mark.parametrize('via', ['route', 'batch', 'sync'])
+def test_restore_task_of_deleted_project(client, via):
+    project_id = create_project(client)
+    task_id, = create_tasks(client, project_id, 1)
+    client.delete(f'/api/projects/{project_id}/delete')
+    
+    assert write(client, via, 'restore', task_id)
+    
+    assert hot_task(task_id)['project_id'] is None
+    assert verify_counters() == []